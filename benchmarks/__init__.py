@@ -0,0 +1,7 @@
+"""
+Benchmark suite
+
+Run with ``python -m benchmarks``. Synthetic books and images are generated
+in a temporary directory, each benchmark is timed several times and the
+medians are compared with a stored baseline.
+"""
@@ -0,0 +1,7 @@
+"""
+Benchmark entry point (python -m benchmarks)
+"""
+import sys
+from .runner import main
+
+sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+The benchmarks
+
+Each case takes the running Suite, generates what it needs under
+suite.workdir and times the operations with suite.time().
+"""
+import os
+import shutil
+from src.models.book import Book
+from src.utils.importer import ImportJob
+from src.utils.storage import BookStorage
+from .generators import MODES, make_book, make_image_set
+
+# Operations timed per repetition of the book edit benchmarks
+EDITS = 100
+# Pages of the continuous scrolling book and jumps timed across it
+SCROLL_PAGES = 3000
+SCROLL_FRAMES = 300
+
+
+def book_edits(suite) -> None:
+    """Book.move_page and remove_page at the front of large books"""
+    images = make_image_set(os.path.join(suite.workdir, 'small'), 8, 300, 450)
+    for page_count in suite.profile.book_pages:
+        book = make_book(images, page_count)
+        
+        def move():
+            for _ in range(EDITS):
+                book.move_page(0, page_count - 1)
+        suite.time(f"book.move_page[{page_count}]", move, items=EDITS)
+        
+        fresh = []
+        
+        def build():
+            fresh.append(make_book(images, page_count))
+        
+        def remove():
+            edited = fresh.pop()
+            for _ in range(EDITS):
+                edited.remove_page(0)
+        suite.time(f"book.remove_page[{page_count}]", remove, setup=build, items=EDITS)
+
+
+def storage(suite) -> None:
+    """BookStorage.save_book and load_book, full and journaled saves"""
+    images = make_image_set(os.path.join(suite.workdir, 'small'), 8, 300, 450)
+    books = BookStorage(os.path.join(suite.workdir, 'books'))
+    try:
+        for page_count in suite.profile.book_pages:
+            book = make_book(images, page_count)
+            names = iter(range(1000))
+            
+            def save():
+                books.save_book(book, f"save_{page_count}_{next(names)}")
+            suite.time(f"storage.save_book[{page_count}]", save, items=page_count)
+            
+            books.save_book(book, f"edit_{page_count}")
+            
+            def edit():
+                book.move_page(0, page_count - 1)
+            
+            def save_edit():
+                books.save_book(book, f"edit_{page_count}")
+            suite.time(f"storage.save_book_edit[{page_count}]", save_edit, setup=edit)
+            
+            def load():
+                books.load_book(f"save_{page_count}_0")
+            suite.time(f"storage.load_book[{page_count}]", load, items=page_count)
+    finally:
+        books.close()
+
+
+def thumbnails(suite) -> None:
+    """Thumbnail generation through ImportJob for each image mode"""
+    count = suite.profile.thumbnail_pages
+    thumbnail_dir = os.path.join(suite.workdir, 'thumbnails')
+    for mode in MODES:
+        images = make_image_set(os.path.join(suite.workdir, f"pages_{mode}"), count,
+                                1200, 1800, mode)
+        
+        def clear():
+            shutil.rmtree(thumbnail_dir, ignore_errors=True)
+        
+        def build():
+            for result in ImportJob(images, thumbnail_dir=thumbnail_dir,
+                                    workers=suite.workers).run():
+                assert result.ok, result.error
+        suite.time(f"thumbnails.build[{mode}]", build, setup=clear, items=count)
+
+
+def decode(suite) -> None:
+    """Decoding pages at display width, as the viewer does"""
+    from src.ui.image_loader import DISPLAY_MAX_WIDTH, decode_display_image
+    for width, height in suite.profile.decode_sizes:
+        for mode in MODES:
+            path = make_image_set(os.path.join(suite.workdir, f"decode_{width}x{height}_{mode}"),
+                                  1, width, height, mode)[0]
+            
+            def run():
+                assert decode_display_image(path, DISPLAY_MAX_WIDTH) is not None
+            suite.time(f"decode.display[{width}x{height},{mode}]", run)
+
+
+def page_list(suite) -> None:
+    """Showing a large book in the page list widget"""
+    from PyQt6.QtWidgets import QApplication
+    from src.ui.page_manager import PageManagerWidget
+    app = suite.application()
+    images = make_image_set(os.path.join(suite.workdir, 'small'), 8, 300, 450)
+    widget = PageManagerWidget()
+    widget.resize(400, 800)
+    widget.show()
+    try:
+        for page_count in suite.profile.book_pages:
+            book = make_book(images, page_count)
+            
+            def clear():
+                widget.set_book(Book())
+                app.processEvents()
+            
+            def show():
+                widget.set_book(book)
+                app.processEvents()
+            suite.time(f"page_list.set_book[{page_count}]", show, setup=clear)
+    finally:
+        widget.close()
+        QApplication.processEvents()
+
+
+def viewer(suite) -> None:
+    """ImageViewerWidget.load_image until the page is on screen"""
+    from src.ui.viewer import ImageViewerWidget
+    app = suite.application()
+    widget = ImageViewerWidget()
+    widget.resize(900, 1000)
+    widget.show()
+    app.processEvents()
+    try:
+        for width, height in suite.profile.decode_sizes:
+            path = make_image_set(os.path.join(suite.workdir, f"decode_{width}x{height}_RGB"),
+                                  1, width, height)[0]
+            
+            def load():
+                widget.load_image(path)
+                while widget.image_label.pixmap().isNull():
+                    app.processEvents()
+            suite.time(f"viewer.load_image[{width}x{height}]", load, setup=widget.clear)
+    finally:
+        widget.shutdown()
+        widget.close()
+
+
+def scroll(suite) -> None:
+    """Scrolling through a long book in the continuous view, one repaint per frame"""
+    from src.ui.viewer import ImageViewerWidget
+    app = suite.application()
+    images = make_image_set(os.path.join(suite.workdir, 'scroll'), 8, 1200, 1800)
+    book = make_book(images, SCROLL_PAGES)
+    widget = ImageViewerWidget()
+    widget.resize(900, 1000)
+    widget.show()
+    widget.set_book(book)
+    widget.set_continuous(True)
+    view = widget.continuous_view
+    app.processEvents()
+    scroll_bar = view.verticalScrollBar()
+    try:
+        for spread in (False, True):
+            view.set_spread(spread)
+            
+            def rewind():
+                scroll_bar.setValue(0)
+                app.processEvents()
+            
+            def run():
+                step = scroll_bar.maximum() // SCROLL_FRAMES
+                for frame in range(1, SCROLL_FRAMES + 1):
+                    scroll_bar.setValue(frame * step)
+                    view.viewport().repaint()
+                    app.processEvents()
+            mode = 'spread' if spread else 'single'
+            suite.time(f"scroll.frames[{SCROLL_PAGES},{mode}]", run, setup=rewind,
+                       items=SCROLL_FRAMES)
+    finally:
+        widget.shutdown()
+        widget.close()
+
+
+CASES = {
+    'book_edits': book_edits,
+    'storage': storage,
+    'thumbnails': thumbnails,
+    'decode': decode,
+    'page_list': page_list,
+    'viewer': viewer,
+    'scroll': scroll,
+}
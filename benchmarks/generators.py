@@ -0,0 +1,74 @@
+"""
+Synthetic books and page images for the benchmarks
+"""
+import os
+from typing import List, Optional
+import numpy as np
+from PIL import Image
+from src.models.book import Book
+from src.utils.metadata import read_page_metadata
+
+# Image modes the generators can write
+MODES = ('RGB', 'L', 'P')
+
+# Rows generated at a time, so 100-megapixel pages do not need the whole
+# page as intermediate arrays
+_BAND_ROWS = 512
+
+
+def make_png(path: str, width: int, height: int, mode: str = 'RGB', seed: int = 0) -> str:
+    """Write a PNG that compresses roughly like a scanned page.
+    
+    The page is a soft gradient with short dark strokes scattered over it
+    like lines of text; palette pages use 16 gray levels.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.arange(width, dtype=np.int32)
+    gray = np.empty((height, width), np.uint8)
+    for top in range(0, height, _BAND_ROWS):
+        y = np.arange(top, min(top + _BAND_ROWS, height), dtype=np.int32)[:, None]
+        band = 200 + (x[None, :] * 40 // max(1, width)) + (y * 15 // max(1, height))
+        # Lines of text: six rows out of every 24 get random dark runs
+        strokes = (rng.random((len(y), width // 8 + 1)) < 0.3).repeat(8, axis=1)[:, :width]
+        band = np.where(strokes & ((y // 6) % 4 == 0), 30, band)
+        gray[top:top + len(y)] = band.clip(0, 255)
+    
+    if mode == 'L':
+        image = Image.fromarray(gray)
+    elif mode == 'P':
+        image = Image.fromarray(gray >> 4).convert('P')
+        image.putpalette([level * 17 for level in range(16) for _ in range(3)])
+    elif mode == 'RGB':
+        # A slightly warm paper tone, so the page is not gray in disguise
+        luma = Image.fromarray(gray)
+        image = Image.merge('RGB', (luma, luma, luma.point(lambda value: value * 9 // 10)))
+    else:
+        raise ValueError(f"unsupported mode: {mode}")
+    image.save(path, 'PNG', compress_level=1)
+    return path
+
+
+def make_image_set(directory: str, count: int, width: int, height: int,
+                   mode: str = 'RGB') -> List[str]:
+    """Write count distinct pages into directory; existing files are reused"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"page{index + 1:05d}.png")
+        if not os.path.exists(path):
+            make_png(path, width, height, mode, seed=index)
+        paths.append(path)
+    return paths
+
+
+def make_book(image_paths: List[str], page_count: int, title: Optional[str] = None) -> Book:
+    """A book of page_count pages cycling through image_paths.
+    
+    Pages carry the metadata of their file, as they do after an import, so
+    large books can be built from a handful of images.
+    """
+    metadata = {path: read_page_metadata(path) for path in image_paths}
+    paths = [image_paths[index % len(image_paths)] for index in range(page_count)]
+    book = Book(title or f"Benchmark {page_count}")
+    book.add_pages(paths, [dict(metadata[path]) for path in paths])
+    return book
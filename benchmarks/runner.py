@@ -0,0 +1,203 @@
+"""
+Runs the benchmarks, saves the results and checks them against a baseline
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# A benchmark regresses when its median is this much slower than the
+# baseline, and at least MIN_REGRESSION_SECONDS slower
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.005
+
+
+class Profile:
+    """Sizes of the generated books and images"""
+    
+    def __init__(self, book_pages: tuple, decode_sizes: tuple, thumbnail_pages: int,
+                 repeat: int):
+        self.book_pages = book_pages
+        self.decode_sizes = decode_sizes
+        self.thumbnail_pages = thumbnail_pages
+        self.repeat = repeat
+
+
+PROFILES = {
+    'quick': Profile(book_pages=(1000, 10000), decode_sizes=((1200, 1800), (4000, 4000)),
+                     thumbnail_pages=16, repeat=5),
+    'full': Profile(book_pages=(1000, 10000, 100000),
+                    decode_sizes=((1200, 1800), (4000, 4000), (10000, 10000)),
+                    thumbnail_pages=100, repeat=5),
+}
+
+
+class Suite:
+    """State shared by the benchmark cases while they run"""
+    
+    def __init__(self, profile: Profile, workdir: str, pattern: str = '*',
+                 workers: Optional[int] = None):
+        self.profile = profile
+        self.workdir = workdir
+        self.pattern = pattern
+        self.workers = workers
+        self.results: Dict[str, dict] = {}
+        self._app = None
+    
+    def application(self):
+        """The QApplication, created on first use"""
+        if self._app is None:
+            from PyQt6.QtWidgets import QApplication
+            self._app = QApplication.instance() or QApplication([])
+        return self._app
+    
+    def time(self, name: str, func: Callable[[], None], setup: Optional[Callable[[], None]] = None,
+             items: Optional[int] = None, repeat: Optional[int] = None) -> None:
+        """Time func, calling setup untimed before every repetition.
+        
+        items, if given, is how many pages or operations one call handles
+        and is stored so results can be compared per item.
+        """
+        if not fnmatch.fnmatchcase(name, self.pattern):
+            return
+        times = []
+        for _ in range(repeat or self.profile.repeat):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+        result = {
+            'median': statistics.median(times),
+            'min': min(times),
+            'repeat': len(times),
+        }
+        if items:
+            result['items'] = items
+        self.results[name] = result
+        print(f"  {name:<40}{result['median'] * 1000:10.2f} ms", flush=True)
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Names of the benchmarks that got slower than the baseline allows"""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        limit = max(expected['median'] * (1 + tolerance),
+                    expected['median'] + MIN_REGRESSION_SECONDS)
+        if result['median'] > limit:
+            regressions.append(name)
+    return regressions
+
+
+def format_comparison(results: Dict[str, dict], baseline: Dict[str, dict],
+                      regressions: List[str]) -> str:
+    lines = [f"{'benchmark':<40}{'median':>12}{'baseline':>12}{'change':>9}"]
+    for name, result in results.items():
+        median = result['median'] * 1000
+        expected = baseline.get(name)
+        if expected is None:
+            lines.append(f"{name:<40}{median:10.2f}ms{'-':>12}{'new':>9}")
+            continue
+        change = (result['median'] / expected['median'] - 1) * 100 if expected['median'] else 0.0
+        mark = "  REGRESSION" if name in regressions else ""
+        lines.append(f"{name:<40}{median:10.2f}ms{expected['median'] * 1000:10.2f}ms"
+                     f"{change:+8.0f}%{mark}")
+    return "\n".join(lines)
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    """Benchmark results of a saved run; empty if there is none"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def save_results(path: str, results: Dict[str, dict], profile_name: str) -> None:
+    data = {
+        'profile': profile_name,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from .cases import CASES
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Run the benchmarks and compare with a baseline")
+    parser.add_argument("cases", nargs="*",
+                        help=f"cases to run: {', '.join(CASES)} (default: all)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="quick",
+                        help="book and image sizes (default: quick)")
+    parser.add_argument("-k", "--filter", default="*",
+                        help="only run benchmarks whose name matches this glob")
+    parser.add_argument("-o", "--output", default="benchmark_results.json",
+                        help="where to save the results (default: benchmark_results.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="merge these results into the baseline instead of checking them")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction (default: 0.25)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for thumbnail generation (default: CPU count)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated files")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # The Qt cases run without a display
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from .cases import CASES
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case: {', '.join(unknown)}")
+    workdir = tempfile.mkdtemp(prefix='png-reader-bench-')
+    suite = Suite(PROFILES[args.profile], workdir, args.filter, args.workers)
+    try:
+        for name in args.cases or CASES:
+            print(f"{name}:", flush=True)
+            CASES[name](suite)
+    finally:
+        if args.keep:
+            print(f"Generated files kept in {workdir}")
+        else:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    save_results(args.output, suite.results, args.profile)
+    baseline = load_results(args.baseline)
+    if args.update_baseline:
+        baseline.update(suite.results)
+        save_results(args.baseline, dict(sorted(baseline.items())), args.profile)
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+    
+    regressions = compare(suite.results, baseline, args.tolerance)
+    print()
+    print(format_comparison(suite.results, baseline, regressions))
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline", file=sys.stderr)
+        return 1
+    return 0
@@ -2,18 +2,34 @@
 Main application entry point with PyQt6 configuration
 """
 import sys
-import os
+from src.utils.startup import StartupTimer
+
+startup = StartupTimer()
+
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
-from src.ui import MainWindow
+startup.mark("import Qt")
+from src.ui.main_window import MainWindow
+startup.mark("import UI")
 
 
 def main():
     """Start the application"""
     app = QApplication(sys.argv)
+    startup.mark("QApplication")
     
     # Create main window
     window = MainWindow()
+    startup.mark("window")
     window.show()
+    startup.mark("show")
+    
+    # Storage is opened once the window is on screen
+    def finish_startup():
+        window.finish_startup()
+        startup.mark("storage")
+        startup.report()
+    QTimer.singleShot(0, finish_startup)
     
     sys.exit(app.exec())
 
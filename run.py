@@ -3,18 +3,17 @@
 Run script for E-Book Viewer application
 This script should be used instead of directly calling python main.py
 """
-import subprocess
 import sys
 import os
 
 def run():
-    """Run the application"""
+    """Run the application in this process"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)
+    sys.path.insert(0, script_dir)
     
-    # Run the main application
-    result = subprocess.run([sys.executable, 'main.py'], cwd=script_dir)
-    sys.exit(result.returncode)
+    from main import main
+    main()
 
 if __name__ == '__main__':
     run()
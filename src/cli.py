@@ -0,0 +1,207 @@
+"""
+Command-line interface for working with saved books without the GUI
+
+Only src.models and src.utils are imported, so no Qt library is loaded.
+Every command accepts several books or folders at once and exits with
+status 1 if any of them failed.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import List, Optional
+from .models.book import Book
+from .utils.importer import ImportJob
+from .utils.storage import BookStorage
+from .utils.thumbnail_cache import ThumbnailCache
+
+
+def natural_key(path: str) -> list:
+    """Sort key that orders page2.png before page10.png"""
+    return [int(part) if part.isdigit() else part.lower()
+            for part in re.split(r'(\d+)', os.path.basename(path))]
+
+
+def find_images(folder: str, recursive: bool = False) -> List[str]:
+    """PNG files in a folder in page order"""
+    if recursive:
+        found = [os.path.join(root, name)
+                 for root, _, names in os.walk(folder) for name in names]
+        found.sort(key=lambda path: [natural_key(part) for part in
+                                     os.path.relpath(path, folder).split(os.sep)])
+    else:
+        found = sorted((os.path.join(folder, name) for name in os.listdir(folder)),
+                       key=natural_key)
+    return [path for path in found if path.lower().endswith('.png') and os.path.isfile(path)]
+
+
+def cmd_create(args, storage: BookStorage) -> bool:
+    """Create one book per folder"""
+    if args.name and len(args.folders) > 1:
+        print("--name can only be used with a single folder", file=sys.stderr)
+        return False
+    existing = set(storage.list_books())
+    thumbnail_dir = None if args.no_thumbnails else storage.get_sibling_dir("thumbnails")
+    ok = True
+    for folder in args.folders:
+        name = args.name or os.path.basename(os.path.normpath(folder))
+        if name in existing and not args.replace:
+            print(f"{name}: already exists, skipped (use --replace to overwrite)")
+            continue
+        try:
+            image_paths = [os.path.abspath(path) for path in find_images(folder, args.recursive)]
+        except OSError as e:
+            print(f"{name}: cannot read folder: {e}", file=sys.stderr)
+            ok = False
+            continue
+        if not image_paths:
+            print(f"{name}: no PNG files in {folder}", file=sys.stderr)
+            ok = False
+            continue
+        
+        started = time.perf_counter()
+        job = ImportJob(image_paths, thumbnail_dir=thumbnail_dir, workers=args.workers)
+        paths, metadata, failed = [], [], 0
+        for result in job.run():
+            if result.ok:
+                paths.append(result.image_path)
+                metadata.append(result.metadata)
+            else:
+                print(f"  {result.image_path}: {result.error}", file=sys.stderr)
+                failed += 1
+        book = Book(args.title or name)
+        book.add_pages(paths, metadata)
+        if not storage.save_book(book, name):
+            print(f"{name}: failed to save", file=sys.stderr)
+            ok = False
+            continue
+        print(f"{name}: {len(paths)} pages, {failed} skipped "
+              f"({time.perf_counter() - started:.1f}s)")
+        ok = ok and not failed
+    return ok
+
+
+def cmd_list(args, storage: BookStorage) -> bool:
+    """Print the catalog"""
+    summaries = storage.list_book_summaries()
+    if args.json:
+        json.dump([{
+            'name': summary.name,
+            'title': summary.title,
+            'page_count': summary.page_count,
+            'created_at': summary.created_at,
+            'modified_at': summary.modified_at,
+        } for summary in summaries], sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return True
+    for summary in summaries:
+        print(f"{summary.name}\t{summary.page_count}\t{summary.modified_at[:19]}\t{summary.title}")
+    return True
+
+
+def _load_books(storage: BookStorage, names: List[str]):
+    """Yield (name, book) for the given names, or for every book if none"""
+    for name in names or storage.list_books():
+        book = storage.load_book(name)
+        if book is None:
+            print(f"{name}: cannot be loaded", file=sys.stderr)
+        yield name, book
+
+
+def cmd_validate(args, storage: BookStorage) -> bool:
+    """Check that every page of the books is a readable PNG"""
+    ok = True
+    for name, book in _load_books(storage, args.books):
+        if book is None:
+            ok = False
+            continue
+        job = ImportJob([page.image_path for page in book.pages], workers=args.workers)
+        failed = 0
+        for index, result in enumerate(job.run()):
+            if not result.ok:
+                print(f"{name}: page {index + 1}: {result.image_path}: {result.error}")
+                failed += 1
+        print(f"{name}: {len(book.pages)} pages, {failed} invalid")
+        ok = ok and not failed
+    return ok
+
+
+def cmd_thumbnails(args, storage: BookStorage) -> bool:
+    """Generate the thumbnails the GUI shows for every page"""
+    cache = ThumbnailCache(storage.get_sibling_dir("thumbnails"))
+    ok = True
+    for name, book in _load_books(storage, args.books):
+        if book is None:
+            ok = False
+            continue
+        started = time.perf_counter()
+        job = ImportJob([page.image_path for page in book.pages], thumbnail_dir=cache.cache_dir,
+                        thumbnail_height=cache.height, workers=args.workers)
+        failed = sum(1 for result in job.run() if not result.ok)
+        print(f"{name}: {len(book.pages) - failed} thumbnails, {failed} failed "
+              f"({time.perf_counter() - started:.1f}s)")
+        ok = ok and not failed
+    return ok
+
+
+def cmd_export(args, storage: BookStorage) -> bool:
+    """Write books as bundles"""
+    os.makedirs(args.output_dir, exist_ok=True)
+    ok = True
+    for name, book in _load_books(storage, args.books):
+        if book is None:
+            ok = False
+            continue
+        bundle_path = os.path.join(args.output_dir, f"{name}.bundle")
+        started = time.perf_counter()
+        if storage.export_bundle(book, bundle_path):
+            print(f"{name}: {bundle_path} ({time.perf_counter() - started:.1f}s)")
+        else:
+            ok = False
+    return ok
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--storage-dir", default="books", help="book directory (default: books)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    create = commands.add_parser("create", help="create a book from each folder of PNG files")
+    create.add_argument("folders", nargs="+")
+    create.add_argument("--name", help="book name (single folder only; default: folder name)")
+    create.add_argument("--title", help="book title (default: book name)")
+    create.add_argument("--recursive", action="store_true", help="include subfolders")
+    create.add_argument("--replace", action="store_true", help="overwrite existing books")
+    create.add_argument("--no-thumbnails", action="store_true", help="skip thumbnail generation")
+    create.set_defaults(handler=cmd_create)
+    
+    list_parser = commands.add_parser("list", help="list saved books")
+    list_parser.add_argument("--json", action="store_true", help="print JSON")
+    list_parser.set_defaults(handler=cmd_list)
+    
+    validate = commands.add_parser("validate", help="check the pages of books (default: all)")
+    validate.add_argument("books", nargs="*")
+    validate.set_defaults(handler=cmd_validate)
+    
+    thumbnails = commands.add_parser("thumbnails", help="build page thumbnails (default: all books)")
+    thumbnails.add_argument("books", nargs="*")
+    thumbnails.set_defaults(handler=cmd_thumbnails)
+    
+    export = commands.add_parser("export", help="export books as bundles (default: all)")
+    export.add_argument("books", nargs="*")
+    export.add_argument("-o", "--output-dir", required=True)
+    export.set_defaults(handler=cmd_export)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    storage = BookStorage(storage_dir=args.storage_dir)
+    try:
+        return 0 if args.handler(args, storage) else 1
+    finally:
+        storage.close()
@@ -2,5 +2,6 @@
 Models package initialization
 """
 from .book import Book, Page
+from .page_list import PageList
 
-__all__ = ['Book', 'Page']
+__all__ = ['Book', 'Page', 'PageList']
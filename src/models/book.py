@@ -4,25 +4,86 @@ Book model for managing e-book data
 import json
 import os
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
+from .page_list import PageList
+
+
+# Change events emitted by Book to its listeners. "About to" events are sent
+# before the pages list is mutated, the others right after it.
+PAGES_ABOUT_TO_BE_INSERTED = 'pages_about_to_be_inserted'  # (first, last)
+PAGES_INSERTED = 'pages_inserted'  # (first, last)
+PAGES_ABOUT_TO_BE_REMOVED = 'pages_about_to_be_removed'  # (first, last)
+PAGES_REMOVED = 'pages_removed'  # (first, last)
+PAGE_ABOUT_TO_BE_MOVED = 'page_about_to_be_moved'  # (from_index, to_index)
+PAGE_MOVED = 'page_moved'  # (from_index, to_index)
+COVER_CHANGED = 'cover_changed'  # (old_index, new_index)
+PAGES_CHANGED = 'pages_changed'  # (first, last) metadata of the pages changed
+DIRTY_CHANGED = 'dirty_changed'  # (dirty,) the book gained or lost unsaved changes
 
 
 class Page:
     """Represents a single page in a book"""
     
-    def __init__(self, image_path: str, page_number: int):
+    # Cached facts about the image file, read once and refreshed when stale
+    METADATA_FIELDS = ('width', 'height', 'bit_depth', 'file_size', 'mtime_ns', 'content_hash')
+    
+    def __init__(self, image_path: str, page_number: int, metadata: Optional[dict] = None):
         self.image_path = image_path
         self.page_number = page_number
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.bit_depth: Optional[int] = None
+        self.file_size: Optional[int] = None
+        self.mtime_ns: Optional[int] = None
+        self.content_hash: Optional[str] = None
+        # Set while the image file cannot be found; not saved
+        self.missing = False
+        if metadata:
+            self.set_metadata(metadata)
+    
+    @property
+    def has_metadata(self) -> bool:
+        """Whether the file metadata has been read"""
+        return self.file_size is not None
+    
+    @property
+    def size(self) -> Optional[tuple]:
+        """Image dimensions from the cached metadata"""
+        if self.width is None or self.height is None:
+            return None
+        return self.width, self.height
+    
+    def set_metadata(self, metadata: Optional[dict]) -> None:
+        """Replace the cached metadata; None clears it"""
+        metadata = metadata or {}
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, metadata.get(field))
+    
+    def metadata(self) -> dict:
+        """Get the cached metadata as a dictionary"""
+        return {field: getattr(self, field) for field in self.METADATA_FIELDS}
+    
+    def is_stale(self, stat: Callable = os.stat) -> bool:
+        """Check with a single stat whether the file changed since its
+        metadata was read"""
+        try:
+            st = stat(self.image_path)
+        except OSError:
+            return self.has_metadata
+        return st.st_size != self.file_size or st.st_mtime_ns != self.mtime_ns
     
     def to_dict(self) -> dict:
-        return {
+        data = {
             'image_path': self.image_path,
             'page_number': self.page_number
         }
+        if self.has_metadata:
+            data.update(self.metadata())
+        return data
     
     @staticmethod
     def from_dict(data: dict) -> 'Page':
-        return Page(data['image_path'], data['page_number'])
+        return Page(data['image_path'], data['page_number'], data)
 
 
 class Book:
@@ -30,44 +91,118 @@ class Book:
     
     def __init__(self, title: str = "Untitled"):
         self.title = title
-        self.pages: List[Page] = []
+        self.pages = PageList()
         self.cover_page_index: int = 0
         self.created_at = datetime.now()
         self.modified_at = datetime.now()
+        self._dirty = False
+        self._listeners: List[Callable] = []
+    
+    def add_listener(self, listener: Callable) -> None:
+        """Register a callable invoked as listener(event, *args) on changes"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable) -> None:
+        """Unregister a change listener"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
     
     def add_page(self, image_path: str) -> None:
         """Add a page to the book"""
-        page_number = len(self.pages)
-        self.pages.append(Page(image_path, page_number))
+        self.add_pages([image_path])
+    
+    def add_pages(self, image_paths: List[str], metadata: Optional[List[dict]] = None) -> None:
+        """Append several pages at once, optionally with their file metadata"""
+        if not image_paths:
+            return
+        first = len(self.pages)
+        last = first + len(image_paths) - 1
+        self._notify(PAGES_ABOUT_TO_BE_INSERTED, first, last)
+        for offset, image_path in enumerate(image_paths):
+            page_metadata = metadata[offset] if metadata else None
+            self.pages.append(Page(image_path, first + offset, page_metadata))
         self._update_modified_time()
+        self._notify(PAGES_INSERTED, first, last)
     
     def remove_page(self, page_index: int) -> None:
         """Remove a page from the book"""
         if 0 <= page_index < len(self.pages):
+            self._notify(PAGES_ABOUT_TO_BE_REMOVED, page_index, page_index)
             self.pages.pop(page_index)
             # Update page numbers
-            for i, page in enumerate(self.pages):
-                page.page_number = i
+            self._renumber_pages(page_index, len(self.pages) - 1)
+            self._update_modified_time()
+            self._notify(PAGES_REMOVED, page_index, page_index)
             # Adjust cover page index if necessary
             if self.cover_page_index >= len(self.pages):
-                self.cover_page_index = max(0, len(self.pages) - 1)
-            self._update_modified_time()
+                self._set_cover_index(max(0, len(self.pages) - 1))
     
     def move_page(self, from_index: int, to_index: int) -> None:
         """Move a page from one position to another"""
+        if from_index == to_index:
+            return
         if 0 <= from_index < len(self.pages) and 0 <= to_index < len(self.pages):
+            self._notify(PAGE_ABOUT_TO_BE_MOVED, from_index, to_index)
             page = self.pages.pop(from_index)
             self.pages.insert(to_index, page)
             # Update page numbers
-            for i, p in enumerate(self.pages):
-                p.page_number = i
+            self._renumber_pages(min(from_index, to_index), max(from_index, to_index))
             self._update_modified_time()
+            self._notify(PAGE_MOVED, from_index, to_index)
     
     def set_cover_page(self, page_index: int) -> None:
         """Set the cover page"""
         if 0 <= page_index < len(self.pages):
-            self.cover_page_index = page_index
-            self._update_modified_time()
+            self._set_cover_index(page_index)
+    
+    def update_page_metadata(self, page_index: int, metadata: Optional[dict]) -> None:
+        """Replace the cached file metadata of a page"""
+        if 0 <= page_index < len(self.pages):
+            self.pages[page_index].set_metadata(metadata)
+            self.mark_dirty()
+            self._notify(PAGES_CHANGED, page_index, page_index)
+    
+    def update_pages_metadata(self, metadata: Dict[int, Optional[dict]]) -> None:
+        """Replace the cached file metadata of several pages, sending one
+        change event per run of adjacent pages"""
+        indices = sorted(index for index in metadata if 0 <= index < len(self.pages))
+        if not indices:
+            return
+        for index in indices:
+            self.pages[index].set_metadata(metadata[index])
+        self.mark_dirty()
+        first = indices[0]
+        for previous, index in zip(indices, indices[1:] + [None]):
+            if index != previous + 1:
+                self._notify(PAGES_CHANGED, first, previous)
+                first = index
+    
+    @property
+    def is_dirty(self) -> bool:
+        """Whether the book has changes that have not been saved"""
+        return self._dirty
+    
+    def mark_dirty(self) -> None:
+        """Flag the book as having unsaved changes"""
+        if not self._dirty:
+            self._dirty = True
+            self._notify(DIRTY_CHANGED, True)
+    
+    def mark_clean(self) -> None:
+        """Flag the book as saved"""
+        if self._dirty:
+            self._dirty = False
+            self._notify(DIRTY_CHANGED, False)
+    
+    def snapshot(self) -> 'Book':
+        """Copy the book so it can be serialized while this one is edited"""
+        book = Book(self.title)
+        book.pages = self.pages.copy()
+        book.cover_page_index = self.cover_page_index
+        book.created_at = self.created_at
+        book.modified_at = self.modified_at
+        return book
     
     def get_page_image_path(self, page_index: int) -> Optional[str]:
         """Get the image path for a specific page"""
@@ -75,9 +210,28 @@ class Book:
             return self.pages[page_index].image_path
         return None
     
+    def _set_cover_index(self, page_index: int) -> None:
+        """Change the cover index and notify listeners"""
+        old_index = self.cover_page_index
+        if old_index == page_index:
+            return
+        self.cover_page_index = page_index
+        self._update_modified_time()
+        self._notify(COVER_CHANGED, old_index, page_index)
+    
+    def _renumber_pages(self, first: int, last: int) -> None:
+        """Update page numbers of the pages in an index range"""
+        self.pages.renumber(first, last)
+    
+    def _notify(self, event: str, *args) -> None:
+        """Send a change event to every listener"""
+        for listener in list(self._listeners):
+            listener(event, *args)
+    
     def _update_modified_time(self) -> None:
         """Update the modified timestamp"""
         self.modified_at = datetime.now()
+        self.mark_dirty()
     
     def to_dict(self) -> dict:
         """Convert book to dictionary for serialization"""
@@ -93,7 +247,7 @@ class Book:
     def from_dict(data: dict) -> 'Book':
         """Create a book from a dictionary"""
         book = Book(data['title'])
-        book.pages = [Page.from_dict(page_data) for page_data in data['pages']]
+        book.pages = PageList(Page.from_dict(page_data) for page_data in data['pages'])
         book.cover_page_index = data['cover_page_index']
         book.created_at = datetime.fromisoformat(data['created_at'])
         book.modified_at = datetime.fromisoformat(data['modified_at'])
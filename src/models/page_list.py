@@ -0,0 +1,89 @@
+"""
+Page container that can load its pages on demand
+"""
+import copy
+from collections.abc import MutableSequence
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Union
+
+if TYPE_CHECKING:
+    from .book import Page
+
+
+class PageList(MutableSequence):
+    """The pages of a book, optionally backed by a lazy record loader.
+    
+    A lazily loaded list starts out holding only record numbers; a Page is
+    created by loader(record) the first time its position is read and kept
+    from then on. Inserting, removing and moving pages works on the record
+    numbers directly, so pages never accessed are never loaded.
+    """
+    
+    def __init__(self, pages: Optional[Iterable['Page']] = None, count: int = 0,
+                 loader: Optional[Callable[[int], 'Page']] = None):
+        self._items: List[Union[int, 'Page']] = list(pages) if pages is not None else []
+        self._loader = loader
+        if loader is not None:
+            self._items.extend(range(count))
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._items)))]
+        item = self._items[index]
+        if isinstance(item, int):
+            if index < 0:
+                index += len(self._items)
+            item = self._loader(item)
+            item.page_number = index
+            self._items[index] = item
+        return item
+    
+    def __setitem__(self, index, page: 'Page') -> None:
+        self._items[index] = page
+    
+    def __delitem__(self, index) -> None:
+        del self._items[index]
+    
+    def __iter__(self) -> Iterator['Page']:
+        for index in range(len(self._items)):
+            yield self[index]
+    
+    def insert(self, index: int, page: 'Page') -> None:
+        self._items.insert(index, page)
+    
+    def pop(self, index: int = -1) -> 'Page':
+        page = self[index]
+        del self._items[index]
+        return page
+    
+    def copy(self) -> 'PageList':
+        """Copy the list and its loaded pages; unloaded pages share the loader"""
+        pages = PageList()
+        pages._items = [item if isinstance(item, int) else copy.copy(item) for item in self._items]
+        pages._loader = self._loader
+        return pages
+    
+    def renumber(self, first: int, last: int) -> None:
+        """Update the page numbers of loaded pages in an index range"""
+        for index in range(first, last + 1):
+            item = self._items[index]
+            if not isinstance(item, int):
+                item.page_number = index
+    
+    def is_loaded(self, index: int) -> bool:
+        """Check whether the page at an index has been created"""
+        return not isinstance(self._items[index], int)
+    
+    def loaded_count(self) -> int:
+        """Number of pages created so far"""
+        return sum(1 for item in self._items if not isinstance(item, int))
+    
+    def detach(self) -> None:
+        """Load every page and drop the loader, releasing its source"""
+        if self._loader is None:
+            return
+        for index in range(len(self._items)):
+            self[index]
+        self._loader = None
@@ -1,14 +1,24 @@
 """
 UI package initialization
+
+Widgets are imported when first accessed, so importing one module of the
+package does not load the others.
 """
-from .main_window import MainWindow
-from .viewer import ImageViewerWidget
-from .page_manager import PageManagerWidget
-from .book_manager import BookManagerWidget
-
-__all__ = [
-    'MainWindow',
-    'ImageViewerWidget',
-    'PageManagerWidget',
-    'BookManagerWidget'
-]
+import importlib
+
+_EXPORTS = {
+    'MainWindow': '.main_window',
+    'ImageViewerWidget': '.viewer',
+    'PageManagerWidget': '.page_manager',
+    'BookManagerWidget': '.book_manager',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,152 @@
+"""
+Debounced background saving of the open book
+"""
+import time
+from typing import Optional
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from ..models import book as book_events
+from ..models.book import Book
+from ..utils.storage import BookStorage, SaveJob
+
+
+class SaveSignals(QObject):
+    """Signals emitted by SaveTask"""
+    
+    finished = pyqtSignal(int, bool, float)  # token, succeeded, seconds taken
+
+
+class SaveTask(QRunnable):
+    """Runs a prepared save off the GUI thread"""
+    
+    def __init__(self, job: SaveJob, token: int):
+        super().__init__()
+        self.job = job
+        self.token = token
+        self.ok = False
+        self.seconds = 0.0
+        self.signals = SaveSignals()
+    
+    def run(self):
+        started = time.perf_counter()
+        self.ok = self.job.run()
+        self.seconds = time.perf_counter() - started
+        self.signals.finished.emit(self.token, self.ok, self.seconds)
+
+
+class AutosaveScheduler(QObject):
+    """Saves a book some time after it was last edited.
+    
+    Every edit restarts a short delay, so a burst of edits ends in a single
+    save; a longer deadline makes sure a steady stream of edits is still
+    saved now and then. The save is captured on the GUI thread, which only
+    copies what has to be written, and written by a single worker thread so
+    saves reach the disk in order.
+    """
+    
+    state_changed = pyqtSignal()
+    
+    # Milliseconds to wait after the last edit, and at most after the first
+    DEBOUNCE_MS = 1500
+    MAX_DELAY_MS = 10000
+    
+    def __init__(self, storage: Optional[BookStorage], parent=None):
+        super().__init__(parent)
+        self.storage = storage
+        self.book: Optional[Book] = None
+        self.filename: Optional[str] = None
+        self.saving = False
+        self.last_error = False
+        self.last_latency: Optional[float] = None
+        self._task: Optional[SaveTask] = None
+        self._token = 0
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.save_now)
+        self._deadline = QTimer(self)
+        self._deadline.setSingleShot(True)
+        self._deadline.setInterval(self.MAX_DELAY_MS)
+        self._deadline.timeout.connect(self.save_now)
+    
+    @property
+    def pending(self) -> bool:
+        """Whether the book has edits that are not saved yet"""
+        return self.book is not None and self.book.is_dirty
+    
+    def set_book(self, book: Optional[Book], filename: Optional[str]) -> None:
+        """Autosave a book under filename; None disables autosaving"""
+        self.flush()
+        if self.book is not None:
+            self.book.remove_listener(self.on_book_changed)
+        self.book = book
+        self.filename = filename if book is not None else None
+        self.last_error = False
+        if book is not None:
+            book.add_listener(self.on_book_changed)
+            if book.is_dirty:
+                self.schedule()
+        self.state_changed.emit()
+    
+    def on_book_changed(self, event: str, *args):
+        """Schedule a save after an edit"""
+        if event == book_events.DIRTY_CHANGED:
+            self.state_changed.emit()
+        if self.pending:
+            self.schedule()
+    
+    def schedule(self) -> None:
+        """Save after the debounce delay, or the deadline, whichever is first"""
+        if self.filename is None:
+            return
+        self._debounce.start()
+        if not self._deadline.isActive():
+            self._deadline.start()
+    
+    def save_now(self) -> None:
+        """Start saving the pending edits in the background"""
+        self._debounce.stop()
+        self._deadline.stop()
+        if self.saving or not self.pending or self.filename is None:
+            # Saves already running are followed up by _on_saved()
+            return
+        job = self.storage.prepare_save(self.book, self.filename)
+        self.book.mark_clean()
+        self.saving = True
+        self._token += 1
+        self._task = SaveTask(job, self._token)
+        self._task.signals.finished.connect(self._on_saved)
+        self._pool.start(self._task)
+        self.state_changed.emit()
+    
+    def wait(self) -> None:
+        """Block until the running save, if any, has been written"""
+        self._pool.waitForDone()
+        if self._task is not None:
+            # Take the result now; the queued signal is then ignored
+            self._on_saved(self._task.token, self._task.ok, self._task.seconds)
+    
+    def flush(self) -> None:
+        """Write all pending edits before returning"""
+        self.wait()
+        self._debounce.stop()
+        self._deadline.stop()
+        if self.pending and self.filename is not None:
+            started = time.perf_counter()
+            self.last_error = not self.storage.save_book(self.book, self.filename)
+            self.last_latency = time.perf_counter() - started
+            self.state_changed.emit()
+    
+    def _on_saved(self, token: int, ok: bool, seconds: float):
+        if self._task is None or token != self._task.token:
+            return
+        self._task = None
+        self.saving = False
+        self.last_error = not ok
+        self.last_latency = seconds
+        if not ok and self.book is not None:
+            self.book.mark_dirty()
+        elif self.pending:
+            self.schedule()
+        self.state_changed.emit()
@@ -0,0 +1,126 @@
+"""
+Table model exposing the library catalog to the open dialog
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QRect, QTimer
+from PyQt6.QtGui import QPixmap
+from ..utils.catalog import BookSummary
+from ..utils.cover_atlas import CoverAtlas
+from ..utils.image_cache import ImageCache
+
+
+class BookListModel(QAbstractTableModel):
+    """Model over a list of catalog summaries.
+    
+    The raw values are exposed under SORT_ROLE so a proxy model can sort
+    numbers and dates without parsing the displayed text.
+    
+    With a cover atlas the first column is decorated with the book cover.
+    A sheet of the atlas is read the first time a view asks for one of
+    its covers, after that paint, and then serves every book on it.
+    """
+    
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+    COLUMNS = ("名前", "タイトル", "ページ数", "更新日時")
+    
+    # Sheets kept loaded; one sheet is about 1.5 MB
+    SHEET_CACHE_BYTES = 32 * 1024 * 1024
+    
+    def __init__(self, atlas: Optional[CoverAtlas] = None, parent=None):
+        super().__init__(parent)
+        self.summaries: List[BookSummary] = []
+        self.atlas = atlas
+        self._sheets = ImageCache(self.SHEET_CACHE_BYTES, name='cover_sheets')
+        self._pending: Set[int] = set()
+        self._load_timer = QTimer(self)
+        self._load_timer.setSingleShot(True)
+        self._load_timer.setInterval(0)
+        self._load_timer.timeout.connect(self._load_pending)
+    
+    def set_summaries(self, summaries: List[BookSummary]) -> None:
+        """Replace the listed books"""
+        self.beginResetModel()
+        self.summaries = list(summaries)
+        self.endResetModel()
+    
+    def summary(self, row: int) -> Optional[BookSummary]:
+        """Get the summary shown in a row"""
+        if 0 <= row < len(self.summaries):
+            return self.summaries[row]
+        return None
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.summaries)
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        summary = self.summaries[index.row()]
+        column = index.column()
+        if role == self.SORT_ROLE:
+            return (summary.name, summary.title, summary.page_count, summary.modified_at)[column]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return summary.name
+            if column == 1:
+                return summary.title
+            if column == 2:
+                return summary.page_count
+            return datetime.fromisoformat(summary.modified_at).strftime("%Y-%m-%d %H:%M")
+        if role == Qt.ItemDataRole.DecorationRole and column == 0:
+            return self.cover(summary.name)
+        if role == Qt.ItemDataRole.ToolTipRole and summary.cover_path:
+            return f"表紙: {summary.cover_path}"
+        if role == Qt.ItemDataRole.TextAlignmentRole and column == 2:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+    
+    def cover(self, name: str) -> Optional[QPixmap]:
+        """Cover of a book from its atlas sheet; None until the sheet is loaded"""
+        location = self.atlas.locate(name) if self.atlas is not None else None
+        if location is None:
+            return None
+        sheet, rect = location
+        pixmap = self._sheets.get(sheet)
+        if pixmap is None:
+            self._pending.add(sheet)
+            if not self._load_timer.isActive():
+                self._load_timer.start()
+            return None
+        return None if pixmap.isNull() else pixmap.copy(QRect(*rect))
+    
+    def reload_sheets(self, sheets: Iterable[int]) -> None:
+        """Drop sheets that were rewritten and repaint the covers"""
+        for sheet in sheets:
+            self._sheets.discard(sheet)
+        self._refresh_covers()
+    
+    def _load_pending(self) -> None:
+        """Read the requested sheets in one batch after the view has painted"""
+        pending, self._pending = self._pending, set()
+        for sheet in pending:
+            if sheet in self._sheets:
+                continue
+            # A sheet that cannot be read is kept as a null pixmap, so it is not retried
+            pixmap = QPixmap(self.atlas.sheet_path(sheet))
+            self._sheets.put(sheet, pixmap, pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+        if pending:
+            self._refresh_covers()
+    
+    def _refresh_covers(self) -> None:
+        if self.summaries:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.summaries) - 1, 0),
+                                  [Qt.ItemDataRole.DecorationRole])
@@ -1,23 +1,53 @@
 """
 Book manager dialog for loading and managing saved books
 """
+from typing import List, Optional
 from PyQt6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
-    QPushButton, QLabel, QMessageBox
+    QDialog, QVBoxLayout, QHBoxLayout, QTableView, QListView, QAbstractItemView, QHeaderView,
+    QLineEdit, QPushButton, QLabel, QMessageBox, QFileDialog, QStackedWidget, QButtonGroup
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QSize, QSortFilterProxyModel, QThread, pyqtSignal
+from ..utils.catalog import BookSummary
+from ..utils.cover_atlas import CoverAtlas
 from ..utils.storage import BookStorage
+from .book_list_model import BookListModel
+
+
+class CoverAtlasWorker(QThread):
+    """Brings the cover atlas up to date off the GUI thread"""
+    
+    sheet_written = pyqtSignal(int)
+    
+    def __init__(self, atlas: CoverAtlas, summaries: List[BookSummary], parent=None):
+        super().__init__(parent)
+        self.atlas = atlas
+        self.summaries = summaries
+    
+    def run(self):
+        try:
+            self.atlas.update(self.summaries, self.sheet_written.emit,
+                              self.isInterruptionRequested)
+        except Exception as e:
+            print(f"Error updating cover atlas: {e}")
 
 
 class BookManagerWidget(QDialog):
-    """Dialog for managing saved books"""
+    """Dialog for managing saved books.
+    
+    Books are shown as a grid of covers or as a sortable table; both views
+    share one model and one selection. Covers come from a CoverAtlas that is
+    updated in the background each time the list is loaded.
+    """
     
     def __init__(self, storage: BookStorage, parent=None):
         super().__init__(parent)
         self.storage = storage
         self.selected_book = None
+        self.selected_book_name = None
+        self.atlas = CoverAtlas(storage.get_sibling_dir("covers"))
+        self.atlas_worker: Optional[CoverAtlasWorker] = None
         self.setWindowTitle("書籍を開く")
-        self.setGeometry(200, 200, 400, 500)
+        self.setGeometry(200, 200, 640, 500)
         
         self.init_ui()
         self.load_book_list()
@@ -31,9 +61,62 @@ class BookManagerWidget(QDialog):
         title.setStyleSheet("font-weight: bold; font-size: 12px;")
         layout.addWidget(title)
         
-        # Book list
-        self.book_list = QListWidget()
-        layout.addWidget(self.book_list)
+        # Filter and view switch
+        filter_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("絞り込み")
+        self.filter_edit.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.filter_edit)
+        
+        self.view_buttons = QButtonGroup(self)
+        for view_index, label in enumerate(("表紙", "一覧")):
+            button = QPushButton(label)
+            button.setCheckable(True)
+            button.setChecked(view_index == 0)
+            self.view_buttons.addButton(button, view_index)
+            filter_layout.addWidget(button)
+        layout.addLayout(filter_layout)
+        
+        # Book list, sorted and filtered by a proxy over the catalog model
+        self.model = BookListModel(self.atlas, self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(BookListModel.SORT_ROLE)
+        self.proxy.setFilterKeyColumn(-1)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+        
+        self.book_list = QTableView()
+        self.book_list.setModel(self.proxy)
+        self.book_list.setSortingEnabled(True)
+        self.book_list.sortByColumn(3, Qt.SortOrder.DescendingOrder)
+        self.book_list.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.book_list.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.book_list.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.book_list.verticalHeader().setVisible(False)
+        self.book_list.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.book_list.doubleClicked.connect(self.open_selected_book)
+        
+        # Cover grid over the same rows; covers are taken from the first column
+        cell_width, cell_height = self.atlas.cell_size
+        self.cover_grid = QListView()
+        self.cover_grid.setViewMode(QListView.ViewMode.IconMode)
+        self.cover_grid.setMovement(QListView.Movement.Static)
+        self.cover_grid.setResizeMode(QListView.ResizeMode.Adjust)
+        self.cover_grid.setUniformItemSizes(True)
+        self.cover_grid.setIconSize(QSize(cell_width, cell_height))
+        self.cover_grid.setGridSize(QSize(cell_width + 24, cell_height + 40))
+        self.cover_grid.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+        self.cover_grid.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.cover_grid.setModel(self.proxy)
+        self.cover_grid.setSelectionModel(self.book_list.selectionModel())
+        self.cover_grid.doubleClicked.connect(self.open_selected_book)
+        
+        self.views = QStackedWidget()
+        self.views.addWidget(self.cover_grid)
+        self.views.addWidget(self.book_list)
+        self.view_buttons.idClicked.connect(self.views.setCurrentIndex)
+        layout.addWidget(self.views)
         
         # Button layout
         button_layout = QHBoxLayout()
@@ -46,6 +129,10 @@ class BookManagerWidget(QDialog):
         delete_btn.clicked.connect(self.delete_selected_book)
         button_layout.addWidget(delete_btn)
         
+        import_btn = QPushButton("バンドルを取り込む")
+        import_btn.clicked.connect(self.import_bundle)
+        button_layout.addWidget(import_btn)
+        
         cancel_btn = QPushButton("キャンセル")
         cancel_btn.clicked.connect(self.reject)
         button_layout.addWidget(cancel_btn)
@@ -54,22 +141,46 @@ class BookManagerWidget(QDialog):
         self.setLayout(layout)
     
     def load_book_list(self):
-        """Load the list of saved books"""
-        self.book_list.clear()
-        books = self.storage.list_books()
-        
-        for book_name in books:
-            item = QListWidgetItem(book_name)
-            self.book_list.addItem(item)
+        """Load the list of saved books and refresh their covers"""
+        summaries = self.storage.list_book_summaries()
+        self.model.set_summaries(summaries)
+        self.stop_atlas_worker()
+        self.atlas_worker = CoverAtlasWorker(self.atlas, summaries, self)
+        self.atlas_worker.sheet_written.connect(self.on_sheet_written)
+        self.atlas_worker.start()
+    
+    def on_sheet_written(self, sheet: int):
+        """Show the covers of a sheet that was just rewritten"""
+        self.model.reload_sheets([sheet])
+    
+    def stop_atlas_worker(self):
+        """Stop a running atlas update; covers not yet drawn are drawn next time"""
+        if self.atlas_worker is not None:
+            self.atlas_worker.requestInterruption()
+            self.atlas_worker.wait()
+            self.atlas_worker = None
+    
+    def done(self, result):
+        self.stop_atlas_worker()
+        super().done(result)
+    
+    def selected_name(self) -> Optional[str]:
+        """Get the file name of the selected book"""
+        index = self.views.currentWidget().currentIndex()
+        if not index.isValid():
+            return None
+        summary = self.model.summary(self.proxy.mapToSource(index).row())
+        return summary.name if summary else None
     
     def open_selected_book(self):
         """Open the selected book"""
-        if self.book_list.currentRow() < 0:
+        book_name = self.selected_name()
+        if book_name is None:
             QMessageBox.warning(self, "警告", "書籍を選択してください。")
             return
         
-        book_name = self.book_list.currentItem().text()
         self.selected_book = self.storage.load_book(book_name)
+        self.selected_book_name = book_name
         
         if self.selected_book:
             self.accept()
@@ -78,20 +189,32 @@ class BookManagerWidget(QDialog):
     
     def delete_selected_book(self):
         """Delete the selected book"""
-        if self.book_list.currentRow() < 0:
+        book_name = self.selected_name()
+        if book_name is None:
             QMessageBox.warning(self, "警告", "書籍を選択してください。")
             return
         
-        book_name = self.book_list.currentItem().text()
         reply = QMessageBox.question(
             self, "確認",
             f"『{book_name}』を削除してもよろしいですか？",
-            QMessageBox.Yes | QMessageBox.No
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
-        if reply == QMessageBox.Yes:
+        if reply == QMessageBox.StandardButton.Yes:
             if self.storage.delete_book(book_name):
                 QMessageBox.information(self, "成功", "書籍を削除しました。")
                 self.load_book_list()
             else:
                 QMessageBox.critical(self, "エラー", "書籍の削除に失敗しました。")
+    
+    def import_bundle(self):
+        """Copy a bundle file into the library"""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "バンドルを取り込む", "", "Bundle Files (*.bundle)")
+        if not path:
+            return
+        
+        if self.storage.import_bundle(path) is not None:
+            self.load_book_list()
+        else:
+            QMessageBox.critical(self, "エラー", "バンドルの取り込みに失敗しました。")
@@ -0,0 +1,215 @@
+"""
+Watching the image files of the open book for changes made by other programs
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+from ..models import book as book_events
+from ..models.book import Book, Page
+from ..utils.metadata import refresh_pages
+from ..utils.page_io import BUNDLE_EXTENSION, close_bundle, split_page_path
+
+
+class PageFileWatcher(QObject):
+    """Refreshes the pages of a book whose files change on disk.
+    
+    The directories holding the pages are watched, which catches files
+    being created, deleted or renamed into place, and so are the files
+    themselves, up to MAX_FILE_WATCHES, which catches rewrites in place.
+    Pages inside a bundle are watched through the bundle file.
+    
+    Notifications are collected until none has arrived for SETTLE_MS, or
+    for at most MAX_DELAY_MS during a long bulk copy, and then handled in
+    one pass that only stats the pages under the paths that changed.
+    
+    Files changed while the book was closed are found by a check of every
+    page that runs in batches of STALE_CHECK_BATCH pages while the event
+    loop is idle, so opening a long book does not stat it all at once.
+    Changed pages are reported through pages_refreshed either way.
+    
+    The same pass starts watching the paths of the pages it checks. After
+    that the watches are kept up to date page by page as pages are added
+    and removed; moving pages leaves them alone. Which pages lie under a
+    changed path is only worked out when a notification is handled.
+    """
+    
+    pages_refreshed = pyqtSignal(list)  # indices of the pages whose files changed or went missing
+    
+    SETTLE_MS = 300
+    MAX_DELAY_MS = 2000
+    # Above this many files only their directories are watched
+    MAX_FILE_WATCHES = 4096
+    STALE_CHECK_BATCH = 200
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.book: Optional[Book] = None
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.on_path_changed)
+        self._watcher.fileChanged.connect(self.on_path_changed)
+        # page -> (file watched for it, directory of that file)
+        self._page_paths: Dict[Page, Tuple[str, str]] = {}
+        # watched path -> number of pages under it
+        self._file_counts: Dict[str, int] = {}
+        self._dir_counts: Dict[str, int] = {}
+        self._watching_files = True
+        self._changed: Set[str] = set()
+        self._first_change = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._check_position = -1  # Next page of the stale check; -1 when done
+        self._check_timer = QTimer(self)
+        self._check_timer.setInterval(0)
+        self._check_timer.timeout.connect(self.check_batch)
+    
+    def set_book(self, book: Optional[Book]) -> None:
+        """Watch the pages of another book"""
+        if self.book is not None:
+            self.book.remove_listener(self.on_book_changed)
+        self.book = book
+        if book is not None:
+            book.add_listener(self.on_book_changed)
+        self._timer.stop()
+        self._changed.clear()
+        watched = self.watched_paths()
+        if watched:
+            self._watcher.removePaths(watched)
+        self._page_paths.clear()
+        self._file_counts.clear()
+        self._dir_counts.clear()
+        self._watching_files = True
+        self._check_position = 0 if book is not None else -1
+        if book is not None:
+            self._check_timer.start()
+        else:
+            self._check_timer.stop()
+    
+    def on_book_changed(self, event: str, *args) -> None:
+        """Watch added pages and stop watching removed ones"""
+        if event == book_events.PAGES_INSERTED:
+            first, last = args
+            self._watch_pages(self.book.pages[first:last + 1])
+        elif event == book_events.PAGES_ABOUT_TO_BE_REMOVED:
+            first, last = args
+            self._unwatch_pages(self.book.pages[first:last + 1])
+        if event in (book_events.PAGES_INSERTED, book_events.PAGES_REMOVED,
+                     book_events.PAGE_MOVED):
+            # Pages before the stale check's position have shifted; check again from there
+            first = min(args)
+            if 0 <= first < self._check_position:
+                self._check_position = first
+    
+    def on_path_changed(self, path: str) -> None:
+        """Collect a notification; the pages are refreshed once things settle"""
+        if not self._changed:
+            self._first_change = time.monotonic()
+        self._changed.add(path)
+        waited = (time.monotonic() - self._first_change) * 1000
+        self._timer.start(max(0, min(self.SETTLE_MS, int(self.MAX_DELAY_MS - waited))))
+    
+    def flush(self) -> List[int]:
+        """Refresh the pages under the paths changed so far; returns their indices"""
+        self._timer.stop()
+        changed, self._changed = self._changed, set()
+        if self.book is None or not changed:
+            return []
+        for path in changed:
+            if path.endswith(BUNDLE_EXTENSION):
+                # A rewritten bundle has to be mapped again
+                close_bundle(path)
+        # Only pages that were loaded can have been watched
+        pages = self.book.pages
+        indices = []
+        for index in range(len(pages)):
+            if pages.is_loaded(index):
+                paths = self._page_paths.get(pages[index])
+                if paths is not None and (paths[0] in changed or paths[1] in changed):
+                    indices.append(index)
+        refreshed = refresh_pages(self.book, indices)
+        # Files replaced by a rename are no longer watched
+        watched = set(self.watched_paths())
+        self._add_watches([path for path in self._watched_keys() if path not in watched])
+        if refreshed:
+            self.pages_refreshed.emit(refreshed)
+        return refreshed
+    
+    def check_batch(self) -> List[int]:
+        """Check the next batch of pages for files changed while the book was closed"""
+        pages = self.book.pages if self.book is not None else ()
+        if not 0 <= self._check_position < len(pages):
+            self._check_position = -1
+            self._check_timer.stop()
+            return []
+        end = min(self._check_position + self.STALE_CHECK_BATCH, len(pages))
+        self._watch_pages(pages[self._check_position:end])
+        refreshed = refresh_pages(self.book, range(self._check_position, end))
+        self._check_position = end
+        if refreshed:
+            self.pages_refreshed.emit(refreshed)
+        return refreshed
+    
+    def is_checking(self) -> bool:
+        """Check whether the stale check of the book is still running"""
+        return self._check_position >= 0
+    
+    def watched_paths(self) -> List[str]:
+        """Directories and files currently watched"""
+        return self._watcher.directories() + self._watcher.files()
+    
+    def _watched_keys(self) -> List[str]:
+        """Paths that should be watched"""
+        if self._watching_files:
+            return list(self._dir_counts) + list(self._file_counts)
+        return list(self._dir_counts)
+    
+    def _watch_pages(self, pages: Iterable[Page]) -> None:
+        """Count pages under their paths, watching paths seen for the first time"""
+        added = []
+        for page in pages:
+            if page in self._page_paths:
+                continue
+            parts = split_page_path(page.image_path)
+            path = os.path.abspath(parts[0] if parts else page.image_path)
+            directory = os.path.dirname(path)
+            self._page_paths[page] = (path, directory)
+            for key, counts in ((path, self._file_counts), (directory, self._dir_counts)):
+                counts[key] = counts.get(key, 0) + 1
+                if counts[key] == 1 and (counts is self._dir_counts or self._watching_files):
+                    added.append(key)
+        if self._watching_files and len(self._file_counts) > self.MAX_FILE_WATCHES:
+            # Too many files: fall back to watching their directories only
+            self._watching_files = False
+            files = set(self._file_counts)
+            added = [path for path in added if path not in files]
+            watched_files = self._watcher.files()
+            if watched_files:
+                self._watcher.removePaths(watched_files)
+        self._add_watches(added)
+    
+    def _unwatch_pages(self, pages: Iterable[Page]) -> None:
+        """Uncount pages, no longer watching paths with no pages left"""
+        removed = []
+        for page in pages:
+            paths = self._page_paths.pop(page, None)
+            if paths is None:
+                continue
+            for key, counts in zip(paths, (self._file_counts, self._dir_counts)):
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+                    removed.append(key)
+        watched = set(self.watched_paths())
+        removed = [path for path in removed if path in watched]
+        if removed:
+            self._watcher.removePaths(removed)
+        if not self._watching_files and len(self._file_counts) <= self.MAX_FILE_WATCHES:
+            self._watching_files = True
+            self._add_watches(list(self._file_counts))
+    
+    def _add_watches(self, paths: List[str]) -> None:
+        added = [path for path in paths if os.path.exists(path)]
+        if added:
+            # Paths that cannot be watched, e.g. on some network drives, are skipped
+            self._watcher.addPaths(added)
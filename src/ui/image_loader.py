@@ -0,0 +1,75 @@
+"""
+Background decoding of page images
+"""
+from typing import TYPE_CHECKING, Optional
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt6.QtGui import QImage
+from ..utils.image import load_image_scaled
+from ..utils.metrics import timed
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Widest rendition shown by the viewer when no viewport size is known
+DISPLAY_MAX_WIDTH = 1000
+
+_QIMAGE_FORMATS = {
+    'RGB': (QImage.Format.Format_RGB888, 3),
+    'RGBA': (QImage.Format.Format_RGBA8888, 4),
+    'L': (QImage.Format.Format_Grayscale8, 1),
+}
+
+
+@timed("image.to_qimage")
+def pil_to_qimage(img: 'Image.Image') -> QImage:
+    """Convert a Pillow image into a QImage that owns its pixels"""
+    if img.mode not in _QIMAGE_FORMATS:
+        has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    image_format, channels = _QIMAGE_FORMATS[img.mode]
+    data = img.tobytes()
+    image = QImage(data, img.width, img.height, img.width * channels, image_format)
+    return image.copy()
+
+
+def decode_display_image(image_path: str, max_width: int = DISPLAY_MAX_WIDTH,
+                         max_height: int = 0) -> Optional[QImage]:
+    """Decode an image directly at display size (in device pixels).
+    
+    Uses QImage rather than QPixmap so it can run on worker threads.
+    """
+    img = load_image_scaled(image_path, max_width, max_height)
+    if img is None:
+        return None
+    return pil_to_qimage(img)
+
+
+class ImageDecodeSignals(QObject):
+    """Signals emitted by ImageDecodeTask"""
+    
+    decoded = pyqtSignal(str, int, QImage)  # image path, token, image (null on failure)
+
+
+class ImageDecodeTask(QRunnable):
+    """Decodes one page image on a QThreadPool worker"""
+    
+    def __init__(self, image_path: str, max_width: int = DISPLAY_MAX_WIDTH, token: int = 0):
+        super().__init__()
+        self.image_path = image_path
+        self.max_width = max_width
+        self.token = token
+        self.cancelled = False
+        self.signals = ImageDecodeSignals()
+    
+    def cancel(self) -> None:
+        """Skip the decode if the task has not started yet"""
+        self.cancelled = True
+    
+    def run(self):
+        if self.cancelled:
+            return
+        image = decode_display_image(self.image_path, self.max_width)
+        if self.cancelled:
+            return
+        self.signals.decoded.emit(self.image_path, self.token,
+                                  image if image is not None else QImage())
@@ -0,0 +1,136 @@
+"""
+Background image import with a non-modal progress dialog
+"""
+import time
+from typing import List
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QListWidget, QProgressBar, QPushButton
+)
+from PyQt6.QtCore import QThread, pyqtSignal
+from ..utils.importer import ImportJob
+
+
+class ImportWorker(QThread):
+    """Runs an ImportJob off the GUI thread and reports in batches"""
+    
+    progress = pyqtSignal(int, int)  # done, total
+    file_failed = pyqtSignal(str, str)  # image path, error message
+    batch_ready = pyqtSignal(list, list)  # image paths and their page metadata
+    import_finished = pyqtSignal(int, int, bool)  # added, failed, cancelled
+    
+    # A batch is committed when it reaches this many pages or this age
+    BATCH_SIZE = 200
+    BATCH_INTERVAL = 0.25
+    
+    def __init__(self, job: ImportJob, parent=None):
+        super().__init__(parent)
+        self.job = job
+    
+    def cancel(self):
+        """Ask the job to stop"""
+        self.job.cancel()
+    
+    def run(self):
+        total = len(self.job.image_paths)
+        done = added = failed = 0
+        batch: List[str] = []
+        batch_metadata: List[dict] = []
+        last_flush = time.monotonic()
+        try:
+            for result in self.job.run():
+                done += 1
+                if result.ok:
+                    batch.append(result.image_path)
+                    batch_metadata.append(result.metadata)
+                    added += 1
+                else:
+                    self.file_failed.emit(result.image_path, result.error)
+                    failed += 1
+                now = time.monotonic()
+                if len(batch) >= self.BATCH_SIZE or now - last_flush >= self.BATCH_INTERVAL:
+                    if batch:
+                        self.batch_ready.emit(batch, batch_metadata)
+                        batch, batch_metadata = [], []
+                    self.progress.emit(done, total)
+                    last_flush = now
+        except Exception as e:
+            print(f"Error importing images: {e}")
+        if batch:
+            self.batch_ready.emit(batch, batch_metadata)
+        self.progress.emit(done, total)
+        self.import_finished.emit(added, failed, self.job.cancelled)
+
+
+class ImportProgressDialog(QDialog):
+    """Non-modal dialog showing import progress and per-file errors"""
+    
+    def __init__(self, worker: ImportWorker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.setWindowTitle("画像を追加")
+        self.setModal(False)
+        self.resize(420, 300)
+        
+        self.init_ui()
+        
+        worker.progress.connect(self.on_progress)
+        worker.file_failed.connect(self.on_file_failed)
+        worker.import_finished.connect(self.on_finished)
+    
+    def init_ui(self):
+        """Initialize the UI"""
+        layout = QVBoxLayout()
+        
+        self.status_label = QLabel("画像を確認しています...")
+        layout.addWidget(self.status_label)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, len(self.worker.job.image_paths))
+        layout.addWidget(self.progress_bar)
+        
+        self.error_list = QListWidget()
+        self.error_list.setVisible(False)
+        layout.addWidget(self.error_list)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.cancel_btn = QPushButton("キャンセル")
+        self.cancel_btn.clicked.connect(self.on_cancel_clicked)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    def on_progress(self, done: int, total: int):
+        """Update the progress bar"""
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"{done} / {total} 枚を処理しました")
+    
+    def on_file_failed(self, image_path: str, error: str):
+        """List a file that could not be imported"""
+        self.error_list.setVisible(True)
+        self.error_list.addItem(f"{image_path}: {error}")
+    
+    def on_finished(self, added: int, failed: int, cancelled: bool):
+        """Show the summary and turn the cancel button into close"""
+        summary = f"{added}個の画像を追加しました。"
+        if failed:
+            summary += f" {failed}個のファイルを追加できませんでした。"
+        if cancelled:
+            summary = "キャンセルしました。" + summary
+        self.status_label.setText(summary)
+        self.cancel_btn.setText("閉じる")
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.clicked.disconnect(self.on_cancel_clicked)
+        self.cancel_btn.clicked.connect(self.accept)
+    
+    def on_cancel_clicked(self):
+        """Cancel the running import"""
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("キャンセルしています...")
+        self.worker.cancel()
+    
+    def closeEvent(self, event):
+        if self.worker.isRunning():
+            self.worker.cancel()
+        super().closeEvent(event)
@@ -3,18 +3,28 @@ Main application window
 """
 import sys
 import os
+from typing import Optional
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-    QPushButton, QLabel, QFileDialog, QMessageBox, QSplitter
+    QPushButton, QLabel, QFileDialog, QMessageBox, QSplitter, QProgressDialog
 )
 from PyQt6.QtCore import Qt, QSize
-from PyQt6.QtGui import QIcon
+from PyQt6.QtGui import QAction, QIcon, QImage
 
-from ..models.book import Book
-from ..utils.storage import BookStorage
+from ..models.book import Book, Page
+from ..utils.image import file_revision_key
+from ..utils.image_cache import ImageMemoryManager, image_memory_budget
+from ..utils.storage import BookStorage, sibling_dir
+from ..utils.thumbnail_cache import ThumbnailCache
+from ..utils.tiles import TileStore
+from ..utils.metadata import refresh_pages
 from .page_manager import PageManagerWidget
 from .viewer import ImageViewerWidget
-from .book_manager import BookManagerWidget
+from .prefetcher import PagePrefetcher
+from .autosave import AutosaveScheduler
+from .file_watcher import PageFileWatcher
+
+STORAGE_DIR = "books"
 
 
 class MainWindow(QMainWindow):
@@ -26,10 +36,44 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1400, 900)
         
         self.current_book = None
-        self.storage = BookStorage(storage_dir="books")
+        # Opened on first use or by finish_startup() once the window is shown
+        self._storage = None
+        self.thumbnail_cache = ThumbnailCache(cache_dir=sibling_dir(STORAGE_DIR, "thumbnails"))
+        self.tile_store = TileStore(cache_dir=sibling_dir(STORAGE_DIR, "tiles"))
+        # Thumbnails, zoom tiles, prefetched renditions and the page on screen
+        # share one budget for decoded images
+        self.image_memory = ImageMemoryManager(image_memory_budget())
+        self.prefetcher = PagePrefetcher(cache=self.image_memory.cache("renditions"), parent=self)
+        self.import_worker = None
+        self.optimize_dialog = None
+        self.page_hash_index = None
+        self.similar_dialog = None
+        self.metrics_panel = None
+        self.autosave = AutosaveScheduler(None, self)
+        self.file_watcher = PageFileWatcher(self)
+        self.file_watcher.pages_refreshed.connect(self.on_page_files_changed)
         
         self.init_ui()
     
+    @property
+    def storage(self) -> BookStorage:
+        """The book storage, opened on first use"""
+        if self._storage is None:
+            self._storage = BookStorage(storage_dir=STORAGE_DIR)
+            self.autosave.storage = self._storage
+        return self._storage
+    
+    def finish_startup(self):
+        """Open the storage and bring its catalog up to date.
+        
+        Called after the window is first shown so the catalog scan does not
+        delay the first paint, and the book list then opens without one.
+        """
+        try:
+            self.storage.reconcile()
+        except Exception as e:
+            print(f"Error updating catalog: {e}")
+    
     def init_ui(self):
         """Initialize the user interface"""
         # Main central widget
@@ -46,14 +90,18 @@ class MainWindow(QMainWindow):
         content_layout = QHBoxLayout()
         
         # Left side: Page manager
-        self.page_manager = PageManagerWidget()
+        self.page_manager = PageManagerWidget(self.thumbnail_cache, self.image_memory)
         self.page_manager.page_selected.connect(self.on_page_selected)
         self.page_manager.page_moved.connect(self.on_pages_reordered)
         self.page_manager.page_deleted.connect(self.on_page_deleted)
         self.page_manager.cover_set.connect(self.on_cover_set)
+        self.page_manager.find_similar_requested.connect(self.find_similar_pages)
         
         # Right side: Image viewer
-        self.image_viewer = ImageViewerWidget()
+        self.image_viewer = ImageViewerWidget(self.prefetcher.cache, self.tile_store,
+                                              self.image_memory)
+        self.prefetcher.image_ready.connect(self.image_viewer.on_image_ready)
+        self.image_viewer.page_changed.connect(self.page_manager.set_current_row)
         
         # Add widgets to splitter
         splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -67,6 +115,18 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(content_layout)
         
         central_widget.setLayout(main_layout)
+        
+        # Autosave state
+        self.save_status_label = QLabel()
+        self.statusBar().addPermanentWidget(self.save_status_label)
+        self.autosave.state_changed.connect(self.update_save_status)
+        self.update_save_status()
+        
+        # Performance panel
+        metrics_action = QAction("パフォーマンス", self)
+        metrics_action.setShortcut("F12")
+        metrics_action.triggered.connect(self.toggle_metrics_panel)
+        self.addAction(metrics_action)
     
     def create_toolbar(self) -> QHBoxLayout:
         """Create the toolbar"""
@@ -92,6 +152,16 @@ class MainWindow(QMainWindow):
         save_book_btn.clicked.connect(self.save_book)
         toolbar_layout.addWidget(save_book_btn)
         
+        # Export bundle button
+        export_btn = QPushButton("書き出し")
+        export_btn.clicked.connect(self.export_bundle)
+        toolbar_layout.addWidget(export_btn)
+        
+        # Optimize images button
+        optimize_btn = QPushButton("最適化")
+        optimize_btn.clicked.connect(self.optimize_images)
+        toolbar_layout.addWidget(optimize_btn)
+        
         toolbar_layout.addStretch()
         
         # Book title label
@@ -102,8 +172,13 @@ class MainWindow(QMainWindow):
     
     def new_book(self):
         """Create a new book"""
+        self.save_reading_position()
         self.current_book = Book("新規書籍")
+        self.autosave.set_book(self.current_book, None)
+        self.file_watcher.set_book(self.current_book)
         self.page_manager.set_book(self.current_book)
+        self.prefetcher.set_book(self.current_book)
+        self.image_viewer.set_book(self.current_book)
         self.image_viewer.clear()
         self.title_label.setText("新規書籍")
     
@@ -113,40 +188,75 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "最初に書籍を新規作成してください。")
             return
         
+        if self.import_worker is not None and self.import_worker.isRunning():
+            QMessageBox.warning(self, "警告", "画像の追加が進行中です。")
+            return
+        
         file_dialog = QFileDialog()
-        file_dialog.setFileMode(QFileDialog.ExistingFiles)
+        file_dialog.setFileMode(QFileDialog.FileMode.ExistingFiles)
         file_dialog.setNameFilter("PNG Images (*.png)")
         
-        if file_dialog.exec_():
-            file_paths = file_dialog.selectedFiles()
-            for file_path in file_paths:
-                self.current_book.add_page(file_path)
-            
-            self.page_manager.set_book(self.current_book)
-            QMessageBox.information(self, "成功", f"{len(file_paths)}個の画像を追加しました。")
+        if file_dialog.exec():
+            self.start_import(file_dialog.selectedFiles())
+    
+    def start_import(self, file_paths: list):
+        """Validate and add images in the background with a progress dialog"""
+        from ..utils.importer import ImportJob
+        from .import_dialog import ImportProgressDialog, ImportWorker
+        
+        job = ImportJob(file_paths, thumbnail_dir=self.thumbnail_cache.cache_dir,
+                        thumbnail_height=self.thumbnail_cache.height)
+        worker = ImportWorker(job, self)
+        # Pages go to the book the import was started for
+        target_book = self.current_book
+        worker.batch_ready.connect(target_book.add_pages)
+        
+        dialog = ImportProgressDialog(worker, self)
+        dialog.show()
+        
+        self.import_worker = worker
+        worker.start()
     
     def on_page_selected(self, page_index: int):
         """Handle page selection"""
         if self.current_book and 0 <= page_index < len(self.current_book.pages):
-            image_path = self.current_book.pages[page_index].image_path
-            self.image_viewer.load_image(image_path)
+            if self.image_viewer.is_continuous():
+                self.image_viewer.scroll_to_page(page_index)
+                return
+            page = self.current_book.pages[page_index]
+            image_path = page.image_path
+            # Pages already being prefetched arrive through image_ready
+            self.prefetcher.set_target_width(self.image_viewer.target_width())
+            pending = self.prefetcher.is_pending(image_path)
+            self.image_viewer.load_image(image_path, decode=not pending, page=page)
+            self.prefetcher.update_position(page_index)
     
     def on_pages_reordered(self):
         """Handle pages reordering"""
-        if self.current_book:
-            self.page_manager.set_book(self.current_book)
+        # The page list follows the book's change events on its own
+        pass
     
     def on_page_deleted(self):
         """Handle page deletion"""
         if self.current_book:
-            self.page_manager.set_book(self.current_book)
-            self.image_viewer.clear()
+            current_index = self.page_manager.current_row()
+            if current_index >= 0:
+                self.on_page_selected(current_index)
+            else:
+                self.image_viewer.clear()
+    
+    def on_page_files_changed(self, page_indices: list):
+        """Drop renditions of pages rewritten by other programs and show the new content"""
+        pages = self.current_book.pages
+        self.prefetcher.invalidate(pages[index].image_path for index in page_indices)
+        current_index = self.page_manager.current_row()
+        if current_index in page_indices:
+            self.on_page_selected(current_index)
     
     def on_cover_set(self, page_index: int):
         """Handle cover page setting"""
-        if self.current_book:
-            self.current_book.set_cover_page(page_index)
-            self.page_manager.set_book(self.current_book)
+        # The cover was already set on the book and the list patched its rows
+        pass
     
     def save_book(self):
         """Save the current book"""
@@ -156,12 +266,62 @@ class MainWindow(QMainWindow):
         
         filename, ok = self.get_save_filename()
         if ok and filename:
+            # Let a background save finish so saves reach the disk in order
+            self.autosave.wait()
             if self.storage.save_book(self.current_book, filename):
+                # From now on edits are saved automatically under this name
+                self.autosave.set_book(self.current_book, filename)
                 QMessageBox.information(self, "成功", "書籍を保存しました。")
                 self.title_label.setText(filename)
             else:
                 QMessageBox.critical(self, "エラー", "書籍の保存に失敗しました。")
     
+    def export_bundle(self):
+        """Export the current book and its images as a single bundle file"""
+        if self.current_book is None or not self.current_book.pages:
+            QMessageBox.warning(self, "警告", "書き出す書籍がありません。")
+            return
+        
+        path, _ = QFileDialog.getSaveFileName(
+            self, "バンドルを書き出し", f"{self.current_book.title}.bundle",
+            "Bundle Files (*.bundle)")
+        if not path:
+            return
+        
+        # Export a copy so edits during the export do not change its contents
+        book = self.current_book.snapshot()
+        progress = QProgressDialog("書き出し中...", "キャンセル", 0, len(book.pages), self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(500)
+        
+        def report(done: int, total: int) -> bool:
+            progress.setValue(done)
+            return not progress.wasCanceled()
+        
+        ok = self.storage.export_bundle(book, path, report)
+        progress.close()
+        if ok:
+            QMessageBox.information(self, "成功", "バンドルを書き出しました。")
+        elif not progress.wasCanceled():
+            QMessageBox.critical(self, "エラー", "バンドルの書き出しに失敗しました。")
+    
+    def optimize_images(self):
+        """Recompress the current book's images into the optimized directory"""
+        if self.current_book is None or not self.current_book.pages:
+            QMessageBox.warning(self, "警告", "最適化する書籍がありません。")
+            return
+        
+        from .optimize_dialog import OptimizeDialog
+        
+        dialog = self.optimize_dialog
+        if dialog is not None and dialog.worker is not None and dialog.worker.isRunning():
+            dialog.raise_()
+            return
+        
+        self.optimize_dialog = OptimizeDialog(
+            self.current_book.snapshot(), self.storage.get_sibling_dir("optimized"), self)
+        self.optimize_dialog.show()
+    
     def open_book_dialog(self):
         """Open a saved book"""
         books = self.storage.list_books()
@@ -172,26 +332,166 @@ class MainWindow(QMainWindow):
         # Simple book selection dialog
         from .book_manager import BookManagerWidget
         dialog = BookManagerWidget(self.storage)
-        dialog.exec_()
+        dialog.exec()
+        
+        if dialog.selected_book:
+            self.show_book(dialog.selected_book, dialog.selected_book_name)
+    
+    def show_book(self, book: Book, filename: str):
+        """Make a saved book the current book"""
+        self.save_reading_position()
+        self.current_book = book
+        self.autosave.set_book(book, filename)
+        self.file_watcher.set_book(book)
+        self.page_manager.set_book(self.current_book)
+        self.prefetcher.set_book(self.current_book)
+        self.image_viewer.set_book(self.current_book)
+        self.image_viewer.clear()
+        self.title_label.setText(self.current_book.title)
+        self.resume_reading(filename)
+    
+    def resume_reading(self, filename: str):
+        """Go to the page the book was left at.
+        
+        The rendition kept from the last session is painted right away and
+        replaced once the page has been decoded at full quality.
+        """
+        position = self.storage.reading_position(filename)
+        if position is None:
+            return
+        page_index, page_key = position
+        if not 0 <= page_index < len(self.current_book.pages):
+            return
+        # The file watcher checks the rest of the pages in the background
+        refresh_pages(self.current_book, [page_index])
+        page = self.current_book.pages[page_index]
+        if page_key is not None and page_key == _resume_key(page):
+            preview = QImage(self.storage.resume_path(filename))
+            self.image_viewer.show_preview(page.image_path, preview)
+        self.page_manager.set_current_row(page_index)
+    
+    def save_reading_position(self):
+        """Remember the page of the current book and keep a rendition of it"""
+        filename = self.autosave.filename
+        page_index = self.page_manager.current_row()
+        if self.current_book is None or filename is None or \
+                not 0 <= page_index < len(self.current_book.pages):
+            return
+        page_key = _resume_key(self.current_book.pages[page_index])
+        path = self.storage.resume_path(filename)
+        previous = self.storage.reading_position(filename)
+        if page_key is None or (previous is not None and previous[1] == page_key
+                                and os.path.exists(path)):
+            self.storage.set_reading_position(filename, page_index, page_key)
+            return
+        image = self.image_viewer.current_image()
+        if image is None or not _write_image(image, path):
+            page_key = None
+        self.storage.set_reading_position(filename, page_index, page_key)
+    
+    def find_similar_pages(self, page_index: int):
+        """Search every saved book for pages that look like a page"""
+        if self.current_book is None or not 0 <= page_index < len(self.current_book.pages):
+            return
+        
+        if self.similar_dialog is not None and self.similar_dialog.worker.isRunning():
+            self.similar_dialog.raise_()
+            return
         
-        selected_book = dialog.selected_book
-        if selected_book:
-            self.current_book = selected_book
-            self.page_manager.set_book(self.current_book)
-            self.image_viewer.clear()
-            self.title_label.setText(self.current_book.title)
+        from ..utils.page_hashes import PageHashIndex
+        from .similar_dialog import SimilarPagesDialog
+        
+        if self.page_hash_index is None:
+            self.page_hash_index = PageHashIndex(self.storage.get_sibling_dir("page_hashes"))
+        self.similar_dialog = SimilarPagesDialog(
+            self.page_hash_index, self.storage, self.current_book.pages[page_index].image_path,
+            self.thumbnail_cache, self)
+        self.similar_dialog.page_requested.connect(self.show_saved_page)
+        self.similar_dialog.show()
+    
+    def show_saved_page(self, book_name: str, page_index: int):
+        """Show a page of a saved book, opening the book if needed"""
+        if book_name != self.autosave.filename:
+            book = self.storage.load_book(book_name)
+            if book is None:
+                QMessageBox.critical(self, "エラー", "書籍の読み込みに失敗しました。")
+                return
+            self.show_book(book, book_name)
+        if 0 <= page_index < len(self.current_book.pages):
+            self.page_manager.set_current_row(page_index)
+    
+    def toggle_metrics_panel(self):
+        """Show or hide the performance panel"""
+        if self.metrics_panel is None:
+            from .metrics_panel import MetricsPanel
+            self.metrics_panel = MetricsPanel(parent=self)
+            self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.metrics_panel)
+            return
+        self.metrics_panel.setVisible(not self.metrics_panel.isVisible())
+    
+    def closeEvent(self, event):
+        """Stop background workers before the window is destroyed"""
+        if self.import_worker is not None:
+            self.import_worker.cancel()
+            self.import_worker.wait()
+        if self.optimize_dialog is not None:
+            self.optimize_dialog.close()
+        if self.similar_dialog is not None:
+            self.similar_dialog.close()
+        self.save_reading_position()
+        self.autosave.flush()
+        self.prefetcher.shutdown()
+        self.image_viewer.shutdown()
+        if self._storage is not None:
+            self._storage.close()
+        super().closeEvent(event)
+    
+    def update_save_status(self):
+        """Show whether the book has unsaved edits and how long saving took"""
+        autosave = self.autosave
+        if autosave.filename is None:
+            text = "未保存" if autosave.pending else ""
+        elif autosave.saving:
+            text = "保存中..."
+        elif autosave.last_error:
+            text = "自動保存に失敗しました"
+        elif autosave.pending:
+            text = "未保存の変更があります"
+        elif autosave.last_latency is not None:
+            text = f"保存済み ({autosave.last_latency * 1000:.0f} ms)"
+        else:
+            text = "保存済み"
+        self.save_status_label.setText(text)
     
     def get_save_filename(self) -> tuple:
         """Get filename for saving book"""
         dialog = QFileDialog()
-        dialog.setDefaultSuffix("json")
-        dialog.setNameFilter("JSON Files (*.json)")
-        dialog.setFileMode(QFileDialog.AnyFile)
+        dialog.setDefaultSuffix("book")
+        dialog.setNameFilter("Book Files (*.book)")
+        dialog.setFileMode(QFileDialog.FileMode.AnyFile)
         
-        if dialog.exec_():
+        if dialog.exec():
             files = dialog.selectedFiles()
             if files:
                 filename = os.path.splitext(os.path.basename(files[0]))[0]
                 return filename, True
         
         return "", False
+
+
+def _resume_key(page: Page) -> Optional[str]:
+    """Key of the page revision a resume rendition is made from"""
+    return file_revision_key(page.image_path, "resume", page.file_size, page.mtime_ns)
+
+
+def _write_image(image: QImage, path: str) -> bool:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Light compression: written on every book switch, read once
+        if not image.save(f"{path}.tmp", "PNG", 80):
+            return False
+        os.replace(f"{path}.tmp", path)
+        return True
+    except OSError as e:
+        print(f"Error saving resume image: {e}")
+        return False
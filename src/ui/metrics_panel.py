@@ -0,0 +1,115 @@
+"""
+Dockable panel showing the live performance metrics
+"""
+from PyQt6.QtWidgets import (
+    QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTreeWidget,
+    QTreeWidgetItem, QFileDialog, QMessageBox
+)
+from PyQt6.QtCore import QTimer
+from ..utils.metrics import Metrics, metrics as default_metrics
+
+
+class MetricsPanel(QDockWidget):
+    """Timers, counters and cache hit ratios, refreshed while visible.
+    
+    Showing the panel turns metrics on; they stay on when it is hidden so
+    a session can be recorded and exported later.
+    """
+    
+    REFRESH_MS = 1000
+    COLUMNS = ["項目", "回数", "平均 (ms)", "p95 (ms)", "最大 (ms)", "合計 (ms)"]
+    
+    def __init__(self, metrics: Metrics = default_metrics, parent=None):
+        super().__init__("パフォーマンス", parent)
+        self.metrics = metrics
+        self.setObjectName("metrics_panel")
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        
+        self.init_ui()
+    
+    def init_ui(self):
+        """Initialize the UI"""
+        content = QWidget()
+        layout = QVBoxLayout()
+        
+        controls = QHBoxLayout()
+        self.enabled_check = QCheckBox("計測する")
+        self.enabled_check.setChecked(self.metrics.enabled)
+        self.enabled_check.toggled.connect(self.set_enabled)
+        controls.addWidget(self.enabled_check)
+        controls.addStretch()
+        
+        reset_btn = QPushButton("リセット")
+        reset_btn.clicked.connect(self.reset)
+        controls.addWidget(reset_btn)
+        
+        json_btn = QPushButton("JSON")
+        json_btn.setToolTip("集計をJSONで書き出す")
+        json_btn.clicked.connect(self.export_json)
+        controls.addWidget(json_btn)
+        
+        trace_btn = QPushButton("トレース")
+        trace_btn.setToolTip("記録した区間をChromeのトレース形式で書き出す")
+        trace_btn.clicked.connect(self.export_trace)
+        controls.addWidget(trace_btn)
+        layout.addLayout(controls)
+        
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(len(self.COLUMNS))
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setRootIsDecorated(False)
+        layout.addWidget(self.tree)
+        
+        content.setLayout(layout)
+        self.setWidget(content)
+    
+    def set_enabled(self, enabled: bool):
+        """Turn recording on or off"""
+        self.metrics.enabled = enabled
+        self.refresh()
+    
+    def reset(self):
+        """Forget what was recorded so far"""
+        self.metrics.reset()
+        self.refresh()
+    
+    def refresh(self):
+        """Show the current numbers"""
+        summary = self.metrics.to_dict()
+        self.tree.clear()
+        for name, timer in summary['timers'].items():
+            self.tree.addTopLevelItem(QTreeWidgetItem([
+                name, str(timer['count']), f"{timer['mean_ms']:.2f}", f"{timer['p95_ms']:.2f}",
+                f"{timer['max_ms']:.2f}", f"{timer['total_ms']:.1f}"]))
+        for name, value in summary['counters'].items():
+            self.tree.addTopLevelItem(QTreeWidgetItem([name, str(value)]))
+        for name, ratio in summary['hit_ratios'].items():
+            self.tree.addTopLevelItem(QTreeWidgetItem([f"{name} ヒット率", f"{ratio * 100:.1f}%"]))
+        for column in range(len(self.COLUMNS)):
+            self.tree.resizeColumnToContents(column)
+    
+    def export_json(self):
+        """Save the summary as JSON"""
+        path, _ = QFileDialog.getSaveFileName(self, "JSONを書き出し", "metrics.json",
+                                              "JSON Files (*.json)")
+        if path and not self.metrics.write_json(path):
+            QMessageBox.critical(self, "エラー", "書き出しに失敗しました。")
+    
+    def export_trace(self):
+        """Save the recorded spans for chrome://tracing or Perfetto"""
+        path, _ = QFileDialog.getSaveFileName(self, "トレースを書き出し", "trace.json",
+                                              "Trace Files (*.json)")
+        if path and not self.metrics.write_chrome_trace(path):
+            QMessageBox.critical(self, "エラー", "書き出しに失敗しました。")
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.enabled_check.setChecked(True)
+        self.refresh()
+        self._timer.start()
+    
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
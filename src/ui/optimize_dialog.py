@@ -0,0 +1,149 @@
+"""
+Dialog running the image optimization pass over a book
+"""
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QListWidget, QProgressBar, QPushButton,
+    QCheckBox, QSpinBox
+)
+from PyQt6.QtCore import QThread, pyqtSignal
+from ..models.book import Book
+from ..utils.optimizer import OptimizeJob
+
+
+class OptimizeWorker(QThread):
+    """Runs an OptimizeJob off the GUI thread"""
+    
+    progress = pyqtSignal(int, int)  # done, total
+    file_failed = pyqtSignal(str, str)  # image path, error message
+    optimize_finished = pyqtSignal(str, bool)  # report summary, cancelled
+    
+    def __init__(self, job: OptimizeJob, parent=None):
+        super().__init__(parent)
+        self.job = job
+    
+    def cancel(self):
+        """Ask the job to stop"""
+        self.job.cancel()
+    
+    def run(self):
+        total = len(self.job.image_paths)
+        done = 0
+        try:
+            for result in self.job.run():
+                done += 1
+                if not result.ok:
+                    self.file_failed.emit(result.image_path, result.error)
+                self.progress.emit(done, total)
+        except Exception as e:
+            print(f"Error optimizing images: {e}")
+        self.optimize_finished.emit(self.job.report.summary(), self.job.cancelled)
+
+
+class OptimizeDialog(QDialog):
+    """Options, progress and results of optimizing a book's images.
+    
+    Optimized images are written to output_dir; the book's own files are
+    left as they are.
+    """
+    
+    def __init__(self, book: Book, output_dir: str, parent=None):
+        super().__init__(parent)
+        self.book = book
+        self.output_dir = output_dir
+        self.worker = None
+        self.setWindowTitle("画像を最適化")
+        self.setModal(False)
+        self.resize(460, 320)
+        
+        self.init_ui()
+    
+    def init_ui(self):
+        """Initialize the UI"""
+        layout = QVBoxLayout()
+        
+        self.strip_check = QCheckBox("メタデータを削除")
+        self.strip_check.setChecked(True)
+        layout.addWidget(self.strip_check)
+        
+        quantize_layout = QHBoxLayout()
+        self.quantize_check = QCheckBox("減色（非可逆）")
+        quantize_layout.addWidget(self.quantize_check)
+        self.colors_spin = QSpinBox()
+        self.colors_spin.setRange(2, 256)
+        self.colors_spin.setValue(16)
+        self.colors_spin.setSuffix(" 色")
+        quantize_layout.addWidget(self.colors_spin)
+        quantize_layout.addStretch()
+        layout.addLayout(quantize_layout)
+        
+        self.status_label = QLabel(f"{len(self.book.pages)}ページを最適化します")
+        layout.addWidget(self.status_label)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, len(self.book.pages))
+        layout.addWidget(self.progress_bar)
+        
+        self.error_list = QListWidget()
+        self.error_list.setVisible(False)
+        layout.addWidget(self.error_list)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_btn = QPushButton("開始")
+        self.start_btn.clicked.connect(self.start)
+        button_layout.addWidget(self.start_btn)
+        self.cancel_btn = QPushButton("キャンセル")
+        self.cancel_btn.clicked.connect(self.on_cancel_clicked)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    def start(self):
+        """Start optimizing with the chosen options"""
+        quantize_colors = self.colors_spin.value() if self.quantize_check.isChecked() else 0
+        job = OptimizeJob.for_book(self.book, self.output_dir,
+                                   quantize_colors=quantize_colors,
+                                   strip_metadata=self.strip_check.isChecked())
+        self.worker = OptimizeWorker(job, self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.file_failed.connect(self.on_file_failed)
+        self.worker.optimize_finished.connect(self.on_finished)
+        
+        for widget in (self.strip_check, self.quantize_check, self.colors_spin, self.start_btn):
+            widget.setEnabled(False)
+        self.status_label.setText("最適化しています...")
+        self.worker.start()
+    
+    def on_progress(self, done: int, total: int):
+        """Update the progress bar"""
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"{done} / {total} ページを処理しました")
+    
+    def on_file_failed(self, image_path: str, error: str):
+        """List a page that could not be optimized"""
+        self.error_list.setVisible(True)
+        self.error_list.addItem(f"{image_path}: {error}")
+    
+    def on_finished(self, summary: str, cancelled: bool):
+        """Show the report summary and turn the cancel button into close"""
+        if cancelled:
+            summary = "キャンセルしました。" + summary
+        self.status_label.setText(summary)
+        self.cancel_btn.setText("閉じる")
+        self.cancel_btn.setEnabled(True)
+    
+    def on_cancel_clicked(self):
+        """Cancel the running pass, or close the dialog"""
+        if self.worker is None or not self.worker.isRunning():
+            self.accept()
+            return
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("キャンセルしています...")
+        self.worker.cancel()
+    
+    def closeEvent(self, event):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(event)
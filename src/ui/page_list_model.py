@@ -0,0 +1,163 @@
+"""
+List model exposing a book's pages to a QListView
+"""
+from typing import Callable, Dict, Optional
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer
+from PyQt6.QtGui import QColor, QPixmap
+from ..models import book as book_events
+from ..models.book import Book, Page
+from ..utils.image_cache import PRIORITY_THUMBNAIL, ImageCache
+
+
+class PageListModel(QAbstractListModel):
+    """Model backed directly by Book.pages.
+    
+    Rows are never materialized as items. Thumbnails are requested only when
+    the view asks for the decoration of a row, which with uniform item sizes
+    happens for the rows inside the viewport, and are released again by
+    release_outside() once those rows scroll away.
+    """
+    
+    # Rows kept loaded on either side of the visible range
+    KEEP_MARGIN = 20
+    
+    def __init__(self, thumbnail_loader: Callable[[Page], Optional[QPixmap]],
+                 thumbnails: Optional[ImageCache] = None, parent=None):
+        super().__init__(parent)
+        self.book: Optional[Book] = None
+        self.thumbnail_loader = thumbnail_loader
+        # Thumbnails evicted by the memory budget are reloaded when next painted
+        if thumbnails is None:
+            thumbnails = ImageCache(64 * 1024 * 1024, name='thumbnails', priority=PRIORITY_THUMBNAIL)
+        self._thumbnails = thumbnails
+        self._pending: Dict[int, str] = {}
+        self._load_timer = QTimer(self)
+        self._load_timer.setSingleShot(True)
+        self._load_timer.setInterval(0)
+        self._load_timer.timeout.connect(self._load_pending)
+    
+    def set_book(self, book: Optional[Book]) -> None:
+        """Replace the book shown by the model"""
+        self.beginResetModel()
+        if self.book is not None:
+            self.book.remove_listener(self.on_book_changed)
+        self.book = book
+        if book is not None:
+            book.add_listener(self.on_book_changed)
+        self._thumbnails.clear()
+        self._pending.clear()
+        self.endResetModel()
+    
+    def on_book_changed(self, event: str, *args) -> None:
+        """Translate a Book change event into the matching model signals"""
+        root = QModelIndex()
+        if event == book_events.PAGES_ABOUT_TO_BE_INSERTED:
+            self.beginInsertRows(root, *args)
+        elif event == book_events.PAGES_INSERTED:
+            self.endInsertRows()
+        elif event == book_events.PAGES_ABOUT_TO_BE_REMOVED:
+            self._pending.clear()
+            self.beginRemoveRows(root, *args)
+        elif event == book_events.PAGES_REMOVED:
+            self.endRemoveRows()
+            # Rows below the removed one were renumbered
+            self.refresh_rows(args[0], self.rowCount() - 1)
+        elif event == book_events.PAGE_ABOUT_TO_BE_MOVED:
+            from_index, to_index = args
+            # Qt expects the destination as the row to insert before
+            destination = to_index + 1 if to_index > from_index else to_index
+            self._pending.clear()
+            self.beginMoveRows(root, from_index, from_index, root, destination)
+        elif event == book_events.PAGE_MOVED:
+            self.endMoveRows()
+            self.refresh_rows(min(args), max(args))
+        elif event == book_events.COVER_CHANGED:
+            for row in args:
+                self.refresh_rows(row, row)
+        elif event == book_events.PAGES_CHANGED:
+            # The files changed: reload their thumbnails when next painted
+            first, last = args
+            for row in range(first, last + 1):
+                self._thumbnails.discard(self.book.pages[row].image_path)
+            self.refresh_rows(first, last)
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid() or self.book is None:
+            return 0
+        return len(self.book.pages)
+    
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or self.book is None:
+            return None
+        row = index.row()
+        if row >= len(self.book.pages):
+            return None
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = f"ページ {row + 1}"
+            if row == self.book.cover_page_index:
+                text += " (表紙)"
+            if self.book.pages[row].missing:
+                text += " (ファイルなし)"
+            return text
+        
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QColor("#c00000") if self.book.pages[row].missing else None
+        
+        if role == Qt.ItemDataRole.DecorationRole:
+            image_path = self.book.pages[row].image_path
+            pixmap = self._thumbnails.get(image_path)
+            if pixmap is None:
+                self._request_thumbnail(row, image_path)
+            return pixmap
+        
+        return None
+    
+    def refresh_rows(self, first: int, last: int) -> None:
+        """Notify the view that the given rows need repainting"""
+        if first > last:
+            return
+        self.dataChanged.emit(self.index(first), self.index(last))
+    
+    def release_outside(self, first: int, last: int) -> None:
+        """Drop thumbnails of rows that are far outside the visible range"""
+        if self.book is None:
+            return
+        first = max(0, first - self.KEEP_MARGIN)
+        last = min(len(self.book.pages) - 1, last + self.KEEP_MARGIN)
+        keep = {self.book.pages[row].image_path for row in range(first, last + 1)}
+        for image_path in self._thumbnails.keys():
+            if image_path not in keep:
+                self._thumbnails.discard(image_path)
+        for row in list(self._pending):
+            if not first <= row <= last:
+                del self._pending[row]
+    
+    @property
+    def loaded_thumbnail_count(self) -> int:
+        """Number of thumbnails currently held in memory"""
+        return len(self._thumbnails)
+    
+    def _request_thumbnail(self, row: int, image_path: str) -> None:
+        """Queue a thumbnail load for a row the view is about to paint"""
+        self._pending[row] = image_path
+        if not self._load_timer.isActive():
+            self._load_timer.start()
+    
+    def _load_pending(self) -> None:
+        """Load the queued thumbnails in one batch after the view has painted"""
+        pending, self._pending = self._pending, {}
+        if self.book is None:
+            return
+        for row, image_path in sorted(pending.items()):
+            if row >= len(self.book.pages) or self.book.pages[row].image_path != image_path:
+                continue
+            if image_path in self._thumbnails:
+                continue
+            pixmap = self.thumbnail_loader(self.book.pages[row])
+            if pixmap is None:
+                # Remember the failure so the row is not requested again
+                pixmap = QPixmap()
+            self._thumbnails.put(image_path, pixmap,
+                                 pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+            self.refresh_rows(row, row)
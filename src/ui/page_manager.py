@@ -1,14 +1,19 @@
 """
 Page manager widget for managing book pages
 """
+from typing import Optional
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
+    QWidget, QVBoxLayout, QHBoxLayout, QListView,
     QPushButton, QLabel, QMessageBox, QMenu
 )
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QPixmap, QIcon
-from PyQt6.QtWidgets import QMenu
-from ..models.book import Book
+from PyQt6.QtCore import Qt, QPoint, QSize, pyqtSignal
+from PyQt6.QtGui import QPixmap
+from ..models.book import Book, Page
+from ..utils.image_cache import ImageMemoryManager, PRIORITY_THUMBNAIL
+from ..utils.metrics import metrics
+from ..utils.thumbnail_cache import ThumbnailCache
+from .image_loader import decode_display_image
+from .page_list_model import PageListModel
 
 
 class PageManagerWidget(QWidget):
@@ -18,10 +23,14 @@ class PageManagerWidget(QWidget):
     page_moved = pyqtSignal()  # Emitted when pages are reordered
     page_deleted = pyqtSignal()  # Emitted when a page is deleted
     cover_set = pyqtSignal(int)  # Emitted when cover is set
+    find_similar_requested = pyqtSignal(int)  # Emitted to search pages like a page
     
-    def __init__(self):
+    def __init__(self, thumbnail_cache: ThumbnailCache = None,
+                 memory: Optional[ImageMemoryManager] = None):
         super().__init__()
         self.current_book = None
+        self.thumbnail_cache = thumbnail_cache
+        self.memory = memory
         self.init_ui()
     
     def init_ui(self):
@@ -34,8 +43,16 @@ class PageManagerWidget(QWidget):
         layout.addWidget(title)
         
         # Page list
-        self.page_list = QListWidget()
-        self.page_list.itemSelectionChanged.connect(self.on_page_selection_changed)
+        thumbnails = None
+        if self.memory is not None:
+            thumbnails = self.memory.cache("thumbnails", PRIORITY_THUMBNAIL)
+        self.page_model = PageListModel(self.load_thumbnail, thumbnails, self)
+        self.page_list = QListView()
+        self.page_list.setModel(self.page_model)
+        self.page_list.setUniformItemSizes(True)
+        self.page_list.setIconSize(QSize(60, 60))
+        self.page_list.selectionModel().currentRowChanged.connect(self.on_page_selection_changed)
+        self.page_list.verticalScrollBar().valueChanged.connect(self.on_viewport_changed)
         self.page_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.page_list.customContextMenuRequested.connect(self.show_context_menu)
         layout.addWidget(self.page_list)
@@ -70,39 +87,60 @@ class PageManagerWidget(QWidget):
     
     def update_page_list(self):
         """Update the page list display"""
-        self.page_list.clear()
-        
-        if not self.current_book:
-            return
-        
-        for i, page in enumerate(self.current_book.pages):
-            item_text = f"ページ {i + 1}"
-            if i == self.current_book.cover_page_index:
-                item_text += " (表紙)"
-            
-            item = QListWidgetItem(item_text)
-            # Add thumbnail if possible
-            try:
-                pixmap = QPixmap(page.image_path)
-                if not pixmap.isNull():
-                    thumbnail = pixmap.scaledToHeight(60, Qt.TransformationMode.SmoothTransformation)
-                    item.setIcon(QIcon(thumbnail))
-            except:
-                pass
-            
-            self.page_list.addItem(item)
+        with metrics.timer("page_list.update"):
+            self.page_model.set_book(self.current_book)
+    
+    def current_row(self) -> int:
+        """Get the row of the current page, or -1 if none"""
+        return self.page_list.currentIndex().row()
+    
+    def set_current_row(self, row: int):
+        """Make the given row the current page"""
+        self.page_list.setCurrentIndex(self.page_model.index(row))
+    
+    def visible_rows(self) -> tuple:
+        """Get the first and last rows inside the list viewport"""
+        viewport = self.page_list.viewport()
+        first = self.page_list.indexAt(QPoint(0, 0)).row()
+        last = self.page_list.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = self.page_model.rowCount() - 1
+        return first, last
+    
+    def on_viewport_changed(self):
+        """Release thumbnails of rows that scrolled out of view"""
+        first, last = self.visible_rows()
+        self.page_model.release_outside(first, last)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.on_viewport_changed()
+    
+    def load_thumbnail(self, page: Page):
+        """Load a page thumbnail, from the thumbnail cache when available"""
+        image_path = page.image_path
+        if self.thumbnail_cache is not None:
+            thumb_path = self.thumbnail_cache.get_thumbnail(image_path, page.file_size, page.mtime_ns)
+            if thumb_path is None:
+                return None
+            pixmap = QPixmap(thumb_path)
+            return None if pixmap.isNull() else pixmap
+        image = decode_display_image(image_path, 0, 60)
+        return None if image is None else QPixmap.fromImage(image)
     
     def on_page_selection_changed(self):
         """Handle page selection change"""
-        if self.page_list.currentRow() >= 0:
-            self.page_selected.emit(self.page_list.currentRow())
+        if self.current_row() >= 0:
+            self.page_selected.emit(self.current_row())
     
     def delete_page(self):
         """Delete the selected page"""
         if not self.current_book:
             return
         
-        current_index = self.page_list.currentRow()
+        current_index = self.current_row()
         if current_index < 0:
             QMessageBox.warning(self, "警告", "ページを選択してください。")
             return
@@ -110,12 +148,11 @@ class PageManagerWidget(QWidget):
         reply = QMessageBox.question(
             self, "確認", 
             f"ページ {current_index + 1} を削除してもよろしいですか？",
-            QMessageBox.Yes | QMessageBox.No
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
-        if reply == QMessageBox.Yes:
+        if reply == QMessageBox.StandardButton.Yes:
             self.current_book.remove_page(current_index)
-            self.update_page_list()
             self.page_deleted.emit()
     
     def move_page_up(self):
@@ -123,14 +160,13 @@ class PageManagerWidget(QWidget):
         if not self.current_book:
             return
         
-        current_index = self.page_list.currentRow()
+        current_index = self.current_row()
         if current_index <= 0:
             QMessageBox.warning(self, "警告", "上に移動できません。")
             return
         
         self.current_book.move_page(current_index, current_index - 1)
-        self.update_page_list()
-        self.page_list.setCurrentRow(current_index - 1)
+        self.set_current_row(current_index - 1)
         self.page_moved.emit()
     
     def move_page_down(self):
@@ -138,14 +174,13 @@ class PageManagerWidget(QWidget):
         if not self.current_book:
             return
         
-        current_index = self.page_list.currentRow()
+        current_index = self.current_row()
         if current_index < 0 or current_index >= len(self.current_book.pages) - 1:
             QMessageBox.warning(self, "警告", "下に移動できません。")
             return
         
         self.current_book.move_page(current_index, current_index + 1)
-        self.update_page_list()
-        self.page_list.setCurrentRow(current_index + 1)
+        self.set_current_row(current_index + 1)
         self.page_moved.emit()
     
     def set_as_cover(self):
@@ -153,15 +188,26 @@ class PageManagerWidget(QWidget):
         if not self.current_book:
             return
         
-        current_index = self.page_list.currentRow()
+        current_index = self.current_row()
         if current_index < 0:
             QMessageBox.warning(self, "警告", "ページを選択してください。")
             return
         
         self.current_book.set_cover_page(current_index)
-        self.update_page_list()
         self.cover_set.emit(current_index)
     
+    def find_similar(self):
+        """Request a search for pages that look like the selected page"""
+        if not self.current_book:
+            return
+        
+        current_index = self.current_row()
+        if current_index < 0:
+            QMessageBox.warning(self, "警告", "ページを選択してください。")
+            return
+        
+        self.find_similar_requested.emit(current_index)
+    
     def show_context_menu(self, position):
         """Show context menu for page operations"""
         menu = QMenu()
@@ -170,5 +216,7 @@ class PageManagerWidget(QWidget):
         menu.addAction("↓ 下に移動", self.move_page_down)
         menu.addSeparator()
         menu.addAction("表紙に設定", self.set_as_cover)
+        menu.addSeparator()
+        menu.addAction("類似ページを検索", self.find_similar)
         
-        menu.exec_(self.page_list.mapToGlobal(position))
+        menu.exec(self.page_list.mapToGlobal(position))
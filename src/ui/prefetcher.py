@@ -0,0 +1,126 @@
+"""
+Direction-aware page prefetching for the image viewer
+"""
+from typing import Dict, Iterable, Optional
+from PyQt6.QtCore import QObject, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+from ..models.book import Book
+from ..utils.image_cache import ImageCache
+from .image_loader import DISPLAY_MAX_WIDTH, ImageDecodeTask
+
+
+class PagePrefetcher(QObject):
+    """Decodes the pages around the reading position ahead of time.
+    
+    The reading direction is taken from the last position change. Up to
+    `ahead` pages are decoded in that direction and `behind` pages in the
+    other one, on background workers, and kept display-ready in a
+    memory-bounded LRU cache.
+    """
+    
+    image_ready = pyqtSignal(str)  # Emitted when a prefetch finishes, cached or failed
+    
+    def __init__(self, cache_bytes: int = 256 * 1024 * 1024, ahead: int = 4,
+                 behind: int = 1, cache: Optional[ImageCache] = None, parent=None):
+        super().__init__(parent)
+        self.book: Optional[Book] = None
+        self.cache = cache if cache is not None else ImageCache(cache_bytes, name='renditions')
+        self.ahead = ahead
+        self.behind = behind
+        self.position = -1
+        self.direction = 1
+        self.target_width = DISPLAY_MAX_WIDTH
+        self._tasks: Dict[str, ImageDecodeTask] = {}
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+    
+    def set_book(self, book: Optional[Book]) -> None:
+        """Switch to another book, dropping any pending prefetches"""
+        self.book = book
+        self.position = -1
+        self.direction = 1
+        self._cancel_all()
+        self.cache.clear()
+    
+    def set_target_width(self, width: int) -> None:
+        """Set the rendition width (in device pixels) to prefetch at"""
+        if width != self.target_width:
+            self.target_width = width
+            self._cancel_all()
+    
+    def update_position(self, page_index: int) -> None:
+        """Record the current reading position and prefetch around it"""
+        if self.book is None:
+            return
+        if self.position >= 0 and page_index != self.position:
+            self.direction = 1 if page_index > self.position else -1
+        self.position = page_index
+        self._schedule()
+    
+    def get_image(self, image_path: str) -> Optional[QImage]:
+        """Get a display-ready image from the cache"""
+        return self.cache.get((image_path, self.target_width))
+    
+    def invalidate(self, image_paths: Iterable[str]) -> None:
+        """Forget renditions of pages whose files changed"""
+        image_paths = set(image_paths)
+        for image_path in image_paths & set(self._tasks):
+            self._tasks.pop(image_path).cancel()
+        for key in self.cache.keys():
+            if key[0] in image_paths:
+                self.cache.discard(key)
+    
+    def is_pending(self, image_path: str) -> bool:
+        """Check whether a page is currently being prefetched"""
+        return image_path in self._tasks
+    
+    def _wanted_paths(self) -> list:
+        """Paths of the pages to prefetch, nearest first"""
+        pages = self.book.pages
+        wanted = []
+        for distance in range(1, max(self.ahead, self.behind) + 1):
+            if distance <= self.ahead:
+                index = self.position + distance * self.direction
+                if 0 <= index < len(pages):
+                    wanted.append(pages[index].image_path)
+            if distance <= self.behind:
+                index = self.position - distance * self.direction
+                if 0 <= index < len(pages):
+                    wanted.append(pages[index].image_path)
+        return wanted
+    
+    def _schedule(self) -> None:
+        wanted = self._wanted_paths()
+        current_path = self.book.pages[self.position].image_path \
+            if 0 <= self.position < len(self.book.pages) else None
+        # Drop queued work for pages we have moved away from, but keep the
+        # current page: the viewer is waiting for it
+        for image_path in list(self._tasks):
+            if image_path not in wanted and image_path != current_path:
+                self._tasks.pop(image_path).cancel()
+        for priority, image_path in enumerate(reversed(wanted)):
+            if image_path in self._tasks or (image_path, self.target_width) in self.cache:
+                continue
+            task = ImageDecodeTask(image_path, self.target_width)
+            task.signals.decoded.connect(self._on_decoded)
+            self._tasks[image_path] = task
+            self._pool.start(task, priority)
+    
+    def _on_decoded(self, image_path: str, token: int, image: QImage) -> None:
+        task = self._tasks.get(image_path)
+        if task is None or task.cancelled:
+            return
+        del self._tasks[image_path]
+        if not image.isNull():
+            self.cache.put((image_path, task.max_width), image, image.sizeInBytes())
+        self.image_ready.emit(image_path)
+    
+    def shutdown(self) -> None:
+        """Cancel queued prefetches and wait for running ones to finish"""
+        self._cancel_all()
+        self._pool.waitForDone()
+    
+    def _cancel_all(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
@@ -0,0 +1,449 @@
+"""
+Continuous vertical reading view
+"""
+import bisect
+from itertools import accumulate
+from typing import Dict, List, Optional, Set, Tuple
+from PyQt6.QtWidgets import QAbstractScrollArea
+from PyQt6.QtCore import Qt, QRectF, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter
+from ..models import book as book_events
+from ..models.book import Book
+from ..utils.image_cache import ImageCache
+from .image_loader import ImageDecodeTask
+
+
+def row_count(page_count: int, spread: bool = False) -> int:
+    """Number of rows the pages are laid out in"""
+    return 1 + page_count // 2 if spread and page_count else page_count
+
+
+def row_pages(row: int, page_count: int, spread: bool = False) -> Tuple[int, ...]:
+    """Page indices of a row, left to right.
+    
+    In spread mode the cover is alone and the other pages are paired with
+    the earlier page on the right, as in right-to-left books.
+    """
+    if not spread or row == 0:
+        return (row,)
+    return tuple(range(min(2 * row, page_count - 1), 2 * row - 2, -1))
+
+
+def page_row(page_index: int, spread: bool = False) -> int:
+    """Row a page is laid out in"""
+    return (page_index + 1) // 2 if spread else page_index
+
+
+def layout_rows(page_count: int, spread: bool = False) -> List[Tuple[int, ...]]:
+    """Page indices of every row"""
+    return [row_pages(row, page_count, spread) for row in range(row_count(page_count, spread))]
+
+
+class ContinuousPageView(QAbstractScrollArea):
+    """Shows every page of a book in one vertical strip.
+    
+    Pages are laid out from the sizes in their cached metadata, so nothing
+    is decoded to build the layout. The sizes are read when the view is
+    first shown; edits to the book patch them and restack only the rows
+    from the first one affected, and nothing is laid out while the view is
+    hidden. Pages are painted straight into the viewport rather than held
+    in per-page widgets, and only the rows within WINDOW_ROWS of the visible
+    ones are kept decoded; rows leaving that window are dropped from the
+    cache and their pending decodes cancelled.
+    
+    In spread mode the cover is shown alone and the following pages side by
+    side, the earlier page on the right as in right-to-left books.
+    """
+    
+    page_changed = pyqtSignal(int)  # Emitted when the page at the top of the view changes
+    
+    # Rows decoded on either side of the visible ones
+    WINDOW_ROWS = 2
+    MARGIN = 8
+    GAP = 8
+    # Height / width of pages whose size is not known yet
+    DEFAULT_ASPECT = 1.414
+    
+    def __init__(self, image_cache: Optional[ImageCache] = None, parent=None):
+        super().__init__(parent)
+        self.image_cache = image_cache if image_cache is not None else ImageCache(
+            64 * 1024 * 1024, name='scroll')
+        self.book: Optional[Book] = None
+        self.spread = False
+        self.current_page = -1
+        self._pending_page = -1  # scrolled to once the view is shown
+        # Height / width of every page; None until the book is laid out
+        self._page_aspects: Optional[List[float]] = None
+        self._row_tops: List[int] = []
+        self._aspects: Dict[str, float] = {}  # learned from decoded pages without metadata
+        self._layout_dirty = True  # every row has to be restacked
+        self._edited_rows: Optional[Tuple[int, int]] = None  # rows to restack after edits
+        self._row_count_changed = False
+        self._window = (0, -1)  # rows kept decoded
+        self._decode_width = 0
+        self._decoded: Set[tuple] = set()  # cache keys put by this view
+        self._tasks: Dict[str, ImageDecodeTask] = {}
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self.viewport().setStyleSheet("background-color: #f0f0f0;")
+        self.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+    
+    def set_book(self, book: Optional[Book]) -> None:
+        """Show another book from its first page"""
+        if self.book is not None:
+            self.book.remove_listener(self.on_book_changed)
+        self.book = book
+        if book is not None:
+            book.add_listener(self.on_book_changed)
+        self._aspects.clear()
+        self._release(set())
+        self.current_page = -1
+        self._pending_page = -1
+        self._page_aspects = None
+        self._edited_rows = None
+        self._window = (0, -1)
+        self._layout_dirty = True
+        self.verticalScrollBar().setValue(0)
+        self.on_scrolled()
+    
+    def set_spread(self, spread: bool) -> None:
+        """Switch between one page per row and two-page spreads"""
+        if spread == self.spread:
+            return
+        page = self.current_page
+        self.spread = spread
+        self._layout_dirty = True
+        self._ensure_layout()
+        if page >= 0:
+            self.scroll_to_page(page)
+    
+    def on_book_changed(self, event: str, *args) -> None:
+        """Patch the page sizes after an edit.
+        
+        The rows are restacked once control returns to the event loop, so
+        that a batch of edits is laid out only once. Events that leave the
+        pages and their sizes alone are ignored.
+        """
+        if event == book_events.PAGES_CHANGED:
+            # The files were rewritten: results of running decodes are stale
+            first, last = args
+            for index in range(first, last + 1):
+                task = self._tasks.pop(self.book.pages[index].image_path, None)
+                if task is not None:
+                    task.cancel()
+        aspects = self._page_aspects
+        if aspects is None:
+            return
+        pages = self.book.pages
+        if event == book_events.PAGES_INSERTED:
+            first, last = args
+            aspects[first:first] = [self._aspect(pages[index]) for index in range(first, last + 1)]
+            self._pages_spliced(first, last - first + 1)
+        elif event == book_events.PAGES_REMOVED:
+            first, last = args
+            del aspects[first:last + 1]
+            self._pages_spliced(first, first - last - 1)
+        elif event == book_events.PAGE_MOVED:
+            from_index, to_index = args
+            aspects.insert(to_index, aspects.pop(from_index))
+            self._rows_edited(min(from_index, to_index), max(from_index, to_index), False)
+        elif event == book_events.PAGES_CHANGED:
+            first, last = args
+            aspects[first:last + 1] = [self._aspect(pages[index])
+                                       for index in range(first, last + 1)]
+            self._rows_edited(first, last, False)
+    
+    def scroll_to_page(self, page_index: int) -> None:
+        """Bring the row of a page to the top of the view"""
+        if not self.isVisible():
+            self._pending_page = page_index
+            return
+        self._ensure_layout()
+        if not 0 <= page_index < len(self._page_aspects):
+            return
+        if page_index == self.current_page:
+            return
+        self.verticalScrollBar().setValue(self._row_tops[page_row(page_index, self.spread)])
+        self._set_current_page(page_index)
+    
+    def page_image(self, page_index: int) -> Optional[QImage]:
+        """Decoded rendition of a page, if it is in the window"""
+        if self.book is None or not 0 <= page_index < len(self.book.pages):
+            return None
+        return self.image_cache.get((self.book.pages[page_index].image_path, self._decode_width))
+    
+    def on_scrolled(self, value: int = 0) -> None:
+        """Follow the scroll position: current page and decode window"""
+        if not self.isVisible():
+            return
+        self._ensure_layout()
+        first, last = self._visible_rows()
+        if first <= last:
+            self._update_window(first, last)
+            self._set_current_page(self._top_page())
+        self.viewport().update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(self.viewport().rect(), QColor("#f0f0f0"))
+        if self.book is None:
+            return
+        self._ensure_layout()
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        scroll_y = self.verticalScrollBar().value()
+        first, last = self._visible_rows()
+        for row in range(first, last + 1):
+            for page_index, rect in self._page_rects(row):
+                rect.translate(0, -scroll_y)
+                page = self.book.pages[page_index]
+                image = self.image_cache.get((page.image_path, self._decode_width))
+                if image is not None:
+                    painter.drawImage(rect, image)
+                else:
+                    painter.fillRect(rect, QColor("#ffffff"))
+                    painter.setPen(QColor("#999999"))
+                    painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"ページ {page_index + 1}")
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        page = self.current_page
+        self._layout_dirty = True
+        self._ensure_layout()
+        if page >= 0:
+            self.current_page = -1
+            self.scroll_to_page(page)
+        self.on_scrolled()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        page, self._pending_page = self._pending_page, -1
+        if self._ensure_layout() and page < 0:
+            page = self.current_page
+        if page >= 0:
+            self.current_page = -1
+            self.scroll_to_page(page)
+        self.on_scrolled()
+    
+    def hideEvent(self, event):
+        self._cancel_tasks(set())
+        self._release(set())
+        super().hideEvent(event)
+    
+    def shutdown(self):
+        """Cancel queued decodes and wait for running ones to finish"""
+        self._cancel_tasks(set())
+        self._pool.waitForDone()
+    
+    def _ensure_layout(self) -> bool:
+        """Lay out the rows if needed and the view is shown; returns whether
+        anything changed"""
+        if not self.isVisible():
+            return False
+        if self._layout_dirty:
+            self._layout_dirty = False
+            self._edited_rows = None
+            if self._page_aspects is None:
+                pages = self.book.pages if self.book is not None else []
+                self._page_aspects = [self._aspect(page) for page in pages]
+            # Decoded at the exact column width so painting is a plain copy
+            self._decode_width = round(self._column_width() * self.devicePixelRatioF())
+            self._restack(0)
+            return True
+        if self._edited_rows is not None:
+            (first, last), self._edited_rows = self._edited_rows, None
+            self._restack(first, None if self._row_count_changed else last)
+            return True
+        return False
+    
+    def _pages_spliced(self, first_page: int, count_delta: int) -> None:
+        """Insert or drop row tops where pages were inserted or removed, so
+        the rows after the edit keep theirs"""
+        if self._layout_dirty:
+            return
+        if self.spread and count_delta % 2:
+            # Every later spread now pairs different pages
+            self._rows_edited(first_page, len(self._page_aspects), True)
+            return
+        rows_delta = count_delta // 2 if self.spread else count_delta
+        row = page_row(first_page, self.spread)
+        if rows_delta > 0:
+            self._row_tops[row:row] = [0] * rows_delta
+        else:
+            del self._row_tops[row:row - rows_delta]
+        if self._edited_rows is not None and self._edited_rows[1] >= row:
+            self._edited_rows = (self._edited_rows[0], self._edited_rows[1] + max(0, rows_delta))
+        self._rows_edited(first_page, first_page + max(0, count_delta), False)
+    
+    def _rows_edited(self, first_page: int, last_page: int, count_changed: bool) -> None:
+        """Restack the rows of a page range once control returns to the event loop"""
+        if self._layout_dirty:
+            return
+        first = page_row(first_page, self.spread)
+        last = page_row(last_page, self.spread)
+        if self._edited_rows is None:
+            self._edited_rows = (first, last)
+            self._row_count_changed = count_changed
+            QTimer.singleShot(0, self.on_scrolled)
+        else:
+            self._edited_rows = (min(first, self._edited_rows[0]), max(last, self._edited_rows[1]))
+            self._row_count_changed |= count_changed
+    
+    def _restack(self, first_row: int, last_row: Optional[int] = None) -> None:
+        """Recompute the tops of the rows from first_row on.
+        
+        When the rows after last_row are unchanged but for their position,
+        their tops are shifted all at once instead.
+        """
+        count = row_count(len(self._page_aspects), self.spread)
+        tops = self._row_tops
+        if len(tops) != count:
+            last_row = None
+        first_row = min(first_row, len(tops), count)
+        end = count if last_row is None else min(last_row + 1, count)
+        column_width = self._column_width()
+        if first_row == 0:
+            top = self.MARGIN
+        else:
+            top = tops[first_row - 1] + self._row_heights(first_row - 1, first_row,
+                                                          column_width)[0] + self.GAP
+        heights = self._row_heights(first_row, end, column_width)
+        # accumulate() yields the initial top even for no rows
+        restacked = list(accumulate((height + self.GAP for height in heights[:-1]),
+                                    initial=top)) if heights else []
+        if last_row is None:
+            tops[first_row:] = restacked
+        else:
+            tops[first_row:end] = restacked
+        if heights and end < count:
+            delta = restacked[-1] + heights[-1] + self.GAP - tops[end]
+            if delta:
+                tops[end:] = [row_top + delta for row_top in tops[end:]]
+        
+        viewport = self.viewport().size()
+        total = tops[-1] + self._row_heights(count - 1, count, column_width)[0] + self.MARGIN \
+            if tops else 0
+        self.verticalScrollBar().setRange(0, max(0, total - viewport.height()))
+        self.verticalScrollBar().setPageStep(viewport.height())
+        self.verticalScrollBar().setSingleStep(max(20, viewport.height() // 10))
+    
+    def _row_heights(self, first_row: int, end_row: int, column_width: int) -> List[int]:
+        """Heights of the rows in [first_row, end_row)"""
+        aspects = self._page_aspects
+        if not self.spread:
+            return [round(column_width * aspect) for aspect in aspects[first_row:end_row]]
+        return [round(column_width * (max(aspects[2 * row - 1:2 * row + 1]) if row else aspects[0]))
+                for row in range(first_row, end_row)]
+    
+    def _column_width(self) -> int:
+        width = max(1, self.viewport().width() - 2 * self.MARGIN)
+        return max(1, (width - self.GAP) // 2) if self.spread else width
+    
+    def _aspect(self, page) -> float:
+        size = page.size
+        if size and size[0]:
+            return size[1] / size[0]
+        return self._aspect_of(page.image_path)
+    
+    def _aspect_of(self, image_path: str) -> float:
+        """Aspect learned from a decoded page, or the default guess"""
+        return self._aspects.get(image_path, self.DEFAULT_ASPECT)
+    
+    def _page_rects(self, row: int):
+        """(page index, rect in content coordinates) of the pages of a row"""
+        column_width = self._column_width()
+        indices = row_pages(row, len(self._page_aspects), self.spread)
+        row_width = column_width * len(indices) + self.GAP * (len(indices) - 1)
+        left = self.MARGIN + (self.viewport().width() - 2 * self.MARGIN - row_width) // 2
+        for index in indices:
+            height = round(column_width * self._page_aspects[index])
+            yield index, QRectF(left, self._row_tops[row], column_width, height)
+            left += column_width + self.GAP
+    
+    def _visible_rows(self) -> Tuple[int, int]:
+        if not self._row_tops:
+            return 0, -1
+        scroll_y = self.verticalScrollBar().value()
+        first = max(0, bisect.bisect_right(self._row_tops, scroll_y) - 1)
+        last = bisect.bisect_right(self._row_tops, scroll_y + self.viewport().height()) - 1
+        return first, max(first, min(last, len(self._row_tops) - 1))
+    
+    def _top_page(self) -> int:
+        """Page at a third of the viewport height, where the eye rests"""
+        y = self.verticalScrollBar().value() + self.viewport().height() // 3
+        row = max(0, min(len(self._row_tops) - 1, bisect.bisect_right(self._row_tops, y) - 1))
+        return min(row_pages(row, len(self._page_aspects), self.spread))
+    
+    def _set_current_page(self, page_index: int) -> None:
+        if page_index != self.current_page:
+            self.current_page = page_index
+            self.page_changed.emit(page_index)
+    
+    def _update_window(self, first: int, last: int) -> None:
+        """Decode the rows around the visible ones and drop the others"""
+        window_first = max(0, first - self.WINDOW_ROWS)
+        window_last = min(len(self._row_tops) - 1, last + self.WINDOW_ROWS)
+        self._window = (window_first, window_last)
+        # Visible rows first, then outwards
+        order = list(range(first, last + 1))
+        for distance in range(1, self.WINDOW_ROWS + 1):
+            order.extend(row for row in (last + distance, first - distance)
+                         if window_first <= row <= window_last)
+        wanted = []
+        for row in order:
+            wanted.extend(self.book.pages[index].image_path
+                          for index in row_pages(row, len(self._page_aspects), self.spread))
+        keys = {(image_path, self._decode_width) for image_path in wanted}
+        self._release(keys)
+        self._cancel_tasks(set(wanted))
+        for priority, image_path in enumerate(reversed(wanted)):
+            key = (image_path, self._decode_width)
+            if image_path in self._tasks or key in self.image_cache:
+                continue
+            task = ImageDecodeTask(image_path, self._decode_width)
+            task.signals.decoded.connect(self._on_decoded)
+            self._tasks[image_path] = task
+            self._pool.start(task, priority)
+    
+    def _on_decoded(self, image_path: str, token: int, image: QImage) -> None:
+        task = self._tasks.get(image_path)
+        if task is None or task.cancelled:
+            return
+        del self._tasks[image_path]
+        if image.isNull():
+            return
+        key = (image_path, task.max_width)
+        self.image_cache.put(key, image, image.sizeInBytes())
+        self._decoded.add(key)
+        aspect = image.height() / max(1, image.width())
+        if self._page_aspects is not None and abs(aspect - self._aspect_of(image_path)) > 0.01:
+            self._learn_aspect(image_path, aspect)
+        self.viewport().update()
+    
+    def _learn_aspect(self, image_path: str, aspect: float) -> None:
+        """Fix rows laid out with a guessed size, keeping the current page in place"""
+        pages = self.book.pages
+        unsized = [index for row in range(self._window[0], self._window[1] + 1)
+                   for index in row_pages(row, len(pages), self.spread)
+                   if pages[index].image_path == image_path and not pages[index].size]
+        if not unsized:
+            return
+        self._aspects[image_path] = aspect
+        for index in unsized:
+            self._page_aspects[index] = aspect
+        page = self.current_page
+        self._restack(page_row(min(unsized), self.spread), page_row(max(unsized), self.spread))
+        if page >= 0:
+            self.current_page = -1
+            self.scroll_to_page(page)
+    
+    def _release(self, keep: Set[tuple]) -> None:
+        """Drop decoded pages of this view that are not in keep"""
+        for key in list(self._decoded):
+            if key not in keep:
+                self.image_cache.discard(key)
+                self._decoded.discard(key)
+    
+    def _cancel_tasks(self, keep: Set[str]) -> None:
+        for image_path in list(self._tasks):
+            if image_path not in keep:
+                self._tasks.pop(image_path).cancel()
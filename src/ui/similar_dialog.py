@@ -0,0 +1,124 @@
+"""
+Dialog listing saved pages that look like a given page
+"""
+from typing import List
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QProgressBar,
+    QPushButton
+)
+from PyQt6.QtCore import Qt, QSize, QThread, pyqtSignal
+from PyQt6.QtGui import QIcon, QPixmap
+from ..utils.page_hashes import PageHashIndex, SimilarPage
+from ..utils.storage import BookStorage
+from ..utils.thumbnail_cache import ThumbnailCache
+
+
+class SimilarPagesWorker(QThread):
+    """Updates the page hash index and queries it off the GUI thread"""
+    
+    progress = pyqtSignal(int, int)  # pages hashed, pages to hash
+    search_finished = pyqtSignal(list)  # SimilarPage matches
+    
+    def __init__(self, index: PageHashIndex, storage: BookStorage, image_path: str, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.storage = storage
+        self.image_path = image_path
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        matches = []
+        try:
+            if self.index.update(self.storage, progress=self.on_progress):
+                matches = self.index.find_similar(self.image_path)
+        except Exception as e:
+            print(f"Error searching similar pages: {e}")
+        self.search_finished.emit(matches)
+    
+    def on_progress(self, done: int, total: int) -> bool:
+        self.progress.emit(done, total)
+        return not self._cancelled
+
+
+class SimilarPagesDialog(QDialog):
+    """Searches the library for near-duplicates of a page.
+    
+    Double-clicking a result emits page_requested with its book name and
+    page index.
+    """
+    
+    page_requested = pyqtSignal(str, int)  # book name, page index
+    
+    def __init__(self, index: PageHashIndex, storage: BookStorage, image_path: str,
+                 thumbnail_cache: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.setWindowTitle("類似ページ")
+        self.setModal(False)
+        self.resize(480, 420)
+        
+        self.init_ui()
+        
+        self.worker = SimilarPagesWorker(index, storage, image_path, self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.search_finished.connect(self.on_finished)
+        self.worker.start()
+    
+    def init_ui(self):
+        """Initialize the UI"""
+        layout = QVBoxLayout()
+        
+        self.status_label = QLabel("ページの索引を更新しています...")
+        layout.addWidget(self.status_label)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        layout.addWidget(self.progress_bar)
+        
+        self.result_list = QListWidget()
+        self.result_list.setIconSize(QSize(60, 60))
+        self.result_list.itemDoubleClicked.connect(self.on_item_double_clicked)
+        layout.addWidget(self.result_list)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        close_btn = QPushButton("閉じる")
+        close_btn.clicked.connect(self.close)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    def on_progress(self, done: int, total: int):
+        """Show how many pages are left to hash"""
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"ページの索引を更新しています... {done} / {total}")
+    
+    def on_finished(self, matches: List[SimilarPage]):
+        """List the matches with their thumbnails"""
+        self.progress_bar.setVisible(False)
+        self.status_label.setText(f"{len(matches)}件の類似ページが見つかりました")
+        for match in matches:
+            item = QListWidgetItem(
+                f"{match.book_name}  ページ {match.page_index + 1}  (距離 {match.distance})")
+            item.setData(Qt.ItemDataRole.UserRole, (match.book_name, match.page_index))
+            item.setToolTip(match.image_path)
+            thumb_path = self.thumbnail_cache.get_thumbnail(match.image_path)
+            if thumb_path is not None:
+                item.setIcon(QIcon(QPixmap(thumb_path)))
+            self.result_list.addItem(item)
+    
+    def on_item_double_clicked(self, item: QListWidgetItem):
+        """Ask to show the page of a match"""
+        book_name, page_index = item.data(Qt.ItemDataRole.UserRole)
+        self.page_requested.emit(book_name, page_index)
+    
+    def closeEvent(self, event):
+        if self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(event)
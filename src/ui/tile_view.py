@@ -0,0 +1,283 @@
+"""
+Zoomable, pannable page view painted from a tile pyramid
+"""
+import math
+from typing import Optional, Set, Tuple
+from PyQt6.QtWidgets import QAbstractScrollArea
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QRectF, QPoint, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter
+from ..models.book import Page
+from ..utils.image import get_image_size
+from ..utils.image_cache import PRIORITY_TILE, ImageCache
+from ..utils.tiles import TileStore
+
+
+class TileLoadSignals(QObject):
+    """Signals emitted by TileLoadTask"""
+    
+    loaded = pyqtSignal(str, int, int, int, QImage)  # page key, level, tx, ty, tile
+
+
+class TileLoadTask(QRunnable):
+    """Builds a pyramid level if needed and loads one tile from it"""
+    
+    def __init__(self, store: TileStore, image_path: str, key: str, level: int, tx: int, ty: int):
+        super().__init__()
+        self.store = store
+        self.image_path = image_path
+        self.key = key
+        self.level = level
+        self.tx = tx
+        self.ty = ty
+        self.cancelled = False
+        self.signals = TileLoadSignals()
+    
+    def run(self):
+        if self.cancelled:
+            return
+        image = QImage()
+        if self.store.ensure_level(self.image_path, self.key, self.level):
+            image = QImage(self.store.tile_path(self.key, self.level, self.tx, self.ty))
+        self.signals.loaded.emit(self.key, self.level, self.tx, self.ty, image)
+
+
+class TiledImageView(QAbstractScrollArea):
+    """Shows one page at an arbitrary zoom.
+    
+    Only the tiles that intersect the viewport, at the pyramid level matching
+    the current zoom, are loaded and painted. Until a tile arrives the
+    matching part of a coarser, already loaded level is drawn in its place.
+    """
+    
+    zoom_changed = pyqtSignal(float)
+    
+    MIN_ZOOM = 0.02
+    MAX_ZOOM = 8.0
+    
+    def __init__(self, store: TileStore, tile_cache_bytes: int = 128 * 1024 * 1024,
+                 tile_cache: Optional[ImageCache] = None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        if tile_cache is None:
+            tile_cache = ImageCache(tile_cache_bytes, name='tiles', priority=PRIORITY_TILE)
+        self.tile_cache = tile_cache
+        self.image_path: Optional[str] = None
+        self.page_key: Optional[str] = None
+        self.image_size: Tuple[int, int] = (0, 0)
+        self.zoom = 1.0
+        self._pending: Set[tuple] = set()
+        self._tasks = []
+        self._drag_origin: Optional[QPoint] = None
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self.viewport().setStyleSheet("background-color: #f0f0f0;")
+        for scroll_bar in (self.horizontalScrollBar(), self.verticalScrollBar()):
+            scroll_bar.valueChanged.connect(self.viewport().update)
+            scroll_bar.valueChanged.connect(self._cancel_hidden)
+    
+    def set_image(self, image_path: Optional[str], page: Optional[Page] = None) -> bool:
+        """Show another page; returns False if it cannot be read.
+        
+        When the page's cached metadata is given the image header and file
+        stats are not read again.
+        """
+        self._cancel_pending()
+        self.image_path = None
+        self.page_key = None
+        self.image_size = (0, 0)
+        if image_path:
+            if page is not None and page.has_metadata:
+                size = page.size
+                key = self.store.page_key(image_path, page.file_size, page.mtime_ns)
+            else:
+                size = get_image_size(image_path)
+                key = self.store.page_key(image_path)
+            if size is not None and key is not None:
+                self.image_path = image_path
+                self.page_key = key
+                self.image_size = size
+                self.store.touch(key)
+        self._update_scrollbars()
+        self.viewport().update()
+        return self.image_path is not None
+    
+    def fit_zoom(self) -> float:
+        """Zoom at which the page width fills the viewport"""
+        if not self.image_size[0]:
+            return 1.0
+        return max(self.MIN_ZOOM, self.viewport().width() / self.image_size[0])
+    
+    def set_zoom(self, zoom: float, anchor: Optional[QPoint] = None):
+        """Change the zoom, keeping the content under anchor in place"""
+        zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, zoom))
+        if anchor is None:
+            anchor = self.viewport().rect().center()
+        offset_x, offset_y = self._content_offset()
+        source_x = (anchor.x() + self.horizontalScrollBar().value() - offset_x) / self.zoom
+        source_y = (anchor.y() + self.verticalScrollBar().value() - offset_y) / self.zoom
+        self.zoom = zoom
+        self._update_scrollbars()
+        offset_x, offset_y = self._content_offset()
+        self.horizontalScrollBar().setValue(round(source_x * zoom + offset_x - anchor.x()))
+        self.verticalScrollBar().setValue(round(source_y * zoom + offset_y - anchor.y()))
+        self._cancel_hidden()
+        self.viewport().update()
+        self.zoom_changed.emit(zoom)
+    
+    def current_level(self) -> int:
+        """Pyramid level whose resolution best matches the zoom"""
+        scale = self.zoom * self.devicePixelRatioF()
+        if scale >= 1.0:
+            return 0
+        level = int(math.floor(math.log2(1.0 / scale)))
+        return min(level, self.store.level_count(self.image_size) - 1)
+    
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(self.viewport().rect(), QColor("#f0f0f0"))
+        if self.page_key is None:
+            return
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        
+        level = self.current_level()
+        span = self.store.tile_size << level  # Source pixels covered by one tile
+        offset_x, offset_y = self._content_offset()
+        scroll_x = self.horizontalScrollBar().value()
+        scroll_y = self.verticalScrollBar().value()
+        first_col, last_col, first_row, last_row = self._visible_tiles(level)
+        for ty in range(first_row, last_row + 1):
+            for tx in range(first_col, last_col + 1):
+                source = QRectF(tx * span, ty * span,
+                                min(span, self.image_size[0] - tx * span),
+                                min(span, self.image_size[1] - ty * span))
+                target = QRectF(source.x() * self.zoom - scroll_x + offset_x,
+                                source.y() * self.zoom - scroll_y + offset_y,
+                                source.width() * self.zoom, source.height() * self.zoom)
+                tile = self.tile_cache.get((self.page_key, level, tx, ty))
+                if tile is not None:
+                    painter.drawImage(target, tile)
+                    continue
+                self._request_tile(level, tx, ty)
+                self._draw_fallback(painter, level, source, target)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+    
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            steps = event.angleDelta().y() / 120
+            self.set_zoom(self.zoom * (1.25 ** steps), event.position().toPoint())
+            event.accept()
+        else:
+            super().wheelEvent(event)
+    
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_origin = event.position().toPoint()
+            self.viewport().setCursor(Qt.CursorShape.ClosedHandCursor)
+    
+    def mouseMoveEvent(self, event):
+        if self._drag_origin is not None:
+            pos = event.position().toPoint()
+            delta = pos - self._drag_origin
+            self._drag_origin = pos
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+    
+    def mouseReleaseEvent(self, event):
+        self._drag_origin = None
+        self.viewport().unsetCursor()
+    
+    def shutdown(self):
+        """Cancel queued tile loads and wait for running ones to finish"""
+        self._cancel_pending()
+        self._pool.waitForDone()
+    
+    def _draw_fallback(self, painter: QPainter, level: int, source: QRectF, target: QRectF):
+        """Draw a loaded coarser tile in place of a missing one"""
+        level_count = self.store.level_count(self.image_size)
+        for coarse in range(level + 1, level_count):
+            span = self.store.tile_size << coarse
+            tx, ty = int(source.x() // span), int(source.y() // span)
+            tile = self.tile_cache.get((self.page_key, coarse, tx, ty))
+            if tile is None:
+                continue
+            scale = 1 << coarse
+            tile_source = QRectF((source.x() - tx * span) / scale, (source.y() - ty * span) / scale,
+                                 source.width() / scale, source.height() / scale)
+            painter.drawImage(target, tile, tile_source)
+            return
+    
+    def _visible_tiles(self, level: int) -> Tuple[int, int, int, int]:
+        """First and last visible tile column and row at a level"""
+        span = self.store.tile_size << level
+        cols, rows = self.store.tile_grid(self.image_size, level)
+        offset_x, offset_y = self._content_offset()
+        
+        # Visible region in source pixel coordinates
+        left = (self.horizontalScrollBar().value() - offset_x) / self.zoom
+        top = (self.verticalScrollBar().value() - offset_y) / self.zoom
+        right = left + self.viewport().width() / self.zoom
+        bottom = top + self.viewport().height() / self.zoom
+        return (max(0, int(left // span)), min(cols - 1, int(right // span)),
+                max(0, int(top // span)), min(rows - 1, int(bottom // span)))
+    
+    def _cancel_hidden(self):
+        """Drop queued tile loads that have left the view or the current level"""
+        if not self._tasks:
+            return
+        level = self.current_level()
+        first_col, last_col, first_row, last_row = self._visible_tiles(level)
+        keep = []
+        for task in self._tasks:
+            if task.level == level and first_col <= task.tx <= last_col \
+                    and first_row <= task.ty <= last_row:
+                keep.append(task)
+            else:
+                task.cancelled = True
+                self._pending.discard((task.key, task.level, task.tx, task.ty))
+        self._tasks = keep
+    
+    def _request_tile(self, level: int, tx: int, ty: int):
+        request = (self.page_key, level, tx, ty)
+        if request in self._pending:
+            return
+        self._pending.add(request)
+        task = TileLoadTask(self.store, self.image_path, self.page_key, level, tx, ty)
+        task.signals.loaded.connect(self._on_tile_loaded)
+        self._tasks.append(task)
+        self._pool.start(task)
+    
+    def _on_tile_loaded(self, key: str, level: int, tx: int, ty: int, image: QImage):
+        request = (key, level, tx, ty)
+        self._tasks = [task for task in self._tasks if not task.cancelled and
+                       (task.key, task.level, task.tx, task.ty) != request]
+        if key != self.page_key or image.isNull():
+            # Failed tiles stay pending so they are not requested again
+            return
+        self._pending.discard(request)
+        self.tile_cache.put(request, image, image.sizeInBytes())
+        self.viewport().update()
+    
+    def _cancel_pending(self):
+        for task in self._tasks:
+            task.cancelled = True
+        self._tasks = []
+        self._pending.clear()
+    
+    def _content_offset(self) -> Tuple[float, float]:
+        """Offset that centers content smaller than the viewport"""
+        width = self.image_size[0] * self.zoom
+        height = self.image_size[1] * self.zoom
+        return (max(0.0, (self.viewport().width() - width) / 2),
+                max(0.0, (self.viewport().height() - height) / 2))
+    
+    def _update_scrollbars(self):
+        width = round(self.image_size[0] * self.zoom)
+        height = round(self.image_size[1] * self.zoom)
+        viewport = self.viewport().size()
+        self.horizontalScrollBar().setRange(0, max(0, width - viewport.width()))
+        self.horizontalScrollBar().setPageStep(viewport.width())
+        self.verticalScrollBar().setRange(0, max(0, height - viewport.height()))
+        self.verticalScrollBar().setPageStep(viewport.height())
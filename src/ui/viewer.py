@@ -1,22 +1,99 @@
 """
 Image viewer widget for displaying book pages
 """
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QScrollArea
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt
+from typing import Optional
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QScrollArea, QPushButton, QStackedWidget
+)
+from PyQt6.QtGui import QPixmap, QImage
+from PyQt6.QtCore import Qt, QThreadPool, pyqtSignal
+from ..models.book import Book, Page
+from ..utils.image_cache import ImageCache, ImageMemoryManager, PRIORITY_TILE
+from ..utils.tiles import TileStore
+from .image_loader import ImageDecodeTask
+from .scroll_view import ContinuousPageView
+from .tile_view import TiledImageView
+
+# Rendition widths are rounded up to a multiple of this so that small
+# resizes keep hitting the decoded-image cache
+WIDTH_STEP = 64
 
 
 class ImageViewerWidget(QWidget):
     """Widget for displaying images"""
     
-    def __init__(self):
+    page_changed = pyqtSignal(int)  # Emitted when scrolling reaches another page
+    
+    # Zoom factor applied by one press of the zoom buttons
+    ZOOM_STEP = 1.25
+    
+    def __init__(self, image_cache: ImageCache = None, tile_store: TileStore = None,
+                 memory: Optional[ImageMemoryManager] = None):
         super().__init__()
+        self.image_cache = image_cache
+        self.tile_store = tile_store
+        # The pixmap on screen is charged to the memory budget as a reservation
+        self.memory = memory
+        self._page_path: Optional[str] = None
+        self._page: Optional[Page] = None
+        self.book: Optional[Book] = None
+        # Bumped on every request; results carrying an older token are stale
+        self._generation = 0
+        self._current_path: Optional[str] = None
+        self._current_width = 0
+        # Page shown from a stand-in image until its own decode arrives
+        self._preview_path: Optional[str] = None
+        self._task: Optional[ImageDecodeTask] = None
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
         self.init_ui()
     
     def init_ui(self):
         """Initialize the UI"""
         layout = QVBoxLayout()
         
+        bar_layout = QHBoxLayout()
+        bar_layout.setContentsMargins(0, 0, 0, 0)
+        
+        # Reading mode
+        self.continuous_btn = QPushButton("連続")
+        self.continuous_btn.setToolTip("ページを縦に続けて表示")
+        self.continuous_btn.setCheckable(True)
+        self.continuous_btn.toggled.connect(self.set_continuous)
+        bar_layout.addWidget(self.continuous_btn)
+        
+        self.spread_btn = QPushButton("見開き")
+        self.spread_btn.setToolTip("2ページずつ並べて表示")
+        self.spread_btn.setCheckable(True)
+        self.spread_btn.setEnabled(False)
+        self.spread_btn.toggled.connect(self.set_spread)
+        bar_layout.addWidget(self.spread_btn)
+        
+        # Zoom controls
+        zoom_layout = QHBoxLayout()
+        zoom_layout.setContentsMargins(0, 0, 0, 0)
+        zoom_out_btn = QPushButton("−")
+        zoom_out_btn.clicked.connect(self.zoom_out)
+        zoom_layout.addWidget(zoom_out_btn)
+        
+        zoom_in_btn = QPushButton("+")
+        zoom_in_btn.clicked.connect(self.zoom_in)
+        zoom_layout.addWidget(zoom_in_btn)
+        
+        fit_btn = QPushButton("幅に合わせる")
+        fit_btn.clicked.connect(self.fit_to_width)
+        zoom_layout.addWidget(fit_btn)
+        
+        self.zoom_label = QLabel("幅に合わせる")
+        zoom_layout.addWidget(self.zoom_label)
+        
+        self.zoom_bar = QWidget()
+        self.zoom_bar.setLayout(zoom_layout)
+        self.zoom_bar.setVisible(self.tile_store is not None)
+        bar_layout.addWidget(self.zoom_bar)
+        bar_layout.addStretch()
+        layout.addLayout(bar_layout)
+        
         # Image label
         self.image_label = QLabel()
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -24,31 +101,249 @@ class ImageViewerWidget(QWidget):
         self.image_label.setMinimumSize(400, 600)
         
         # Scroll area
-        scroll_area = QScrollArea()
-        scroll_area.setWidget(self.image_label)
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setStyleSheet("QScrollArea { background-color: #f0f0f0; }")
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setWidget(self.image_label)
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setStyleSheet("QScrollArea { background-color: #f0f0f0; }")
+        
+        # Zoomed view, painted from the tile pyramid
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.scroll_area)
+        self.tile_view = None
+        if self.tile_store is not None:
+            tile_cache = None
+            if self.memory is not None:
+                tile_cache = self.memory.cache("tiles", PRIORITY_TILE)
+            self.tile_view = TiledImageView(self.tile_store, tile_cache=tile_cache)
+            self.tile_view.zoom_changed.connect(self.on_zoom_changed)
+            self.stack.addWidget(self.tile_view)
+        
+        # Continuous reading, sharing the rendition cache
+        self.continuous_view = ContinuousPageView(self.image_cache)
+        self.continuous_view.page_changed.connect(self.on_continuous_page_changed)
+        self.stack.addWidget(self.continuous_view)
         
-        layout.addWidget(scroll_area)
+        layout.addWidget(self.stack)
         self.setLayout(layout)
     
-    def load_image(self, image_path: str):
-        """Load and display an image"""
-        try:
-            pixmap = QPixmap(image_path)
-            if pixmap.isNull():
-                self.image_label.setText("画像を読み込めませんでした")
-            else:
-                # Scale image to fit the widget while maintaining aspect ratio
-                scaled_pixmap = pixmap.scaledToWidth(
-                    min(pixmap.width(), 1000),
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.image_label.setPixmap(scaled_pixmap)
-        except Exception as e:
-            self.image_label.setText(f"エラー: {str(e)}")
+    def load_image(self, image_path: str, decode: bool = True, page: Optional[Page] = None):
+        """Load and display an image without blocking the GUI thread.
+        
+        With decode=False the image is expected to arrive through
+        on_image_ready() from someone else, e.g. the prefetcher. The page,
+        if given, lets the zoom view use its cached metadata.
+        """
+        preview_path, self._preview_path = self._preview_path, None
+        self._cancel_pending()
+        self._page_path = image_path
+        self._page = page
+        if self.is_zoomed():
+            self.tile_view.set_image(image_path, page)
+            return
+        self._current_path = image_path
+        self._current_width = self.target_width()
+        
+        if self.image_cache is not None:
+            image = self.image_cache.get((image_path, self._current_width))
+            if image is not None:
+                self._current_path = None
+                self.show_image(image)
+                return
+        
+        if image_path != preview_path:
+            self.image_label.setText("読み込み中...")
+            self._reserve(0)
+        if decode:
+            self._start_decode()
+    
+    def set_book(self, book: Optional[Book]):
+        """Set the book shown by the continuous view"""
+        self.book = book
+        self.continuous_view.set_book(book)
+    
+    def is_continuous(self) -> bool:
+        """Check whether the continuous view is active"""
+        return self.stack.currentWidget() is self.continuous_view
+    
+    def set_continuous(self, continuous: bool):
+        """Switch between single pages and continuous reading at the current page"""
+        if continuous == self.is_continuous():
+            return
+        page = self._page
+        if continuous:
+            if self.is_zoomed():
+                self.tile_view.set_image(None)
+                self.zoom_label.setText("幅に合わせる")
+            self._cancel_pending()
+            self.image_label.clear()
+            self._reserve(0)
+            self.stack.setCurrentWidget(self.continuous_view)
+            if page is not None:
+                self.continuous_view.scroll_to_page(page.page_number)
+        else:
+            self.stack.setCurrentWidget(self.scroll_area)
+            if page is not None:
+                self.load_image(page.image_path, page=page)
+        self.continuous_btn.setChecked(continuous)
+        self.spread_btn.setEnabled(continuous)
+        self.zoom_bar.setEnabled(not continuous)
+    
+    def set_spread(self, spread: bool):
+        """Show two pages side by side in the continuous view"""
+        self.continuous_view.set_spread(spread)
+    
+    def scroll_to_page(self, page_index: int):
+        """Scroll the continuous view to a page"""
+        self._set_page(page_index)
+        self.continuous_view.scroll_to_page(page_index)
+    
+    def on_continuous_page_changed(self, page_index: int):
+        """Remember the page scrolled to, so single page mode resumes there"""
+        self._set_page(page_index)
+        self.page_changed.emit(page_index)
+    
+    def target_width(self) -> int:
+        """Width in device pixels a rendition needs to fill the view"""
+        # Leave room for the label border and a vertical scroll bar
+        margin = 2 + self.scroll_area.verticalScrollBar().sizeHint().width()
+        width = max(1, self.scroll_area.viewport().width() - margin) * self.devicePixelRatioF()
+        return int(-(-width // WIDTH_STEP) * WIDTH_STEP)
+    
+    def on_image_ready(self, image_path: str):
+        """Show an image that was decoded elsewhere into the shared cache"""
+        if image_path != self._current_path or self.image_cache is None:
+            return
+        image = self.image_cache.get((image_path, self._current_width))
+        if image is None:
+            # Decoded at another size, or failed: decode it ourselves
+            self._start_decode()
+            return
+        self._cancel_pending()
+        self.show_image(image)
+    
+    def show_image(self, image: QImage):
+        """Display an already decoded, display-ready image"""
+        if image is None or image.isNull():
+            self.image_label.setText("画像を読み込めませんでした")
+            self._reserve(0)
+        else:
+            pixmap = QPixmap.fromImage(image)
+            pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+            self.image_label.setPixmap(pixmap)
+            self._reserve(pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+    
+    def show_preview(self, image_path: str, image: QImage):
+        """Show a stand-in for a page until load_image() of that page
+        replaces it with a full-quality rendition"""
+        if image.isNull() or self.is_continuous() or self.is_zoomed():
+            return
+        width = self.target_width()
+        if image.width() != width:
+            image = image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+        self.show_image(image)
+        self._preview_path = image_path
+    
+    def current_image(self) -> Optional[QImage]:
+        """The rendition of the current page on screen, if it is fully shown"""
+        if self.is_continuous():
+            return self.continuous_view.page_image(self.continuous_view.current_page)
+        if self.is_zoomed() or self._current_path is not None or self._preview_path:
+            return None
+        pixmap = self.image_label.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return None
+        return pixmap.toImage()
+    
+    def is_zoomed(self) -> bool:
+        """Check whether the tiled zoom view is active"""
+        return self.tile_view is not None and self.stack.currentWidget() is self.tile_view
+    
+    def zoom_in(self):
+        """Zoom into the current page"""
+        self._zoom_by(self.ZOOM_STEP)
+    
+    def zoom_out(self):
+        """Zoom out of the current page"""
+        self._zoom_by(1 / self.ZOOM_STEP)
+    
+    def fit_to_width(self):
+        """Return to the fit-to-width rendition"""
+        if not self.is_zoomed():
+            return
+        self.tile_view.set_image(None)
+        self.stack.setCurrentWidget(self.scroll_area)
+        self.zoom_label.setText("幅に合わせる")
+        if self._page_path:
+            self.load_image(self._page_path, page=self._page)
+    
+    def on_zoom_changed(self, zoom: float):
+        """Show the zoom factor"""
+        self.zoom_label.setText(f"{zoom * 100:.0f}%")
+    
+    def _zoom_by(self, factor: float):
+        if self.tile_view is None or not self._page_path:
+            return
+        if not self.is_zoomed():
+            self._cancel_pending()
+            if not self.tile_view.set_image(self._page_path, self._page):
+                return
+            self.stack.setCurrentWidget(self.tile_view)
+            self.tile_view.set_zoom(self.tile_view.fit_zoom() * factor)
+        else:
+            self.tile_view.set_zoom(self.tile_view.zoom * factor)
     
     def clear(self):
         """Clear the displayed image"""
+        self._cancel_pending()
+        self._page_path = None
+        self._page = None
+        self._preview_path = None
+        if self.is_zoomed():
+            self.tile_view.set_image(None)
         self.image_label.clear()
+        self._reserve(0)
         self.image_label.setText("ページを選択してください")
+    
+    def shutdown(self):
+        """Stop background decoding before the widget goes away"""
+        self._cancel_pending()
+        self._pool.waitForDone()
+        if self.tile_view is not None:
+            self.tile_view.shutdown()
+        self.continuous_view.shutdown()
+    
+    def _set_page(self, page_index: int):
+        if self.book is not None and 0 <= page_index < len(self.book.pages):
+            self._page = self.book.pages[page_index]
+            self._page_path = self._page.image_path
+    
+    def _reserve(self, cost: int):
+        if self.memory is not None:
+            self.memory.reserve("viewer", cost)
+    
+    def _cancel_pending(self):
+        """Invalidate the outstanding request, if any"""
+        self._generation += 1
+        self._current_path = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    def _start_decode(self):
+        """Decode the current page on a worker at the current target width"""
+        if self._task is not None:
+            return
+        task = ImageDecodeTask(self._current_path, self._current_width, token=self._generation)
+        task.signals.decoded.connect(self._on_decoded)
+        self._task = task
+        self._pool.start(task)
+    
+    def _on_decoded(self, image_path: str, token: int, image: QImage):
+        if token != self._generation:
+            return  # The selection has moved on
+        width = self._current_width
+        self._task = None
+        self._current_path = None
+        if not image.isNull() and self.image_cache is not None:
+            self.image_cache.put((image_path, width), image, image.sizeInBytes())
+        self.show_image(image)
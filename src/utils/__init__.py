@@ -1,12 +1,32 @@
 """
 Utility package initialization
+
+Names are imported from their modules when first accessed.
 """
-from .storage import BookStorage
-from .image import get_image_size, validate_image, resize_image_for_display
-
-__all__ = [
-    'BookStorage',
-    'get_image_size',
-    'validate_image',
-    'resize_image_for_display'
-]
+import importlib
+
+_EXPORTS = {
+    'BookStorage': '.storage',
+    'ThumbnailCache': '.thumbnail_cache',
+    'ImageCache': '.image_cache',
+    'TileStore': '.tiles',
+    'CoverAtlas': '.cover_atlas',
+    'ImportJob': '.importer',
+    'ImportResult': '.importer',
+    'read_page_metadata': '.metadata',
+    'refresh_stale_pages': '.metadata',
+    'refresh_pages': '.metadata',
+    'get_image_size': '.image',
+    'validate_image': '.image',
+    'resize_image_for_display': '.image',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,161 @@
+"""
+Compact binary book file with a fixed-size page table
+
+Layout, all integers little endian:
+
+    magic     8 bytes   b'PNGBOOK\\0'
+    version   uint16
+    reserved  uint16
+    header    uint32 length + UTF-8 JSON (title, cover, dates, page count,
+              last journal sequence number included)
+    records   page count * RECORD.size bytes, one per page in order
+    strings   UTF-8 image paths referenced by the records
+
+Opening a file reads the header and the page table into memory and
+closes the file; page records are decoded when a page is first accessed.
+Nothing keeps the file open, so it can be replaced while the book is in
+use, which Windows does not allow for a mapped file.
+"""
+import json
+import os
+import struct
+from datetime import datetime
+from typing import Tuple
+from ..models.book import Book, Page
+from ..models.page_list import PageList
+
+MAGIC = b'PNGBOOK\0'
+VERSION = 1
+_PREAMBLE = struct.Struct('<8sHHI')
+# path offset, path length, width, height, bit depth, flags,
+# file size, mtime_ns, sha1 content hash
+RECORD = struct.Struct('<QIIIBB2xQq20s')
+_HAS_METADATA = 1
+_HAS_HASH = 2
+
+
+def is_book_file(path: str) -> bool:
+    """Check whether a file starts with the binary book magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def encode_book(book: Book, journal_seq: int = 0) -> bytes:
+    """Serialize a book into the binary format"""
+    records = bytearray()
+    strings = bytearray()
+    for page in book.pages:
+        encoded = page.image_path.encode('utf-8')
+        flags = 0
+        content_hash = b''
+        if page.has_metadata:
+            flags |= _HAS_METADATA
+            if page.content_hash:
+                flags |= _HAS_HASH
+                content_hash = bytes.fromhex(page.content_hash)
+        records += RECORD.pack(
+            len(strings), len(encoded),
+            page.width or 0, page.height or 0, page.bit_depth or 0, flags,
+            page.file_size or 0, page.mtime_ns or 0, content_hash,
+        )
+        strings += encoded
+    header = json.dumps({
+        'title': book.title,
+        'cover_page_index': book.cover_page_index,
+        'created_at': book.created_at.isoformat(),
+        'modified_at': book.modified_at.isoformat(),
+        'page_count': len(book.pages),
+        'journal_seq': journal_seq,
+    }, ensure_ascii=False).encode('utf-8')
+    return b''.join((_PREAMBLE.pack(MAGIC, VERSION, 0, len(header)), header, records, strings))
+
+
+def write_book(book: Book, path: str, journal_seq: int = 0) -> None:
+    """Write a book to path, replacing it atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_book(book, journal_seq))
+    os.replace(tmp_path, path)
+
+
+def read_header(path: str) -> dict:
+    """Read only the header of a book file"""
+    with open(path, 'rb') as f:
+        header, _ = _read_header(f)
+    return header
+
+
+def read_book(path: str, offset: int = 0, path_prefix: str = "") -> Book:
+    """Open a book file, leaving its pages to be loaded on demand.
+    
+    offset locates a book stored inside a larger file, such as a bundle;
+    path_prefix is prepended to the stored image paths.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        header, header_length = _read_header(f)
+        count = header['page_count']
+        data = _read_page_table(f, count) if count else b''
+    
+    book = Book(header['title'])
+    book.cover_page_index = header['cover_page_index']
+    book.created_at = datetime.fromisoformat(header['created_at'])
+    book.modified_at = datetime.fromisoformat(header['modified_at'])
+    if count:
+        book.pages = PageList(count=count, loader=_PageRecordReader(data, count, path_prefix))
+    return book
+
+
+def _read_page_table(f, count: int) -> bytes:
+    """Read the page records and their strings, which follow the header.
+    
+    Paths are written in page order, so the last record tells where the
+    strings end; the file may continue with other data, as in a bundle.
+    """
+    records = f.read(count * RECORD.size)
+    if len(records) != count * RECORD.size:
+        raise ValueError("書籍ファイルが途中で切れています")
+    path_offset, path_length = RECORD.unpack_from(records, (count - 1) * RECORD.size)[:2]
+    strings = f.read(path_offset + path_length)
+    if len(strings) != path_offset + path_length:
+        raise ValueError("書籍ファイルが途中で切れています")
+    return records + strings
+
+
+def _read_header(f) -> Tuple[dict, int]:
+    magic, version, _, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+    if magic != MAGIC:
+        raise ValueError("書籍ファイルではありません")
+    if version > VERSION:
+        raise ValueError(f"未対応の書籍ファイルのバージョンです: {version}")
+    return json.loads(f.read(header_length).decode('utf-8')), header_length
+
+
+class _PageRecordReader:
+    """Decodes page records from the page table of a book file"""
+    
+    def __init__(self, data: bytes, count: int, path_prefix: str = ""):
+        self.data = data
+        self.path_prefix = path_prefix
+        self.strings_offset = count * RECORD.size
+    
+    def __call__(self, record: int) -> Page:
+        (path_offset, path_length, width, height, bit_depth, flags,
+         file_size, mtime_ns, content_hash) = RECORD.unpack_from(
+            self.data, record * RECORD.size)
+        start = self.strings_offset + path_offset
+        image_path = self.path_prefix + self.data[start:start + path_length].decode('utf-8')
+        metadata = None
+        if flags & _HAS_METADATA:
+            metadata = {
+                'width': width,
+                'height': height,
+                'bit_depth': bit_depth,
+                'file_size': file_size,
+                'mtime_ns': mtime_ns,
+                'content_hash': content_hash.hex() if flags & _HAS_HASH else None,
+            }
+        return Page(image_path, record, metadata)
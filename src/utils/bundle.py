@@ -0,0 +1,88 @@
+"""
+Self-contained book bundles: a stored ZIP archive of the page PNGs plus the
+binary page table, read in place through a memory map
+"""
+import calendar
+import os
+import time
+import zipfile
+from typing import Callable, Optional
+from ..models.book import Book
+from .book_format import encode_book, read_book
+from .page_io import SEPARATOR, close_bundle, get_bundle, member_mtime_ns, open_page, stat_page
+from .png_stream import parse_png_header
+
+BOOK_MEMBER = 'book.bin'
+_ZIP_EPOCH = calendar.timegm((1980, 1, 1, 0, 0, 0))
+
+
+def read_bundle(bundle_path: str) -> Book:
+    """Open the book stored in a bundle; its pages are read from the bundle"""
+    offset, _ = get_bundle(bundle_path).locate(BOOK_MEMBER)
+    prefix = os.path.abspath(bundle_path) + SEPARATOR
+    return read_book(bundle_path, offset, prefix)
+
+
+def write_bundle(book: Book, bundle_path: str,
+                 progress: Optional[Callable[[int, int], bool]] = None) -> bool:
+    """Stream a book's page files into a new bundle.
+    
+    progress(done, total) is called after every page; returning False stops
+    the export. Returns False if it was stopped. The bundle replaces
+    bundle_path only once it is complete; a stopped or failed export
+    removes what it had written.
+    """
+    tmp_path = f"{bundle_path}.tmp"
+    paths = []
+    metadata = []
+    total = len(book.pages)
+    completed = True
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for index, page in enumerate(book.pages):
+                member = f"pages/{index:06d}.png"
+                st = stat_page(page.image_path)
+                info = zipfile.ZipInfo(member, _zip_date_time(st.st_mtime_ns))
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = st.st_size
+                with open_page(page.image_path) as src, zf.open(info, 'w') as dst:
+                    header = src.read(33)
+                    dst.write(header)
+                    for block in iter(lambda: src.read(1024 * 1024), b''):
+                        dst.write(block)
+                if page.has_metadata:
+                    page_metadata = page.metadata()
+                else:
+                    page_metadata = dict(parse_png_header(header) or {})
+                    page_metadata.pop('color_type', None)
+                page_metadata['file_size'] = st.st_size
+                page_metadata['mtime_ns'] = member_mtime_ns(info)
+                paths.append(member)
+                metadata.append(page_metadata)
+                if progress is not None and not progress(index + 1, total):
+                    completed = False
+                    break
+            if completed:
+                bundle_book = Book(book.title)
+                bundle_book.add_pages(paths, metadata)
+                bundle_book.cover_page_index = book.cover_page_index
+                bundle_book.created_at = book.created_at
+                bundle_book.modified_at = book.modified_at
+                zf.writestr(BOOK_MEMBER, encode_book(bundle_book))
+    except BaseException:
+        # Unreadable pages and interruptions leave no partial bundle behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if not completed:
+        os.remove(tmp_path)
+        return False
+    close_bundle(bundle_path)
+    os.replace(tmp_path, bundle_path)
+    return True
+
+
+def _zip_date_time(mtime_ns: int) -> tuple:
+    """ZIP timestamp for an mtime; ZIP stores seconds in steps of two"""
+    seconds = max(mtime_ns // 10**9, _ZIP_EPOCH)
+    return time.gmtime(seconds - seconds % 2)[:6]
@@ -0,0 +1,139 @@
+"""
+SQLite index of saved books for listing them without opening each one
+"""
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    name TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    cover_path TEXT,
+    created_at TEXT NOT NULL,
+    modified_at TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+CREATE TABLE IF NOT EXISTS positions (
+    name TEXT PRIMARY KEY,
+    page_index INTEGER NOT NULL,
+    page_key TEXT
+);
+"""
+
+_COLUMNS = ('name', 'title', 'page_count', 'cover_path', 'created_at',
+            'modified_at', 'file_size', 'file_mtime_ns')
+
+
+class BookSummary:
+    """Catalog entry describing one saved book"""
+    
+    def __init__(self, name: str, title: str, page_count: int, cover_path: Optional[str],
+                 created_at: str, modified_at: str, file_size: int, file_mtime_ns: int):
+        self.name = name
+        self.title = title
+        self.page_count = page_count
+        self.cover_path = cover_path
+        self.created_at = created_at
+        self.modified_at = modified_at
+        self.file_size = file_size
+        self.file_mtime_ns = file_mtime_ns
+    
+    def to_row(self) -> tuple:
+        return tuple(getattr(self, column) for column in _COLUMNS)
+
+
+class BookCatalog:
+    """Per-book summaries kept in an SQLite database.
+    
+    Every change runs in its own transaction, so the catalog never holds a
+    half-applied update. The connection may be shared between threads.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL keeps its side files for the whole session instead of creating
+        # a journal per transaction, which would bump the directory mtime
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+    
+    def summaries(self) -> List[BookSummary]:
+        """All entries, most recently modified first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM books ORDER BY modified_at DESC"
+            ).fetchall()
+        return [BookSummary(*row) for row in rows]
+    
+    def file_states(self) -> Dict[str, Tuple[int, int]]:
+        """Recorded (file size, mtime_ns) of every entry"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, file_size, file_mtime_ns FROM books").fetchall()
+        return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+    
+    def put(self, summary: BookSummary) -> None:
+        """Add or replace an entry"""
+        self.apply([summary], [])
+    
+    def remove(self, name: str) -> None:
+        """Drop an entry"""
+        self.apply([], [name])
+    
+    def apply(self, updated: List[BookSummary], removed: List[str],
+              dir_mtime_ns: Optional[int] = None) -> None:
+        """Replace and drop entries in a single transaction"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO books ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [summary.to_row() for summary in updated])
+            self._conn.executemany("DELETE FROM books WHERE name = ?",
+                                   [(name,) for name in removed])
+            self._conn.executemany("DELETE FROM positions WHERE name = ?",
+                                   [(name,) for name in removed])
+            if dir_mtime_ns is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime_ns', ?)",
+                    (dir_mtime_ns,))
+    
+    def set_file_state(self, name: str, file_size: int, file_mtime_ns: int) -> None:
+        """Record that an entry's file was rewritten without changing its content"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE books SET file_size = ?, file_mtime_ns = ? WHERE name = ?",
+                (file_size, file_mtime_ns, name))
+    
+    def position(self, name: str) -> Optional[Tuple[int, Optional[str]]]:
+        """Last-read page index of a book and the key of its resume rendition"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_index, page_key FROM positions WHERE name = ?", (name,)).fetchone()
+        return tuple(row) if row else None
+    
+    def set_position(self, name: str, page_index: int, page_key: Optional[str] = None) -> None:
+        """Record the page a book was left at"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO positions (name, page_index, page_key) VALUES (?, ?, ?)",
+                (name, page_index, page_key))
+    
+    def dir_mtime_ns(self) -> Optional[int]:
+        """Directory mtime recorded at the last reconciliation"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'dir_mtime_ns'").fetchone()
+        return row[0] if row else None
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,167 @@
+"""
+Book covers packed into shared sheet images for the library grid
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from .catalog import BookSummary
+from .image import file_revision_key, load_image_scaled
+
+INDEX_FILENAME = 'index.json'
+
+
+class CoverAtlas:
+    """Cover thumbnails of the saved books, packed into sheet images.
+    
+    Each sheet holds COLUMNS x ROWS covers, so a screenful of the library
+    grid is filled from one or two image reads instead of one decode per
+    book. Every book owns a slot, recorded together with the revision key
+    of its cover file; update() redraws only the slots whose cover changed
+    and rewrites only the sheets holding them.
+    
+    update() may run on a worker thread while locate() is used by the GUI.
+    """
+    
+    COLUMNS = 8
+    ROWS = 4
+    BACKGROUND = (240, 240, 240)
+    
+    def __init__(self, cache_dir: str = "covers", cell_size: Tuple[int, int] = (96, 136)):
+        self.cache_dir = cache_dir
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        # book name -> {'key': cover revision key, 'slot': slot number}
+        self._books: Dict[str, dict] = {}
+        self._load_index()
+    
+    @property
+    def per_sheet(self) -> int:
+        return self.COLUMNS * self.ROWS
+    
+    def sheet_path(self, sheet: int) -> str:
+        """Path of a sheet image"""
+        return os.path.join(self.cache_dir, f"sheet{sheet:04d}.png")
+    
+    def locate(self, name: str) -> Optional[Tuple[int, Tuple[int, int, int, int]]]:
+        """Sheet number and (x, y, width, height) of a book's cover"""
+        with self._lock:
+            entry = self._books.get(name)
+        if entry is None or entry['key'] is None:
+            return None
+        sheet, cell = divmod(entry['slot'], self.per_sheet)
+        row, column = divmod(cell, self.COLUMNS)
+        width, height = self.cell_size
+        return sheet, (column * width, row * height, width, height)
+    
+    def update(self, summaries: List[BookSummary],
+               sheet_written: Optional[Callable[[int], None]] = None,
+               cancelled: Optional[Callable[[], bool]] = None) -> List[int]:
+        """Bring the atlas up to date with the catalog.
+        
+        Books are given slots in the order listed, so books shown next to
+        each other share sheets. sheet_written(sheet) is called after each
+        sheet is rewritten. Returns the numbers of the rewritten sheets.
+        """
+        names = {summary.name for summary in summaries}
+        with self._lock:
+            books = {name: dict(entry) for name, entry in self._books.items() if name in names}
+        used = {entry['slot'] for entry in books.values()}
+        free_slot = 0
+        changes: Dict[int, list] = {}
+        for summary in summaries:
+            key = _cover_key(summary.cover_path)
+            entry = books.get(summary.name)
+            if entry is not None and entry['key'] == key:
+                continue
+            if entry is None:
+                while free_slot in used:
+                    free_slot += 1
+                entry = books[summary.name] = {'slot': free_slot}
+                used.add(free_slot)
+            entry['key'] = key
+            changes.setdefault(entry['slot'] // self.per_sheet, []).append(
+                (entry['slot'], summary.cover_path if key else None))
+        
+        written = []
+        for sheet, covers in sorted(changes.items()):
+            if cancelled is not None and cancelled():
+                break
+            try:
+                self._draw_sheet(sheet, covers)
+            except Exception as e:
+                print(f"Error writing cover sheet: {e}")
+                continue
+            written.append(sheet)
+            with self._lock:
+                for name, entry in books.items():
+                    if entry['slot'] // self.per_sheet == sheet:
+                        self._books[name] = entry
+                self._save_index()
+            if sheet_written is not None:
+                sheet_written(sheet)
+        with self._lock:
+            # Slots of deleted books are reused by the next new ones
+            removed = [name for name in self._books if name not in books]
+            for name in removed:
+                del self._books[name]
+            if removed:
+                self._save_index()
+        return written
+    
+    def _draw_sheet(self, sheet: int, covers: List[Tuple[int, Optional[str]]]) -> None:
+        from PIL import Image
+        width, height = self.cell_size
+        path = self.sheet_path(sheet)
+        size = (width * self.COLUMNS, height * self.ROWS)
+        image = None
+        if os.path.exists(path):
+            with Image.open(path) as existing:
+                if existing.size == size:
+                    image = existing.convert('RGB')
+        if image is None:
+            image = Image.new('RGB', size, self.BACKGROUND)
+        for slot, cover_path in covers:
+            row, column = divmod(slot % self.per_sheet, self.COLUMNS)
+            left, top = column * width, row * height
+            image.paste(self.BACKGROUND, (left, top, left + width, top + height))
+            cover = load_image_scaled(cover_path, width, height) if cover_path else None
+            if cover is None:
+                continue
+            if cover.mode != 'RGB':
+                cover = cover.convert('RGB')
+            image.paste(cover, (left + (width - cover.width) // 2,
+                                top + (height - cover.height) // 2))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        image.save(f"{path}.tmp", 'PNG', compress_level=1)
+        os.replace(f"{path}.tmp", path)
+    
+    def _load_index(self) -> None:
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILENAME), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error reading cover index: {e}")
+            return
+        if data.get('cell_size') == list(self.cell_size) and \
+                data.get('columns') == self.COLUMNS and data.get('rows') == self.ROWS:
+            self._books = data.get('books', {})
+    
+    def _save_index(self) -> None:
+        """Write the index; the caller holds the lock"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        data = {'cell_size': list(self.cell_size), 'columns': self.COLUMNS, 'rows': self.ROWS,
+                'books': self._books}
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+
+def _cover_key(cover_path: Optional[str]) -> Optional[str]:
+    """Revision key of a cover file; None if there is no readable cover"""
+    if not cover_path:
+        return None
+    return file_revision_key(cover_path, "cover")
@@ -1,15 +1,46 @@
 """
 Image utility functions
 """
+import hashlib
 import os
-from PIL import Image
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
+from .metrics import metrics
+from .page_io import open_page, page_exists, stat_page
+from .png_stream import decode_png_scaled
+
+# Pillow is imported when an image is first decoded
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Stand-in for "no limit" when only one dimension is bounded
+UNBOUNDED = 1 << 30
+
+
+def file_revision_key(image_path: str, variant: str = "", file_size: Optional[int] = None,
+                      mtime_ns: Optional[int] = None) -> Optional[str]:
+    """Build a stable key for the current revision of a file.
+    
+    The key covers the absolute path, byte size and mtime, so it changes
+    whenever the file is rewritten. `variant` distinguishes derived assets
+    of the same file (e.g. different thumbnail sizes). When the size and
+    mtime are already known (e.g. from Page metadata) the file is not touched.
+    """
+    abs_path = os.path.abspath(image_path)
+    if file_size is None or mtime_ns is None:
+        try:
+            st = stat_page(abs_path)
+        except OSError:
+            return None
+        file_size, mtime_ns = st.st_size, st.st_mtime_ns
+    ident = f"{abs_path}\0{file_size}\0{mtime_ns}\0{variant}"
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()
 
 
 def get_image_size(image_path: str) -> Optional[Tuple[int, int]]:
     """Get the size of an image file"""
+    from PIL import Image
     try:
-        with Image.open(image_path) as img:
+        with open_page(image_path) as f, Image.open(f) as img:
             return img.size
     except Exception as e:
         print(f"Error getting image size: {e}")
@@ -18,12 +49,13 @@ def get_image_size(image_path: str) -> Optional[Tuple[int, int]]:
 
 def validate_image(image_path: str) -> bool:
     """Validate if file is a valid PNG image"""
+    from PIL import Image
     try:
-        if not os.path.isfile(image_path):
+        if not page_exists(image_path):
             return False
         if not image_path.lower().endswith('.png'):
             return False
-        with Image.open(image_path) as img:
+        with open_page(image_path) as f, Image.open(f) as img:
             img.verify()
         return True
     except Exception as e:
@@ -31,11 +63,56 @@ def validate_image(image_path: str) -> bool:
         return False
 
 
-def resize_image_for_display(image_path: str, max_width: int = 1200, max_height: int = 800) -> Optional[Image.Image]:
+def resize_image_for_display(image_path: str, max_width: int = 1200, max_height: int = 800) -> Optional['Image.Image']:
     """Resize image to fit display while maintaining aspect ratio"""
+    return load_image_scaled(image_path, max_width, max_height)
+
+
+def compute_target_size(source_size: Tuple[int, int], max_width: int = 0, max_height: int = 0,
+                        device_pixel_ratio: float = 1.0) -> Tuple[int, int]:
+    """Work out the output size for a source image shown in a bounded area.
+    
+    The bounds are in logical pixels and scaled by the device pixel ratio.
+    A bound of 0 means unbounded. Images are never scaled up.
+    """
+    width, height = source_size
+    bound_w = max_width * device_pixel_ratio if max_width > 0 else UNBOUNDED
+    bound_h = max_height * device_pixel_ratio if max_height > 0 else UNBOUNDED
+    scale = min(1.0, bound_w / max(1, width), bound_h / max(1, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_image_scaled(image_path: str, max_width: int = 0, max_height: int = 0,
+                      device_pixel_ratio: float = 1.0) -> Optional['Image.Image']:
+    """Decode an image directly at the size it will be shown at.
+    
+    Large PNGs are decoded row by row and downsampled on the fly; other
+    formats use Pillow's draft mode and reduce() before the final resample,
+    so peak memory follows the output size rather than the source size.
+    """
+    from PIL import Image
     try:
-        with Image.open(image_path) as img:
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+        with open_page(image_path) as f, Image.open(f) as img:
+            source_size = img.size
+            target = compute_target_size(source_size, max_width, max_height, device_pixel_ratio)
+            factor = min(source_size[0] // target[0], source_size[1] // target[1])
+            if img.format == 'PNG' and factor >= 2:
+                try:
+                    with metrics.timer("image.decode"):
+                        reduced = decode_png_scaled(image_path, factor)
+                except Exception as e:
+                    print(f"Error streaming PNG, falling back to full decode: {e}")
+                    reduced = None
+                if reduced is not None:
+                    if reduced.size != target:
+                        with metrics.timer("image.scale"):
+                            reduced = reduced.resize(target, Image.Resampling.LANCZOS)
+                    return reduced
+            img.draft(None, target)
+            with metrics.timer("image.decode"):
+                img.load()
+            with metrics.timer("image.scale"):
+                img.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
             return img.copy()
     except Exception as e:
         print(f"Error resizing image: {e}")
@@ -0,0 +1,196 @@
+"""
+Memory-bounded caches for decoded images
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from .metrics import metrics
+
+# Eviction priorities of the caches sharing a memory manager: under
+# pressure the least recently used entry of the lowest priority goes first
+PRIORITY_PREFETCH = 0  # display renditions, mostly decoded ahead of time
+PRIORITY_TILE = 1  # zoom tiles, re-read from the on-disk tile store
+PRIORITY_THUMBNAIL = 2  # page list thumbnails
+
+IMAGE_MEMORY_ENV = 'PNG_READER_IMAGE_MEMORY_MB'
+DEFAULT_IMAGE_MEMORY = 512 * 1024 * 1024
+
+
+def image_memory_budget() -> int:
+    """Byte budget for decoded images, from PNG_READER_IMAGE_MEMORY_MB if set"""
+    value = os.environ.get(IMAGE_MEMORY_ENV)
+    if value:
+        try:
+            return max(1, int(value)) * 1024 * 1024
+        except ValueError:
+            print(f"Ignoring invalid {IMAGE_MEMORY_ENV}: {value}")
+    return DEFAULT_IMAGE_MEMORY
+
+
+class ImageMemoryManager:
+    """One byte budget shared by several image caches.
+    
+    Caches created with cache() evict each other's entries by priority and
+    recency. Memory held outside any cache, such as the pixmap on screen,
+    is declared with reserve(); it counts against the budget but is never
+    evicted. Safe to use from worker threads.
+    """
+    
+    def __init__(self, max_bytes: int = DEFAULT_IMAGE_MEMORY):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        # priority -> (cache, key) -> cost, least recently used first
+        self._lru: Dict[int, OrderedDict] = {}
+        self._reserved: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._caches: list = []
+    
+    def cache(self, name: str, priority: int = PRIORITY_PREFETCH) -> 'ImageCache':
+        """Create a cache that draws on this budget"""
+        return ImageCache(manager=self, name=name, priority=priority)
+    
+    def reserve(self, name: str, cost: int) -> None:
+        """Declare memory held under name, replacing its previous amount"""
+        with self._lock:
+            self._total_bytes += cost - self._reserved.pop(name, 0)
+            if cost:
+                self._reserved[name] = cost
+            self._evict()
+    
+    def set_budget(self, max_bytes: int) -> None:
+        """Change the budget, evicting at once if it shrank"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+    
+    @property
+    def total_bytes(self) -> int:
+        """Bytes held by the caches and reservations"""
+        return self._total_bytes
+    
+    def usage(self) -> Dict[str, int]:
+        """Bytes held per cache and reservation"""
+        with self._lock:
+            usage = {cache.name: cache.total_bytes for cache in self._caches}
+            usage.update(self._reserved)
+        return usage
+    
+    def _register(self, cache: 'ImageCache') -> None:
+        with self._lock:
+            self._caches.append(cache)
+    
+    def _add(self, cache: 'ImageCache', key: Hashable, cost: int) -> None:
+        self._lru.setdefault(cache.priority, OrderedDict())[(cache, key)] = cost
+        self._total_bytes += cost
+        self._evict()
+    
+    def _touch(self, cache: 'ImageCache', key: Hashable) -> None:
+        self._lru[cache.priority].move_to_end((cache, key))
+    
+    def _remove(self, cache: 'ImageCache', key: Hashable) -> None:
+        cost = self._lru[cache.priority].pop((cache, key), None)
+        if cost is not None:
+            self._total_bytes -= cost
+    
+    def _evict(self) -> None:
+        for priority in sorted(self._lru):
+            entries = self._lru[priority]
+            while self._total_bytes > self.max_bytes and entries:
+                (cache, key), cost = entries.popitem(last=False)
+                self._total_bytes -= cost
+                cache._evicted(key)
+                metrics.count(f"{cache.name}.evicted")
+            if self._total_bytes <= self.max_bytes:
+                return
+
+
+class ImageCache:
+    """Keeps decoded images up to a total byte budget, evicting the least
+    recently used entries first. Safe to use from worker threads.
+    
+    A cache either has a budget of its own or, when created through an
+    ImageMemoryManager, shares the manager's budget with other caches.
+    """
+    
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024,
+                 manager: Optional[ImageMemoryManager] = None, name: str = 'image_cache',
+                 priority: int = PRIORITY_PREFETCH):
+        if manager is None:
+            manager = ImageMemoryManager(max_bytes)
+        self.manager = manager
+        self.name = name
+        self.priority = priority
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Hashable, tuple] = {}  # key -> (value, cost)
+        self._total_bytes = 0
+        self._lock = manager._lock
+        manager._register(self)
+    
+    @property
+    def max_bytes(self) -> int:
+        """Budget shared with the other caches of the manager"""
+        return self.manager.max_bytes
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                metrics.count(f"{self.name}.miss")
+                return None
+            self.manager._touch(self, key)
+            self.hits += 1
+            metrics.count(f"{self.name}.hit")
+            return entry[0]
+    
+    def put(self, key: Hashable, value: Any, cost: int) -> None:
+        """Store a value with its size in bytes"""
+        with self._lock:
+            self._discard(key)
+            if cost > self.manager.max_bytes:
+                return
+            self._entries[key] = (value, cost)
+            self._total_bytes += cost
+            self.manager._add(self, key, cost)
+    
+    def discard(self, key: Hashable) -> None:
+        """Remove a value from the cache if present"""
+        with self._lock:
+            self._discard(key)
+    
+    def clear(self) -> None:
+        """Remove every cached value"""
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+    
+    def keys(self) -> list:
+        """Keys of the cached values"""
+        with self._lock:
+            return list(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the cached values in bytes"""
+        return self._total_bytes
+    
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+            self.manager._remove(self, key)
+    
+    def _evicted(self, key: Hashable) -> None:
+        """Called by the manager, with the lock held, after evicting key"""
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry[1]
@@ -0,0 +1,119 @@
+"""
+Parallel validation and preparation of images before they become pages
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from .metadata import read_page_metadata
+from .page_io import open_page, page_exists
+from .thumbnail_cache import ThumbnailCache
+
+# Per-process thumbnail cache, set up by _init_worker
+_worker_thumbnails: Optional[ThumbnailCache] = None
+
+
+class ImportResult:
+    """Outcome of preparing one image file for import"""
+    
+    def __init__(self, image_path: str, error: Optional[str] = None,
+                 metadata: Optional[dict] = None):
+        self.image_path = image_path
+        self.error = error
+        self.metadata = metadata
+    
+    @property
+    def size(self) -> Optional[Tuple[int, int]]:
+        if not self.metadata:
+            return None
+        return self.metadata['width'], self.metadata['height']
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def inspect_image(image_path: str) -> ImportResult:
+    """Validate an image, read its page metadata and pre-generate its thumbnail"""
+    from PIL import Image
+    if not page_exists(image_path):
+        return ImportResult(image_path, "ファイルが見つかりません")
+    if not image_path.lower().endswith('.png'):
+        return ImportResult(image_path, "PNGファイルではありません")
+    metadata = read_page_metadata(image_path)
+    if metadata is None:
+        return ImportResult(image_path, "PNGファイルではありません")
+    try:
+        with open_page(image_path) as f, Image.open(f) as img:
+            img.verify()
+    except Exception as e:
+        return ImportResult(image_path, f"画像が壊れています: {e}")
+    if _worker_thumbnails is not None:
+        _worker_thumbnails.generate(image_path)
+    return ImportResult(image_path, metadata=metadata)
+
+
+def worker_context() -> multiprocessing.context.BaseContext:
+    """Start method for a process pool created by the calling thread.
+    
+    Forking while other threads run can copy a lock one of them holds into
+    the child, which then hangs; pools started from a GUI or worker thread
+    get their processes from a fork server instead. A plain script with a
+    single thread keeps fork, which needs no main-module guard.
+    """
+    if (threading.current_thread() is threading.main_thread() and threading.active_count() == 1
+            and 'fork' in multiprocessing.get_all_start_methods()):
+        return multiprocessing.get_context('fork')
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _init_worker(thumbnail_dir: Optional[str], thumbnail_height: int) -> None:
+    global _worker_thumbnails
+    if thumbnail_dir:
+        _worker_thumbnails = ThumbnailCache(thumbnail_dir, height=thumbnail_height)
+
+
+class ImportJob:
+    """Runs inspect_image over many files on a process pool.
+    
+    Results are yielded in input order as they complete. cancel() may be
+    called from another thread; pending files are then dropped.
+    """
+    
+    def __init__(self, image_paths: List[str], thumbnail_dir: Optional[str] = None,
+                 thumbnail_height: int = 60, workers: Optional[int] = None):
+        self.image_paths = list(image_paths)
+        self.thumbnail_dir = thumbnail_dir
+        self.thumbnail_height = thumbnail_height
+        self.workers = workers or os.cpu_count() or 1
+        self._cancelled = threading.Event()
+    
+    def cancel(self) -> None:
+        """Stop the job after the results already in flight"""
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def run(self) -> Iterator[ImportResult]:
+        """Process every file, yielding results in input order"""
+        if not self.image_paths:
+            return
+        chunksize = max(1, min(64, len(self.image_paths) // (self.workers * 8)))
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=worker_context(),
+            initializer=_init_worker,
+            initargs=(self.thumbnail_dir, self.thumbnail_height),
+        )
+        try:
+            for result in executor.map(inspect_image, self.image_paths, chunksize=chunksize):
+                if self.cancelled:
+                    break
+                yield result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
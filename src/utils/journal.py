@@ -0,0 +1,145 @@
+"""
+Append-only journal of book edits recorded since the last snapshot
+"""
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+from ..models import book as book_events
+from ..models.book import Book
+
+
+class BookJournal:
+    """Records a book's changes and appends them to a journal file.
+    
+    The journal listens to the book's change events and keeps the edits made
+    since they were last taken in memory. take_pending() hands them over on
+    the thread editing the book; write() then appends them, from any
+    thread, as one JSON line per operation, each with a sequence number. A
+    snapshot stores the last sequence number it contains so replay can skip
+    what it already has.
+    """
+    
+    def __init__(self, path: str, book: Book, next_seq: int = 1):
+        self.path = path
+        self.book = book
+        self.next_seq = next_seq
+        # Set when taken edits could not be written; the journal no longer
+        # matches the book and the next save has to write a snapshot
+        self.broken = False
+        self._pending: List[dict] = []
+        self._title = book.title
+        book.add_listener(self.on_book_changed)
+    
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending) or self.book.title != self._title
+    
+    def on_book_changed(self, event: str, *args):
+        """Record a book change event as a journal operation"""
+        if event == book_events.PAGES_INSERTED:
+            first, last = args
+            self._record({'op': 'add', 'pages': [
+                _page_entry(self.book, index) for index in range(first, last + 1)]})
+        elif event == book_events.PAGES_REMOVED:
+            first, last = args
+            self._record({'op': 'remove', 'first': first, 'last': last})
+        elif event == book_events.PAGE_MOVED:
+            from_index, to_index = args
+            self._record({'op': 'move', 'from': from_index, 'to': to_index})
+        elif event == book_events.COVER_CHANGED:
+            self._record({'op': 'cover', 'index': args[1]})
+        elif event == book_events.PAGES_CHANGED:
+            first, last = args
+            self._record({'op': 'metadata', 'first': first, 'pages': [
+                self.book.pages[index].metadata() for index in range(first, last + 1)]})
+    
+    def take_pending(self) -> List[dict]:
+        """Remove and return the operations recorded so far"""
+        if self.book.title != self._title:
+            self._record({'op': 'title', 'title': self.book.title})
+            self._title = self.book.title
+        entries, self._pending = self._pending, []
+        return entries
+    
+    def write(self, entries: List[dict]) -> None:
+        """Append taken operations to the journal file and sync it"""
+        if not entries:
+            return
+        lines = []
+        for entry in entries:
+            entry['seq'] = self.next_seq
+            self.next_seq += 1
+            lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def detach(self) -> None:
+        """Stop recording changes"""
+        self.book.remove_listener(self.on_book_changed)
+    
+    def _record(self, entry: dict) -> None:
+        entry['modified_at'] = self.book.modified_at.isoformat()
+        self._pending.append(entry)
+
+
+def _page_entry(book: Book, index: int) -> dict:
+    page = book.pages[index]
+    entry = {'image_path': page.image_path}
+    if page.has_metadata:
+        entry['metadata'] = page.metadata()
+    return entry
+
+
+def read_journal(path: str, after_seq: int = 0, limit: Optional[int] = None) \
+        -> Tuple[List[dict], int]:
+    """Read the operations newer than after_seq.
+    
+    Reading stops at the first line that is incomplete or unreadable, as left
+    by a crash during an append. Returns the operations and the length in
+    bytes of the intact part of the file. limit restricts reading to the
+    first limit bytes.
+    """
+    entries = []
+    valid_length = 0
+    try:
+        with open(path, 'rb') as f:
+            data = f.read() if limit is None else f.read(limit)
+    except FileNotFoundError:
+        return entries, 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b'\n'):
+            break
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break
+        valid_length += len(line)
+        if entry['seq'] > after_seq:
+            entries.append(entry)
+    return entries, valid_length
+
+
+def replay(book: Book, entries: List[dict]) -> None:
+    """Apply journal operations to a book"""
+    for entry in entries:
+        op = entry['op']
+        if op == 'add':
+            book.add_pages([page['image_path'] for page in entry['pages']],
+                           [page.get('metadata') for page in entry['pages']])
+        elif op == 'remove':
+            for _ in range(entry['last'] - entry['first'] + 1):
+                book.remove_page(entry['first'])
+        elif op == 'move':
+            book.move_page(entry['from'], entry['to'])
+        elif op == 'cover':
+            book.set_cover_page(entry['index'])
+        elif op == 'metadata':
+            for offset, metadata in enumerate(entry['pages']):
+                book.update_page_metadata(entry['first'] + offset, metadata)
+        elif op == 'title':
+            book.title = entry['title']
+    if entries:
+        book.modified_at = datetime.fromisoformat(entries[-1]['modified_at'])
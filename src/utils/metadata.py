@@ -0,0 +1,91 @@
+"""
+Cheap per-page metadata: PNG header fields, file stats and content hash
+"""
+import hashlib
+from typing import Iterable, List, Optional
+from ..models.book import Book
+from .page_io import open_page, stat_page
+from .png_stream import parse_png_header
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def read_png_header(image_path: str) -> Optional[dict]:
+    """Read width, height, bit depth and color type from the IHDR chunk
+    without decoding any pixel data"""
+    try:
+        with open_page(image_path) as f:
+            return parse_png_header(f.read(33))
+    except OSError:
+        return None
+
+
+def compute_content_hash(image_path: str) -> Optional[str]:
+    """Hash the file contents"""
+    digest = hashlib.sha1()
+    try:
+        with open_page(image_path) as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def read_page_metadata(image_path: str, compute_hash: bool = True) -> Optional[dict]:
+    """Collect the metadata stored on a Page for an image file"""
+    try:
+        st = stat_page(image_path)
+    except OSError:
+        return None
+    header = read_png_header(image_path)
+    if header is None:
+        return None
+    return {
+        'width': header['width'],
+        'height': header['height'],
+        'bit_depth': header['bit_depth'],
+        'file_size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'content_hash': compute_content_hash(image_path) if compute_hash else None,
+    }
+
+
+def refresh_stale_pages(book: Book, compute_hash: bool = False) -> List[int]:
+    """Re-read metadata only for pages whose files changed since it was read.
+    
+    Staleness is decided from a stat alone. Returns the indices of the
+    pages that were updated.
+    """
+    return refresh_pages(book, range(len(book.pages)), compute_hash)
+
+
+def refresh_pages(book: Book, indices: Iterable[int], compute_hash: bool = False) -> List[int]:
+    """Re-read the metadata of those given pages whose files changed.
+    
+    Pages whose files cannot be found are flagged as missing and lose
+    their metadata. The book is notified once per run of adjacent pages.
+    Returns the indices of the pages that were updated.
+    
+    Pages that never had metadata, as in books saved before it was cached,
+    have it filled in quietly: their files did not change, so they are not
+    reported and the book is not notified.
+    """
+    updates = {}
+    for index in sorted(set(indices)):
+        page = book.pages[index]
+        try:
+            st = stat_page(page.image_path)
+        except OSError:
+            if page.has_metadata or not page.missing:
+                page.missing = True
+                updates[index] = None
+            continue
+        if page.missing or (page.has_metadata and (st.st_size != page.file_size or
+                                                   st.st_mtime_ns != page.mtime_ns)):
+            page.missing = False
+            updates[index] = read_page_metadata(page.image_path, compute_hash)
+        elif not page.has_metadata:
+            page.set_metadata(read_page_metadata(page.image_path, compute_hash))
+    book.update_pages_metadata(updates)
+    return sorted(updates)
@@ -0,0 +1,240 @@
+"""
+Timers, counters and histograms for the hot paths
+
+Instrumented code records into the module-level `metrics` object:
+
+    with metrics.timer("image.decode"):
+        ...
+    metrics.count("image_cache.hit")
+
+While metrics are disabled (the default unless PNG_READER_METRICS is set)
+a timer is a shared no-op object and a count is a single attribute check.
+Recorded spans can be exported as JSON or in the Chrome trace format
+(chrome://tracing, Perfetto).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+
+METRICS_ENV = 'PNG_READER_METRICS'
+# Spans kept for the trace export; older ones are dropped
+MAX_SPANS = 100000
+
+# Histogram buckets are powers of two in microseconds, up to about 36 minutes
+_BUCKETS = 32
+
+
+class Histogram:
+    """Count, total and distribution of durations in seconds"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+    
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = min(_BUCKETS - 1, int(seconds * 1e6).bit_length())
+        self.buckets[bucket] += 1
+    
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of values"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (1 << bucket) / 1e6)
+        return self.max
+    
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.mean * 1000,
+            'min_ms': (self.min if self.count else 0.0) * 1000,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class _Span:
+    """Times a with-block and records it on exit"""
+    
+    __slots__ = ('metrics', 'name', 'started')
+    
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, self.started, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    """Stands in for a span while metrics are disabled"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """Thread-safe registry of timers, counters and recorded spans"""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        # (name, start, duration, thread id) of the most recent spans
+        self.spans: deque = deque(maxlen=MAX_SPANS)
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+    
+    def timer(self, name: str):
+        """Context manager timing a block under name"""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+    
+    def record(self, name: str, started: float, ended: float) -> None:
+        """Add a span measured elsewhere, in time.perf_counter() seconds"""
+        duration = ended - started
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration)
+            self.spans.append((name, started, duration, threading.get_ident()))
+    
+    def count(self, name: str, amount: int = 1) -> None:
+        """Increase a counter"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def reset(self) -> None:
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.spans.clear()
+            self.started = time.perf_counter()
+    
+    def hit_ratios(self) -> Dict[str, float]:
+        """Hit ratio of every cache counted as <name>.hit and <name>.miss"""
+        with self._lock:
+            counters = dict(self.counters)
+        ratios = {}
+        for name, hits in counters.items():
+            if not name.endswith('.hit'):
+                continue
+            cache = name[:-len('.hit')]
+            total = hits + counters.get(f"{cache}.miss", 0)
+            ratios[cache] = hits / total if total else 0.0
+        for name in counters:
+            if name.endswith('.miss') and name[:-len('.miss')] not in ratios:
+                ratios[name[:-len('.miss')]] = 0.0
+        return ratios
+    
+    def to_dict(self) -> dict:
+        """Summary of the timers, counters and cache hit ratios"""
+        with self._lock:
+            histograms = {name: histogram.to_dict()
+                          for name, histogram in sorted(self.histograms.items())}
+            counters = dict(sorted(self.counters.items()))
+        return {
+            'enabled': self.enabled,
+            'elapsed_s': time.perf_counter() - self.started,
+            'timers': histograms,
+            'counters': counters,
+            'hit_ratios': self.hit_ratios(),
+        }
+    
+    def to_chrome_trace(self) -> dict:
+        """Recorded spans as complete events of the Chrome trace format"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            started = self.started
+        events = [{
+            'name': name,
+            'cat': name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': (start - started) * 1e6,
+            'dur': duration * 1e6,
+            'pid': pid,
+            'tid': thread_id,
+        } for name, start, duration, thread_id in spans]
+        end = max((start + duration for _, start, duration, _ in spans), default=started)
+        events.extend({
+            'name': name,
+            'ph': 'C',
+            'ts': (end - started) * 1e6,
+            'pid': pid,
+            'args': {'value': value},
+        } for name, value in counters.items())
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    
+    def write_json(self, path: str) -> bool:
+        """Write the summary as JSON; returns False on failure"""
+        return _write(path, self.to_dict())
+    
+    def write_chrome_trace(self, path: str) -> bool:
+        """Write the spans as a Chrome trace; returns False on failure"""
+        return _write(path, self.to_chrome_trace())
+
+
+def _write(path: str, data: dict) -> bool:
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Error writing metrics: {e}")
+        return False
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function under name"""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.record(name, started, time.perf_counter())
+        return wrapper
+    return decorate
+
+
+metrics = Metrics(enabled=bool(os.environ.get(METRICS_ENV)))
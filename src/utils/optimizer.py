@@ -0,0 +1,537 @@
+"""
+Recompression of page images into smaller PNG files on a process pool
+
+Pages are never modified. Each optimized image is written to an output
+directory under a name derived from the source's content hash and the
+options used, and recorded in a manifest there, so a run that is
+interrupted or repeated only processes pages it has not seen before.
+"""
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from ..models.book import Book
+from .importer import worker_context
+from .page_io import open_page
+from .png_stream import PNG_SIGNATURE
+
+MANIFEST_FILENAME = 'manifest.jsonl'
+REPORT_FILENAME = 'report.json'
+
+# Ancillary chunks that change how pixels are displayed; kept when metadata
+# is stripped
+_RENDERING_CHUNKS = {b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT'}
+# Chunks whose contents depend on the color type; re-encoded images write
+# their own or drop them
+_COLOR_TYPE_CHUNKS = {b'tRNS', b'sBIT', b'bKGD', b'hIST'}
+_ANIMATION_CHUNKS = {b'acTL', b'fcTL', b'fdAT'}
+_ZLIB_STRATEGIES = ((zlib.Z_DEFAULT_STRATEGY, 'default'), (zlib.Z_FILTERED, 'filtered'))
+# Image modes re-encoded from 8-bit RGBA pixels; others only get their
+# metadata stripped and a Pillow re-encode
+_RGBA_MODES = {'1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA'}
+_FILTER_BAND_BYTES = 16 * 1024 * 1024
+
+_GRAY, _RGB, _PALETTE, _GRAY_ALPHA, _RGBA = 0, 2, 3, 4, 6
+
+# Asset names already in the manifest, set up by _init_worker
+_worker_done: FrozenSet[str] = frozenset()
+
+
+class OptimizeResult:
+    """Outcome of optimizing one page image"""
+    
+    def __init__(self, image_path: str, content_hash: Optional[str] = None,
+                 error: Optional[str] = None, output_path: Optional[str] = None,
+                 original_size: int = 0, optimized_size: int = 0, seconds: float = 0.0,
+                 method: Optional[str] = None, skipped: bool = False):
+        self.image_path = image_path
+        self.content_hash = content_hash
+        self.error = error
+        self.output_path = output_path
+        self.original_size = original_size
+        self.optimized_size = optimized_size
+        self.seconds = seconds
+        self.method = method
+        self.skipped = skipped
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+    
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_size - self.optimized_size if self.ok else 0
+    
+    def to_dict(self) -> dict:
+        return {
+            'image_path': self.image_path,
+            'content_hash': self.content_hash,
+            'error': self.error,
+            'output_path': self.output_path,
+            'original_size': self.original_size,
+            'optimized_size': self.optimized_size,
+            'seconds': round(self.seconds, 4),
+            'method': self.method,
+            'skipped': self.skipped,
+        }
+
+
+class OptimizeReport:
+    """Per-page results of an optimization run and their totals"""
+    
+    def __init__(self):
+        self.results: List[OptimizeResult] = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+    
+    def add(self, result: OptimizeResult) -> None:
+        self.results.append(result)
+        self.elapsed = time.perf_counter() - self.started
+    
+    def totals(self) -> dict:
+        ok = [result for result in self.results if result.ok]
+        original = sum(result.original_size for result in ok)
+        optimized = sum(result.optimized_size for result in ok)
+        return {
+            'pages': len(self.results),
+            'optimized': sum(1 for result in ok if not result.skipped),
+            'skipped': sum(1 for result in ok if result.skipped),
+            'failed': len(self.results) - len(ok),
+            'original_bytes': original,
+            'optimized_bytes': optimized,
+            'saved_bytes': original - optimized,
+            'cpu_seconds': round(sum(result.seconds for result in self.results), 3),
+            'elapsed_seconds': round(self.elapsed, 3),
+        }
+    
+    def summary(self) -> str:
+        """One-line description of the totals"""
+        totals = self.totals()
+        ratio = totals['saved_bytes'] / totals['original_bytes'] if totals['original_bytes'] else 0
+        text = (f"{totals['optimized']}枚を最適化、{totals['skipped']}枚は処理済み。"
+                f"{totals['saved_bytes'] / 1024 / 1024:.1f} MB 削減 ({ratio:.1%})、"
+                f"{totals['elapsed_seconds']:.1f} 秒")
+        if totals['failed']:
+            text += f"、{totals['failed']}枚は失敗"
+        return text
+    
+    def write(self, path: str) -> None:
+        """Save the totals and per-page results as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'totals': self.totals(),
+                       'pages': [result.to_dict() for result in self.results]},
+                      f, ensure_ascii=False, indent=1)
+
+
+def asset_name(content_hash: str, quantize_colors: int = 0, strip_metadata: bool = True) -> str:
+    """File name of the optimized image for a source hash and options"""
+    variant = ''
+    if quantize_colors:
+        variant += f"-q{quantize_colors}"
+    if not strip_metadata:
+        variant += '-m'
+    return f"{content_hash}{variant}.png"
+
+
+def read_manifest(output_dir: str) -> Dict[str, dict]:
+    """Entries of the optimization manifest, by asset name"""
+    entries = {}
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Left by a crash during an append
+                    continue
+                entries[entry['asset']] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def optimize_image(image_path: str, output_dir: str, quantize_colors: int = 0,
+                   strip_metadata: bool = True) -> OptimizeResult:
+    """Write the smallest PNG encoding found for an image.
+    
+    Candidates are the original with ancillary chunks dropped and
+    re-encodings of the pixels at the smallest color type and bit depth
+    that holds them exactly, each compressed with several zlib strategies.
+    quantize_colors > 0 first reduces the image to that many colors (gray
+    levels for grayscale pages), which is lossy. Lossless re-encodings are
+    decoded again and compared with the source before being kept.
+    """
+    started = time.perf_counter()
+    try:
+        with open_page(image_path) as f:
+            data = f.read()
+    except OSError as e:
+        return OptimizeResult(image_path, error=f"ファイルを読み込めません: {e}")
+    content_hash = hashlib.sha1(data).hexdigest()
+    name = asset_name(content_hash, quantize_colors, strip_metadata)
+    output_path = os.path.join(output_dir, name)
+    if name in _worker_done and os.path.exists(output_path):
+        return OptimizeResult(image_path, content_hash, output_path=output_path,
+                              original_size=len(data),
+                              optimized_size=os.path.getsize(output_path), skipped=True)
+    
+    chunks = _parse_chunks(data)
+    if chunks is None:
+        return OptimizeResult(image_path, content_hash, error="PNGファイルではありません")
+    if any(chunk_type in _ANIMATION_CHUNKS for chunk_type, _ in chunks):
+        return OptimizeResult(image_path, content_hash, error="アニメーションPNGには対応していません")
+    kept = [(chunk_type, body) for chunk_type, body in chunks
+            if _is_ancillary(chunk_type) and (not strip_metadata or chunk_type in _RENDERING_CHUNKS)]
+    
+    best = _rebuild(chunks, {chunk_type for chunk_type, _ in kept})
+    method = 'original'
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            if img.mode in _RGBA_MODES:
+                source = np.asarray(img.convert('RGBA'))
+                pixels = source
+                if quantize_colors:
+                    pixels = _quantize(img, pixels, quantize_colors)
+                keep_color = any(chunk_type == b'iCCP' for chunk_type, _ in kept)
+                for candidate, candidate_method in _encode_candidates(
+                        pixels, keep_color, [chunk for chunk in kept
+                                             if chunk[0] not in _COLOR_TYPE_CHUNKS]):
+                    if len(candidate) < len(best) and (
+                            quantize_colors or _decodes_to(candidate, source)):
+                        best, method = candidate, candidate_method
+            else:
+                # 16-bit and other modes: Pillow's own maximum compression
+                out = io.BytesIO()
+                img.save(out, 'PNG', optimize=True)
+                candidate = out.getvalue()
+                if len(candidate) < len(best) and strip_metadata and _same_pixels(candidate, img):
+                    best, method = candidate, 'pillow'
+    except Exception as e:
+        return OptimizeResult(image_path, content_hash, error=f"画像を処理できません: {e}")
+    
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(best)
+        os.replace(tmp_path, output_path)
+    except OSError as e:
+        return OptimizeResult(image_path, content_hash, error=f"書き込みに失敗しました: {e}")
+    return OptimizeResult(image_path, content_hash, output_path=output_path,
+                          original_size=len(data), optimized_size=len(best),
+                          seconds=time.perf_counter() - started, method=method)
+
+
+def _parse_chunks(data: bytes) -> Optional[List[Tuple[bytes, bytes]]]:
+    if data[:8] != PNG_SIGNATURE:
+        return None
+    chunks = []
+    position = 8
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, position)
+        body = data[position + 8:position + 8 + length]
+        if len(body) < length:
+            return None
+        chunks.append((chunk_type, body))
+        position += 12 + length
+        if chunk_type == b'IEND':
+            return chunks
+    return None
+
+
+def _is_ancillary(chunk_type: bytes) -> bool:
+    return bool(chunk_type[0] & 0x20)
+
+
+def _chunk(chunk_type: bytes, body: bytes) -> bytes:
+    return (struct.pack('>I', len(body)) + chunk_type + body +
+            struct.pack('>I', zlib.crc32(body, zlib.crc32(chunk_type))))
+
+
+def _rebuild(chunks: List[Tuple[bytes, bytes]], kept_types: set) -> bytes:
+    """The original file without the dropped ancillary chunks"""
+    return PNG_SIGNATURE + b''.join(
+        _chunk(chunk_type, body) for chunk_type, body in chunks
+        if not _is_ancillary(chunk_type) or chunk_type in kept_types)
+
+
+def _quantize(img: Image.Image, pixels: np.ndarray, colors: int) -> np.ndarray:
+    """Reduce pixels to at most the given number of colors"""
+    rgb = pixels[..., :3]
+    if (rgb[..., 0] == rgb[..., 1]).all() and (rgb[..., 1] == rgb[..., 2]).all():
+        # Evenly spaced gray levels keep line art crisp and let 2, 4 and 16
+        # levels use the low gray bit depths
+        step = 255 / (colors - 1)
+        levels = np.round(np.round(pixels[..., 0] / step) * step).astype(np.uint8)
+        quantized = pixels.copy()
+        quantized[..., 0] = quantized[..., 1] = quantized[..., 2] = levels
+        return quantized
+    if (pixels[..., 3] == 255).all():
+        reduced = Image.fromarray(np.ascontiguousarray(rgb)).quantize(
+            colors, method=Image.Quantize.MEDIANCUT)
+    else:
+        reduced = Image.fromarray(pixels).quantize(colors, method=Image.Quantize.FASTOCTREE)
+    return np.asarray(reduced.convert('RGBA'))
+
+
+def _encode_candidates(pixels: np.ndarray, keep_color: bool,
+                       chunks: List[Tuple[bytes, bytes]]) -> Iterator[Tuple[bytes, str]]:
+    """Encodings of RGBA pixels in every color type that holds them exactly"""
+    height, width = pixels.shape[:2]
+    alpha = pixels[..., 3]
+    opaque = bool((alpha == 255).all())
+    rgb = pixels[..., :3]
+    gray = not keep_color and bool(
+        (rgb[..., 0] == rgb[..., 1]).all() and (rgb[..., 1] == rgb[..., 2]).all())
+    
+    layouts = []
+    if gray and opaque:
+        levels = pixels[..., 0]
+        depth = _gray_depth(levels)
+        layouts.append((_GRAY, depth, levels // (255 // (2 ** depth - 1)), None, None))
+    elif gray:
+        layouts.append((_GRAY_ALPHA, 8, pixels[..., [0, 3]], None, None))
+    elif opaque:
+        layouts.append((_RGB, 8, rgb, None, None))
+    else:
+        layouts.append((_RGBA, 8, pixels, None, None))
+    if not gray:
+        palette = _palette_layout(pixels, opaque)
+        if palette is not None:
+            layouts.append(palette)
+    
+    for color_type, depth, samples, plte, trns in layouts:
+        rows = _pack_rows(samples, depth, height, width)
+        bpp = max(1, (depth * (samples.shape[2] if samples.ndim == 3 else 1)) // 8)
+        header = [_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0))]
+        header += [_chunk(chunk_type, body) for chunk_type, body in chunks]
+        if plte is not None:
+            header.append(_chunk(b'PLTE', plte))
+        if trns:
+            header.append(_chunk(b'tRNS', trns))
+        # Sub-byte and palette images compress best unfiltered; otherwise a
+        # fast compression of each filtering picks the one to compress hard
+        filter_name = 'none'
+        filtered = _filter_rows(rows, bpp, False)
+        if color_type != _PALETTE and depth == 8:
+            adaptive = _filter_rows(rows, bpp, True)
+            if len(zlib.compress(adaptive, 1)) < len(zlib.compress(filtered, 1)):
+                filter_name, filtered = 'adaptive', adaptive
+        for strategy, strategy_name in _ZLIB_STRATEGIES:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+            idat = compressor.compress(filtered) + compressor.flush()
+            encoded = b''.join([PNG_SIGNATURE] + header +
+                               [_chunk(b'IDAT', idat), _chunk(b'IEND', b'')])
+            yield encoded, f"{_LAYOUT_NAMES[color_type]}{depth}/{filter_name}/{strategy_name}"
+
+
+_LAYOUT_NAMES = {_GRAY: 'gray', _RGB: 'rgb', _PALETTE: 'palette',
+                 _GRAY_ALPHA: 'gray_alpha', _RGBA: 'rgba'}
+
+
+def _gray_depth(levels: np.ndarray) -> int:
+    """Smallest gray bit depth whose scaled levels cover every value exactly"""
+    used = np.flatnonzero(np.bincount(levels.ravel(), minlength=256))
+    for depth in (1, 2, 4):
+        if not (used % (255 // (2 ** depth - 1))).any():
+            return depth
+    return 8
+
+
+def _palette_layout(pixels: np.ndarray, opaque: bool) -> Optional[tuple]:
+    """Palette indices, PLTE and tRNS for images with at most 256 colors"""
+    packed = pixels.view(np.uint32).reshape(pixels.shape[:2])
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return None
+    entries = colors.view(np.uint8).reshape(-1, 4)
+    if not opaque:
+        # Translucent entries first so tRNS can stop at the last of them
+        order = np.argsort(entries[:, 3] == 255, kind='stable')
+        entries = entries[order]
+        indices = np.argsort(order)[indices]
+    depth = next(depth for depth in (1, 2, 4, 8) if len(colors) <= 2 ** depth)
+    trns = b''
+    if not opaque:
+        trns = entries[:, 3][:int((entries[:, 3] != 255).sum())].tobytes()
+    return (_PALETTE, depth, indices.reshape(pixels.shape[:2]).astype(np.uint8),
+            entries[:, :3].tobytes(), trns)
+
+
+def _pack_rows(samples: np.ndarray, depth: int, height: int, width: int) -> np.ndarray:
+    """Scanlines as a (height, row bytes) array, packing sub-byte samples"""
+    if depth == 8:
+        return np.ascontiguousarray(samples.astype(np.uint8)).reshape(height, -1)
+    per_byte = 8 // depth
+    padded_width = -(-width // per_byte) * per_byte
+    padded = np.zeros((height, padded_width), np.uint8)
+    padded[:, :width] = samples
+    grouped = padded.reshape(height, -1, per_byte)
+    rows = np.zeros(grouped.shape[:2], np.uint8)
+    for position in range(per_byte):
+        rows |= grouped[:, :, position] << (8 - depth * (position + 1))
+    return rows
+
+
+def _filter_rows(rows: np.ndarray, bpp: int, adaptive: bool) -> bytes:
+    """Filter every scanline; adaptive picks per row the filter whose output
+    has the smallest sum of absolute values, as libpng does"""
+    height, row_bytes = rows.shape
+    out = np.zeros((height, row_bytes + 1), np.uint8)
+    if not adaptive:
+        out[:, 1:] = rows
+        return out.tobytes()
+    # Bands bound the memory taken by the five filtered copies
+    band_rows = max(1, _FILTER_BAND_BYTES // (row_bytes * 5))
+    for first in range(0, height, band_rows):
+        band = rows[first:first + band_rows]
+        previous = np.zeros_like(band)
+        if first:
+            previous[0] = rows[first - 1]
+        previous[1:] = band[:-1]
+        left = np.zeros_like(band)
+        left[:, bpp:] = band[:, :-bpp]
+        upper_left = np.zeros_like(band)
+        upper_left[:, bpp:] = previous[:, :-bpp]
+        a, b, c = (x.astype(np.int16) for x in (left, previous, upper_left))
+        p = a + b - c
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+        paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+        candidates = np.stack([
+            band,
+            band - left,
+            band - previous,
+            band - ((a + b) >> 1).astype(np.uint8),
+            band - paeth,
+        ])
+        costs = np.abs(candidates.view(np.int8).astype(np.int16)).sum(axis=2)
+        choice = costs.argmin(axis=0)
+        out[first:first + len(band), 0] = choice
+        out[first:first + len(band), 1:] = candidates[choice, np.arange(len(band))]
+    return out.tobytes()
+
+
+def _decodes_to(encoded: bytes, pixels: np.ndarray) -> bool:
+    with Image.open(io.BytesIO(encoded)) as img:
+        return np.array_equal(np.asarray(img.convert('RGBA')), pixels)
+
+
+def _same_pixels(encoded: bytes, source: Image.Image) -> bool:
+    with Image.open(io.BytesIO(encoded)) as img:
+        return img.mode == source.mode and np.array_equal(np.asarray(img), np.asarray(source))
+
+
+def _init_worker(done: FrozenSet[str]) -> None:
+    global _worker_done
+    _worker_done = done
+
+
+class OptimizeJob:
+    """Runs optimize_image over many pages on a process pool.
+    
+    Results are yielded in input order and appended to the manifest in
+    output_dir as they arrive; pages whose content hash is known and
+    already in the manifest are reported as skipped without being read.
+    cancel() may be called from another thread. report collects every
+    result and is saved next to the manifest when the run ends.
+    """
+    
+    def __init__(self, image_paths: List[str], output_dir: str,
+                 content_hashes: Optional[List[Optional[str]]] = None,
+                 quantize_colors: int = 0, strip_metadata: bool = True,
+                 workers: Optional[int] = None):
+        self.image_paths = list(image_paths)
+        self.output_dir = output_dir
+        self.content_hashes = list(content_hashes) if content_hashes else [None] * len(self.image_paths)
+        self.quantize_colors = quantize_colors
+        self.strip_metadata = strip_metadata
+        self.workers = workers or os.cpu_count() or 1
+        self.report = OptimizeReport()
+        self._cancelled = threading.Event()
+    
+    @classmethod
+    def for_book(cls, book: Book, output_dir: str, **options) -> 'OptimizeJob':
+        """Job over every page of a book, reusing the hashes in its metadata"""
+        pages = list(book.pages)
+        return cls([page.image_path for page in pages], output_dir,
+                   [page.content_hash for page in pages], **options)
+    
+    def cancel(self) -> None:
+        """Stop the job after the results already in flight"""
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def run(self) -> Iterator[OptimizeResult]:
+        """Process every page, yielding results in input order"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = read_manifest(self.output_dir)
+        self.report = OptimizeReport()
+        
+        known = []
+        pending = []
+        for image_path, content_hash in zip(self.image_paths, self.content_hashes):
+            entry = None
+            if content_hash:
+                entry = manifest.get(asset_name(content_hash, self.quantize_colors,
+                                                self.strip_metadata))
+            if entry is not None and os.path.exists(os.path.join(self.output_dir, entry['asset'])):
+                known.append(OptimizeResult(
+                    image_path, content_hash,
+                    output_path=os.path.join(self.output_dir, entry['asset']),
+                    original_size=entry['original_size'],
+                    optimized_size=entry['optimized_size'], skipped=True))
+            else:
+                known.append(None)
+                pending.append(image_path)
+        
+        executor = None
+        results: Iterator[OptimizeResult] = iter(())
+        if pending:
+            chunksize = max(1, min(16, len(pending) // (self.workers * 8)))
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=worker_context(),
+                initializer=_init_worker,
+                initargs=(frozenset(manifest),),
+            )
+            results = executor.map(optimize_image, pending,
+                                   [self.output_dir] * len(pending),
+                                   [self.quantize_colors] * len(pending),
+                                   [self.strip_metadata] * len(pending),
+                                   chunksize=chunksize)
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_FILENAME), 'a',
+                      encoding='utf-8') as manifest_file:
+                for result in known:
+                    if result is None:
+                        result = next(results)
+                        if result.ok and not result.skipped:
+                            manifest_file.write(json.dumps({
+                                'asset': os.path.basename(result.output_path),
+                                'original_size': result.original_size,
+                                'optimized_size': result.optimized_size,
+                                'method': result.method,
+                            }) + '\n')
+                            manifest_file.flush()
+                    if self.cancelled:
+                        break
+                    self.report.add(result)
+                    yield result
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            try:
+                self.report.write(os.path.join(self.output_dir, REPORT_FILENAME))
+            except OSError as e:
+                print(f"Error writing optimization report: {e}")
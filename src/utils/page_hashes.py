@@ -0,0 +1,246 @@
+"""
+Perceptual hashes of every saved page for finding near-duplicate pages
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from ..models.book import Book
+from .image import load_image_scaled
+from .importer import worker_context
+from .page_io import stat_page
+
+INDEX_FILENAME = 'page_hashes.npz'
+# Pages at most this many of 64 bits apart in both hashes are reported
+DEFAULT_MAX_DISTANCE = 10
+
+_DCT_SIZE = 32
+_n = np.arange(_DCT_SIZE)
+# DCT-II basis; rows are frequencies
+_DCT = np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:, None] / (2 * _DCT_SIZE))
+
+
+def compute_page_hashes(image_path: str) -> Optional[Tuple[int, int]]:
+    """dHash and pHash of an image as 64-bit integers; None if unreadable.
+    
+    dHash compares neighbouring pixels of a 9x8 reduction; pHash compares
+    the low-frequency DCT coefficients of a 32x32 reduction with their
+    median. Both survive rescaling and recompression of a page.
+    """
+    image = load_image_scaled(image_path, 64, 64)
+    if image is None:
+        return None
+    gray = image.convert('L')
+    small = np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    dhash = _pack_bits(small[:, 1:] > small[:, :-1])
+    pixels = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.BOX), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    phash = _pack_bits(low > np.median(low.ravel()[1:]))
+    return dhash, phash
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+class SimilarPage:
+    """A saved page found near a query hash"""
+    
+    def __init__(self, book_name: str, page_index: int, image_path: str,
+                 distance: int, dhash_distance: int):
+        self.book_name = book_name
+        self.page_index = page_index
+        self.image_path = image_path
+        self.distance = distance
+        self.dhash_distance = dhash_distance
+
+
+class PageHashIndex:
+    """Perceptual hashes of the pages of every book in a storage directory.
+    
+    Hashes live in parallel NumPy arrays (one uint64 per page and hash
+    kind), so a query is a vectorized XOR and popcount over the whole
+    library. The index is saved as a single .npz file. update() re-reads
+    only books whose catalog entry changed and re-hashes only page files
+    whose size or mtime changed.
+    """
+    
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.book_names: List[str] = []
+        self.book_keys: List[str] = []
+        self.page_book = np.zeros(0, np.int32)
+        self.page_number = np.zeros(0, np.int32)
+        self.page_size = np.zeros(0, np.int64)
+        self.page_mtime = np.zeros(0, np.int64)
+        self.dhash = np.zeros(0, np.uint64)
+        self.phash = np.zeros(0, np.uint64)
+        self._paths = np.zeros(0, np.uint8)
+        self._path_offsets = np.zeros(1, np.int64)
+        self.load()
+    
+    def __len__(self) -> int:
+        return len(self.phash)
+    
+    def load(self) -> None:
+        """Read the saved index, if there is one"""
+        try:
+            with np.load(os.path.join(self.index_dir, INDEX_FILENAME)) as data:
+                self.book_names = data['book_names'].tolist()
+                self.book_keys = data['book_keys'].tolist()
+                for name in ('page_book', 'page_number', 'page_size', 'page_mtime',
+                             'dhash', 'phash'):
+                    setattr(self, name, data[name])
+                self._paths = data['paths']
+                self._path_offsets = data['path_offsets']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading page hash index: {e}")
+    
+    def save(self) -> None:
+        """Write the index, replacing the saved one atomically"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = os.path.join(self.index_dir, INDEX_FILENAME)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, book_names=np.array(self.book_names, dtype=str),
+                 book_keys=np.array(self.book_keys, dtype=str),
+                 page_book=self.page_book, page_number=self.page_number,
+                 page_size=self.page_size, page_mtime=self.page_mtime,
+                 dhash=self.dhash, phash=self.phash,
+                 paths=self._paths, path_offsets=self._path_offsets)
+        os.replace(tmp_path, path)
+    
+    def image_path(self, row: int) -> str:
+        start, end = self._path_offsets[row], self._path_offsets[row + 1]
+        return self._paths[start:end].tobytes().decode('utf-8')
+    
+    def update(self, storage, workers: Optional[int] = None,
+               progress: Optional[Callable[[int, int], bool]] = None) -> bool:
+        """Bring the index in line with the books in storage and save it.
+        
+        progress(done, total) is called while pages are hashed and may
+        return False to stop; the index is then left unchanged. Returns
+        whether the update completed.
+        """
+        summaries = storage.list_book_summaries()
+        current = {summary.name: f"{summary.modified_at}|{summary.file_size}|{summary.file_mtime_ns}"
+                   for summary in summaries}
+        previous = dict(zip(self.book_names, self.book_keys))
+        if current == previous:
+            return True
+        
+        # Hashes of every indexed file revision, to reuse for unchanged files
+        old_paths = [self.image_path(row) for row in range(len(self))]
+        known: Dict[Tuple[str, int, int], int] = {
+            key: row for row, key in enumerate(zip(
+                old_paths, self.page_size.tolist(), self.page_mtime.tolist()))}
+        
+        pages: List[Tuple[str, int, str, int, int]] = []
+        for name in sorted(current):
+            if current[name] == previous.get(name):
+                continue
+            book = storage.load_book(name)
+            if book is not None:
+                pages.extend(_page_entries(name, book))
+        
+        missing = sorted({path for _, _, path, size, mtime in pages
+                          if (path, size, mtime) not in known})
+        computed: Dict[str, Optional[Tuple[int, int]]] = {}
+        if missing:
+            workers = workers or os.cpu_count() or 1
+            chunksize = max(1, min(64, len(missing) // (workers * 8)))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+                results = executor.map(compute_page_hashes, missing, chunksize=chunksize)
+                for done, (path, hashes) in enumerate(zip(missing, results), 1):
+                    computed[path] = hashes
+                    if progress is not None and not progress(done, len(missing)):
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        return False
+        
+        book_names = sorted(current)
+        book_numbers = {name: number for number, name in enumerate(book_names)}
+        # Rows of unchanged books are carried over with their book renumbered
+        renumber = np.array([book_numbers[name] if current.get(name) == previous[name] else -1
+                             for name in self.book_names] or [-1], np.int32)
+        kept = np.flatnonzero(renumber[self.page_book] >= 0)
+        rows_book = renumber[self.page_book[kept]].tolist()
+        rows_number = self.page_number[kept].tolist()
+        rows_size = self.page_size[kept].tolist()
+        rows_mtime = self.page_mtime[kept].tolist()
+        rows_dhash = self.dhash[kept].tolist()
+        rows_phash = self.phash[kept].tolist()
+        paths = [old_paths[row] for row in kept.tolist()]
+        for name, number, path, size, mtime in pages:
+            row = known.get((path, size, mtime))
+            if row is not None:
+                hashes = (int(self.dhash[row]), int(self.phash[row]))
+            else:
+                hashes = computed.get(path)
+                if hashes is None:
+                    continue
+            rows_book.append(book_numbers[name])
+            rows_number.append(number)
+            rows_size.append(size)
+            rows_mtime.append(mtime)
+            rows_dhash.append(hashes[0])
+            rows_phash.append(hashes[1])
+            paths.append(path)
+        
+        encoded = [path.encode('utf-8') for path in paths]
+        self.book_names = book_names
+        self.book_keys = [current[name] for name in book_names]
+        self.page_book = np.array(rows_book, np.int32)
+        self.page_number = np.array(rows_number, np.int32)
+        self.page_size = np.array(rows_size, np.int64)
+        self.page_mtime = np.array(rows_mtime, np.int64)
+        self.dhash = np.array(rows_dhash, np.uint64)
+        self.phash = np.array(rows_phash, np.uint64)
+        self._paths = np.frombuffer(b''.join(encoded), np.uint8)
+        self._path_offsets = np.zeros(len(encoded) + 1, np.int64)
+        np.cumsum([len(path) for path in encoded], out=self._path_offsets[1:])
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Error saving page hash index: {e}")
+        return True
+    
+    def query(self, hashes: Tuple[int, int], max_distance: int = DEFAULT_MAX_DISTANCE,
+              limit: int = 100) -> List[SimilarPage]:
+        """Pages whose dHash and pHash are both within max_distance bits,
+        closest first"""
+        dhash, phash = hashes
+        phash_distance = np.bitwise_count(self.phash ^ np.uint64(phash))
+        dhash_distance = np.bitwise_count(self.dhash ^ np.uint64(dhash))
+        rows = np.flatnonzero((phash_distance <= max_distance) & (dhash_distance <= max_distance))
+        rows = rows[np.argsort(phash_distance[rows].astype(np.int32) + dhash_distance[rows],
+                               kind='stable')][:limit]
+        return [SimilarPage(self.book_names[self.page_book[row]], int(self.page_number[row]),
+                            self.image_path(row), int(phash_distance[row]),
+                            int(dhash_distance[row]))
+                for row in rows]
+    
+    def find_similar(self, image_path: str, max_distance: int = DEFAULT_MAX_DISTANCE,
+                     limit: int = 100) -> List[SimilarPage]:
+        """Saved pages that look like an image"""
+        hashes = compute_page_hashes(image_path)
+        if hashes is None:
+            return []
+        return self.query(hashes, max_distance, limit)
+
+
+def _page_entries(name: str, book: Book) -> List[Tuple[str, int, str, int, int]]:
+    """(book, page index, absolute path, size, mtime_ns) of a book's pages"""
+    entries = []
+    for index, page in enumerate(book.pages):
+        if page.has_metadata:
+            size, mtime = page.file_size, page.mtime_ns
+        else:
+            try:
+                st = stat_page(page.image_path)
+            except OSError:
+                continue
+            size, mtime = st.st_size, st.st_mtime_ns
+        entries.append((name, index, os.path.abspath(page.image_path), size, mtime))
+    return entries
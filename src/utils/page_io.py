@@ -0,0 +1,209 @@
+"""
+Reading page images that are plain files or members of a book bundle
+
+A page inside a bundle is addressed by a path of the form
+"<bundle file>!/<member>". The functions here accept either kind of path
+and are what image readers use instead of open() and os.stat().
+"""
+import calendar
+import io
+import mmap
+import os
+import struct
+import threading
+import zipfile
+from collections import namedtuple
+from typing import BinaryIO, Dict, Optional, Tuple
+
+BUNDLE_EXTENSION = '.bundle'
+SEPARATOR = '!/'
+
+# The parts of os.stat_result that page caches rely on
+PageStat = namedtuple('PageStat', ['st_size', 'st_mtime_ns'])
+
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+# signature, method, time, date, size, name length, extra length,
+# comment length, local header offset
+_CENTRAL_HEADER = struct.Struct('<4s6xHHH4x4xIHHH8xI')
+_CENTRAL_HEADER_SIGNATURE = b'PK\x01\x02'
+_END_RECORD = struct.Struct('<4s6xHIIH')
+_END_RECORD_SIGNATURE = b'PK\x05\x06'
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+_bundles: Dict[str, '_Bundle'] = {}
+_bundles_guard = threading.Lock()
+
+
+def split_page_path(image_path: str) -> Optional[Tuple[str, str]]:
+    """Split a bundle page path into (bundle path, member); None for plain files"""
+    marker = BUNDLE_EXTENSION + SEPARATOR
+    position = image_path.find(marker)
+    if position < 0:
+        return None
+    split = position + len(BUNDLE_EXTENSION)
+    return image_path[:split], image_path[split + len(SEPARATOR):]
+
+
+def open_page(image_path: str) -> BinaryIO:
+    """Open an image file, or a page inside a bundle, for reading"""
+    parts = split_page_path(image_path)
+    if parts is None:
+        return open(image_path, 'rb')
+    bundle = get_bundle(parts[0])
+    offset, size = bundle.locate(parts[1])
+    return io.BufferedReader(_MemberReader(bundle.data, offset, size))
+
+
+def stat_page(image_path: str) -> PageStat:
+    """Size and mtime of an image file or bundle page; raises OSError"""
+    parts = split_page_path(image_path)
+    if parts is None:
+        st = os.stat(image_path)
+        return PageStat(st.st_size, st.st_mtime_ns)
+    return get_bundle(parts[0]).stat(parts[1])
+
+
+def page_exists(image_path: str) -> bool:
+    """Check whether an image file or bundle page exists"""
+    try:
+        stat_page(image_path)
+        return True
+    except OSError:
+        return False
+
+
+def member_mtime_ns(info: zipfile.ZipInfo) -> int:
+    """Timestamp of a bundle member in the form stat_page() reports it"""
+    return calendar.timegm(info.date_time + (0, 0, 0)) * 10**9
+
+
+def _dos_mtime_ns(dos_date: int, dos_time: int) -> int:
+    return calendar.timegm((
+        (dos_date >> 9) + 1980, (dos_date >> 5) & 0xF, dos_date & 0x1F,
+        dos_time >> 11, (dos_time >> 5) & 0x3F, (dos_time & 0x1F) * 2,
+        0, 0, 0)) * 10**9
+
+
+def get_bundle(bundle_path: str) -> '_Bundle':
+    """Get the mapping of a bundle, reopening it if the file changed"""
+    abs_path = os.path.abspath(bundle_path)
+    st = os.stat(abs_path)
+    with _bundles_guard:
+        bundle = _bundles.get(abs_path)
+        if bundle is None or bundle.revision != (st.st_size, st.st_mtime_ns):
+            bundle = _Bundle(abs_path)
+            _bundles[abs_path] = bundle
+        return bundle
+
+
+def close_bundle(bundle_path: str) -> None:
+    """Drop the cached mapping of a bundle, e.g. before replacing or deleting it"""
+    with _bundles_guard:
+        _bundles.pop(os.path.abspath(bundle_path), None)
+
+
+class _Bundle:
+    """A mapped bundle file and its central directory"""
+    
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.revision = (st.st_size, st.st_mtime_ns)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # member -> (method, local header offset, size, mtime_ns)
+            self.members = self._read_directory()
+            if self.members is None:
+                with zipfile.ZipFile(f) as zf:
+                    self.members = {
+                        info.filename: (info.compress_type, info.header_offset,
+                                        info.file_size, member_mtime_ns(info))
+                        for info in zf.infolist()}
+        self._offsets: Dict[str, int] = {}
+    
+    def _read_directory(self) -> Optional[Dict[str, tuple]]:
+        """Decode the central directory directly from the map.
+        
+        zipfile builds a ZipInfo per member, which dominates opening a bundle
+        with tens of thousands of pages. Returns None for archives this
+        reader does not handle (ZIP64, archive comments), which are left to
+        zipfile.
+        """
+        data = self.data
+        end = len(data) - _END_RECORD.size
+        if end < 0 or data[end:end + 4] != _END_RECORD_SIGNATURE:
+            return None
+        _, count, directory_size, position, _ = _END_RECORD.unpack_from(data, end)
+        if count == 0xFFFF or _ZIP64_LIMIT in (directory_size, position):
+            return None
+        members = {}
+        unpack_from = _CENTRAL_HEADER.unpack_from
+        for _ in range(count):
+            (signature, method, dos_time, dos_date, size, name_length, extra_length,
+             comment_length, header_offset) = unpack_from(data, position)
+            if signature != _CENTRAL_HEADER_SIGNATURE or _ZIP64_LIMIT in (size, header_offset):
+                return None
+            start = position + _CENTRAL_HEADER.size
+            name = data[start:start + name_length].decode('utf-8')
+            members[name] = (method, header_offset, size, _dos_mtime_ns(dos_date, dos_time))
+            position = start + name_length + extra_length + comment_length
+        return members
+    
+    def locate(self, member: str) -> Tuple[int, int]:
+        """Offset and size of a member's data in the file"""
+        entry = self.members.get(member)
+        if entry is None or entry[0] != zipfile.ZIP_STORED:
+            raise FileNotFoundError(f"{member} not found in bundle")
+        _, header_offset, size, _ = entry
+        offset = self._offsets.get(member)
+        if offset is None:
+            signature, name_length, extra_length = _LOCAL_HEADER.unpack_from(
+                self.data, header_offset)
+            if signature != _LOCAL_HEADER_SIGNATURE:
+                raise OSError(f"Corrupt bundle entry: {member}")
+            offset = header_offset + _LOCAL_HEADER.size + name_length + extra_length
+            self._offsets[member] = offset
+        return offset, size
+    
+    def stat(self, member: str) -> PageStat:
+        entry = self.members.get(member)
+        if entry is None:
+            raise FileNotFoundError(f"{member} not found in bundle")
+        return PageStat(entry[2], entry[3])
+
+
+class _MemberReader(io.RawIOBase):
+    """Read-only, seekable view of a range of a memory map"""
+    
+    def __init__(self, data: mmap.mmap, offset: int, size: int):
+        super().__init__()
+        self._view = memoryview(data)[offset:offset + size]
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
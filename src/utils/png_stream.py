@@ -0,0 +1,200 @@
+"""
+Row-streamed PNG decoding with incremental downsampling
+"""
+import struct
+import zlib
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+from .page_io import open_page
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG color type -> (Pillow mode, channels) for the 8-bit layouts we stream
+_STREAM_MODES = {
+    0: ('L', 1),
+    2: ('RGB', 3),
+    3: ('P', 1),
+    4: ('LA', 2),
+    6: ('RGBA', 4),
+}
+
+# Approximate amount of filtered scanline data decoded per band
+_BAND_BYTES = 4 * 1024 * 1024
+# Compressed bytes read from the file at a time
+_READ_SIZE = 1024 * 1024
+
+
+def parse_png_header(data: bytes) -> Optional[dict]:
+    """Read width, height, bit depth and color type from the first 33 bytes
+    of a PNG file"""
+    if len(data) < 33 or data[:8] != PNG_SIGNATURE or data[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', data[16:26])
+    if width == 0 or height == 0:
+        return None
+    return {
+        'width': width,
+        'height': height,
+        'bit_depth': bit_depth,
+        'color_type': color_type,
+    }
+
+
+class _IdatReader:
+    """Inflates the concatenated IDAT chunks of a PNG file on demand"""
+    
+    def __init__(self, f, first_length: int):
+        self.f = f
+        self.remaining = first_length
+        self.decompressor = zlib.decompressobj()
+        self.tail = b''
+    
+    def _next_compressed(self) -> bytes:
+        while self.remaining == 0:
+            self.f.read(4)  # CRC of the previous chunk
+            header = self.f.read(8)
+            if len(header) < 8:
+                return b''
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type != b'IDAT':
+                return b''
+            self.remaining = length
+        data = self.f.read(min(self.remaining, _READ_SIZE))
+        self.remaining -= len(data)
+        return data
+    
+    def read(self, size: int) -> bytes:
+        """Read up to size bytes of filtered scanline data"""
+        out = bytearray()
+        while len(out) < size:
+            if self.tail:
+                data = self.tail
+            else:
+                if self.decompressor.eof:
+                    break
+                data = self._next_compressed()
+                if not data:
+                    break
+            out += self.decompressor.decompress(data, size - len(out))
+            self.tail = self.decompressor.unconsumed_tail
+        return bytes(out)
+
+
+def _read_header(f) -> Optional[Tuple[tuple, Optional[bytes], Optional[bytes], int]]:
+    """Read chunks up to the first IDAT.
+    
+    Returns (IHDR fields, PLTE, tRNS, length of the first IDAT chunk).
+    """
+    if f.read(8) != PNG_SIGNATURE:
+        return None
+    ihdr = palette = transparency = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IDAT':
+            break
+        data = f.read(length)
+        f.read(4)  # CRC
+        if chunk_type == b'IHDR':
+            ihdr = struct.unpack('>IIBBBBB', data)
+        elif chunk_type == b'PLTE':
+            palette = data
+        elif chunk_type == b'tRNS':
+            transparency = data
+        elif chunk_type == b'IEND':
+            return None
+    if ihdr is None:
+        return None
+    return ihdr, palette, transparency, length
+
+
+def _to_display_mode(band: 'Image.Image', palette: Optional[bytes],
+                     transparency: Optional[bytes]) -> 'Image.Image':
+    """Expand palette bands so they can be averaged"""
+    if band.mode != 'P':
+        return band
+    if not transparency:
+        band.putpalette(palette)
+        return band.convert('RGB')
+    count = len(palette) // 3
+    alpha = transparency[:count].ljust(count, b'\xff')
+    rgba = b''.join(palette[i * 3:i * 3 + 3] + alpha[i:i + 1] for i in range(count))
+    band.putpalette(rgba, 'RGBA')
+    return band.convert('RGBA')
+
+
+def iter_png_bands(image_path: str, factor: int) \
+        -> Optional[Tuple[Tuple[int, int], Iterator[Tuple[int, 'Image.Image']]]]:
+    """Stream a PNG as horizontal bands reduced by an integer factor.
+    
+    Scanlines are inflated band by band, unfiltered by Pillow's PNG decoder
+    (each band is re-wrapped as a stored zlib stream, prefixed with the last
+    row of the previous band) and box-reduced. Returns the reduced image size
+    and an iterator of (output y, band). Returns None for layouts this path
+    does not handle (interlaced, 16-bit, sub-byte depths, color-keyed
+    transparency) so callers can fall back to a full decode.
+    """
+    f = open_page(image_path)
+    try:
+        header = _read_header(f)
+        if header is None:
+            f.close()
+            return None
+        (width, height, bit_depth, color_type, _, _, interlace), palette, transparency, \
+            idat_length = header
+        if (bit_depth != 8 or interlace or color_type not in _STREAM_MODES
+                or (color_type == 3 and palette is None)
+                or (color_type in (0, 2) and transparency)):
+            f.close()
+            return None
+    except Exception:
+        f.close()
+        raise
+    size = (-(-width // factor), -(-height // factor))
+    return size, _iter_bands(f, width, height, color_type, palette, transparency,
+                             idat_length, factor)
+
+
+def _iter_bands(f, width: int, height: int, color_type: int, palette: Optional[bytes],
+                transparency: Optional[bytes], idat_length: int,
+                factor: int) -> Iterator[Tuple[int, 'Image.Image']]:
+    from PIL import Image
+    with f:
+        mode, channels = _STREAM_MODES[color_type]
+        row_bytes = width * channels
+        band_rows = max(factor, (_BAND_BYTES // (row_bytes + 1)) // factor * factor)
+        reader = _IdatReader(f, idat_length)
+        
+        previous_row = bytes(row_bytes)  # PNG treats the row above the first as zeros
+        y = 0
+        while y < height:
+            rows = min(band_rows, height - y)
+            filtered = reader.read(rows * (row_bytes + 1))
+            if len(filtered) != rows * (row_bytes + 1):
+                raise ValueError("truncated PNG image data")
+            stream = zlib.compress(b'\x00' + previous_row + filtered, 0)
+            band = Image.frombytes(mode, (width, rows + 1), stream, 'zip', mode)
+            previous_row = band.crop((0, rows, width, rows + 1)).tobytes()
+            band = _to_display_mode(band.crop((0, 1, width, rows + 1)), palette, transparency)
+            yield y // factor, band.reduce(factor)
+            y += rows
+
+
+def decode_png_scaled(image_path: str, factor: int) -> Optional['Image.Image']:
+    """Decode a PNG reduced by an integer factor without ever holding the
+    full-resolution bitmap. Returns None if the PNG cannot be streamed."""
+    from PIL import Image
+    stream = iter_png_bands(image_path, factor)
+    if stream is None:
+        return None
+    size, bands = stream
+    output = None
+    for y, band in bands:
+        if output is None:
+            output = Image.new(band.mode, size)
+        output.paste(band, (0, y))
+    return output
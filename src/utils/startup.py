@@ -0,0 +1,55 @@
+"""
+Startup timing
+
+The entry point marks each startup step; the breakdown is printed to
+stderr when PNG_READER_STARTUP is set or the startup went over budget.
+"""
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+# Seconds from the first mark to the window shown and the storage opened
+STARTUP_BUDGET = 0.5
+STARTUP_ENV = 'PNG_READER_STARTUP'
+
+
+class StartupTimer:
+    """Named steps of the application startup"""
+    
+    def __init__(self, budget: float = STARTUP_BUDGET):
+        self.budget = budget
+        self.started = time.perf_counter()
+        self.marks: List[Tuple[str, float]] = []
+    
+    def mark(self, label: str) -> None:
+        """End the current step"""
+        self.marks.append((label, time.perf_counter()))
+    
+    @property
+    def total(self) -> float:
+        return self.marks[-1][1] - self.started if self.marks else 0.0
+    
+    def breakdown(self) -> List[Tuple[str, float]]:
+        """(label, seconds) of every step"""
+        steps = []
+        previous = self.started
+        for label, at in self.marks:
+            steps.append((label, at - previous))
+            previous = at
+        return steps
+    
+    def format(self) -> str:
+        lines = [f"startup {self.total * 1000:.0f} ms (budget {self.budget * 1000:.0f} ms)"]
+        lines.extend(f"  {label:<16}{seconds * 1000:7.1f} ms" for label, seconds in self.breakdown())
+        return "\n".join(lines)
+    
+    def report(self, force: Optional[bool] = None) -> bool:
+        """Print the breakdown if asked for or over budget; returns whether
+        the startup stayed within budget"""
+        within = self.total <= self.budget
+        if force is None:
+            force = bool(os.environ.get(STARTUP_ENV))
+        if force or not within:
+            print(self.format(), file=sys.stderr)
+        return within
@@ -1,49 +1,204 @@
 """
 File storage utility for saving and loading books
 """
+import hashlib
 import json
 import os
-from typing import Optional
+import shutil
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
 from ..models.book import Book
+from .book_format import read_book, read_header, write_book
+from .bundle import read_bundle, write_bundle
+from .catalog import BookCatalog, BookSummary
+from .journal import BookJournal, read_journal, replay
+from .metrics import timed
+from .page_io import BUNDLE_EXTENSION, close_bundle
+
+BOOK_EXTENSION = '.book'
+JSON_EXTENSION = '.json'
+JOURNAL_EXTENSION = '.journal'
+CATALOG_FILENAME = 'catalog.sqlite3'
+# Directory next to the storage directory holding the resume renditions
+RESUME_DIR = 'resume'
+# When a name exists with several extensions the first one wins
+_BOOK_EXTENSIONS = (BOOK_EXTENSION, BUNDLE_EXTENSION, JSON_EXTENSION)
+
+
+def sibling_dir(storage_dir: str, name: str) -> str:
+    """Path of a directory next to a storage directory, without opening it"""
+    parent = os.path.dirname(os.path.abspath(storage_dir))
+    return os.path.join(parent, name)
 
 
 class BookStorage:
-    """Handles persistent storage of books"""
+    """Handles persistent storage of books.
+    
+    Books are saved in the compact binary format by default. Books still
+    stored as JSON are converted the first time they are loaded; the JSON
+    file is kept next to the new one with a .bak suffix.
+    
+    A catalog in the storage directory keeps a summary of every book so
+    the library can be listed without opening the books themselves.
+    
+    Once a binary book has been saved or loaded, saving it again only
+    appends the edits made since to a journal next to it. The journal is
+    replayed on load and compacted into a fresh snapshot in the background
+    when it grows past half the snapshot size.
+    
+    Books imported as bundles are read in place; edits to them are saved
+    as a regular book whose pages still point into the bundle.
+    
+    The page each book was left at is kept in the catalog, together with
+    the key of a display-ready rendition of that page stored under
+    resume/, so a reopened book can be painted before anything is decoded.
+    """
     
-    def __init__(self, storage_dir: str = "books"):
+    # Journals smaller than this are never compacted
+    COMPACT_MIN_BYTES = 64 * 1024
+    
+    def __init__(self, storage_dir: str = "books", book_format: str = "binary"):
         self.storage_dir = storage_dir
+        self.book_format = book_format
         os.makedirs(storage_dir, exist_ok=True)
+        self.catalog = BookCatalog(os.path.join(storage_dir, CATALOG_FILENAME))
+        self._journals: Dict[str, BookJournal] = {}
+        self._generations: Dict[str, int] = {}
+        self._compactions: Dict[str, threading.Thread] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+    
+    def get_sibling_dir(self, name: str) -> str:
+        """Get the path of a directory that lives next to the storage directory"""
+        return sibling_dir(self.storage_dir, name)
     
     def save_book(self, book: Book, filename: str) -> bool:
         """Save a book to disk"""
-        try:
-            filepath = os.path.join(self.storage_dir, f"{filename}.json")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(book.to_dict(), f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving book: {e}")
+        if not self.prepare_save(book, filename).run():
             return False
+        book.mark_clean()
+        return True
     
+    def prepare_save(self, book: Book, filename: str) -> 'SaveJob':
+        """Capture what a save of the book has to write.
+        
+        Call this on the thread that edits the book; it does no disk I/O.
+        The returned job can then be run on any thread. Jobs for the same
+        book must run in the order they were prepared.
+        """
+        summary = _describe(book)
+        if self.book_format == "json":
+            return SaveJob(self, filename, summary, snapshot=book.snapshot())
+        journal = self._journals.get(filename)
+        if journal is not None and journal.book is book and not journal.broken:
+            return SaveJob(self, filename, summary, journal=journal,
+                           entries=journal.take_pending())
+        # Edits made from now on are journaled on top of this snapshot
+        journal = self._track(filename, book)
+        return SaveJob(self, filename, summary, journal=journal, snapshot=book.snapshot())
+    
+    @timed("storage.load")
     def load_book(self, filename: str) -> Optional[Book]:
         """Load a book from disk"""
         try:
-            filepath = os.path.join(self.storage_dir, f"{filename}.json")
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return Book.from_dict(data)
+            if os.path.exists(self._path(filename, BOOK_EXTENSION)):
+                with self._file_lock(filename):
+                    book, last_seq = self._read_binary(filename, recover=True)
+                    self._track(filename, book).next_seq = last_seq + 1
+                return book
+            bundle_path = self._path(filename, BUNDLE_EXTENSION)
+            if os.path.exists(bundle_path):
+                return read_bundle(bundle_path)
+            filepath = self._path(filename, JSON_EXTENSION)
+            book = self._read_file(filepath)
         except Exception as e:
             print(f"Error loading book: {e}")
             return None
+        if self.book_format != "json":
+            self._migrate(book, filename)
+        return book
+    
+    def list_book_summaries(self) -> List[BookSummary]:
+        """List all saved books with their catalog summaries"""
+        try:
+            self.reconcile()
+        except Exception as e:
+            print(f"Error updating catalog: {e}")
+        return self.catalog.summaries()
+    
+    def reconcile(self) -> None:
+        """Bring the catalog up to date with the storage directory.
+        
+        Nothing is scanned while the directory mtime is unchanged; otherwise
+        only books whose file size or mtime changed are opened.
+        """
+        dir_mtime_ns = os.stat(self.storage_dir).st_mtime_ns
+        if dir_mtime_ns == self.catalog.dir_mtime_ns():
+            return
+        found = {}
+        with os.scandir(self.storage_dir) as it:
+            for entry in it:
+                name, extension = os.path.splitext(entry.name)
+                if extension not in _BOOK_EXTENSIONS:
+                    continue
+                if name not in found or _BOOK_EXTENSIONS.index(extension) < \
+                        _BOOK_EXTENSIONS.index(os.path.splitext(found[name].name)[1]):
+                    found[name] = entry
+        known = self.catalog.file_states()
+        updated = []
+        for name, entry in found.items():
+            st = entry.stat()
+            if known.get(name) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                if entry.name.endswith(BOOK_EXTENSION):
+                    with self._file_lock(name):
+                        book, _ = self._read_binary(name)
+                elif entry.name.endswith(BUNDLE_EXTENSION):
+                    book = read_bundle(entry.path)
+                else:
+                    book = self._read_file(entry.path)
+                updated.append(BookSummary(name, *_describe(book), st.st_size, st.st_mtime_ns))
+            except Exception as e:
+                print(f"Error reading book {name}: {e}")
+        removed = [name for name in known if name not in found]
+        self.catalog.apply(updated, removed, dir_mtime_ns)
+    
+    def reading_position(self, filename: str) -> Optional[Tuple[int, Optional[str]]]:
+        """Page index a book was left at and the key of its resume rendition"""
+        try:
+            return self.catalog.position(filename)
+        except Exception as e:
+            print(f"Error reading position: {e}")
+            return None
+    
+    def set_reading_position(self, filename: str, page_index: int,
+                             page_key: Optional[str] = None) -> bool:
+        """Remember the page a book was left at.
+        
+        page_key identifies the page revision the rendition at
+        resume_path() was made from; None means there is no rendition.
+        """
+        try:
+            self.catalog.set_position(filename, page_index, page_key)
+            return True
+        except Exception as e:
+            print(f"Error saving position: {e}")
+            return False
+    
+    def resume_path(self, filename: str) -> str:
+        """Path of the resume rendition of a book"""
+        digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+        return os.path.join(self.get_sibling_dir(RESUME_DIR), f"{digest}.png")
     
     def list_books(self) -> list:
         """List all saved books"""
         try:
-            books = []
+            books = set()
             for filename in os.listdir(self.storage_dir):
-                if filename.endswith('.json'):
-                    book_name = filename[:-5]  # Remove .json extension
-                    books.append(book_name)
+                name, extension = os.path.splitext(filename)
+                if extension in _BOOK_EXTENSIONS:
+                    books.add(name)
             return sorted(books)
         except Exception as e:
             print(f"Error listing books: {e}")
@@ -52,11 +207,242 @@ class BookStorage:
     def delete_book(self, filename: str) -> bool:
         """Delete a saved book"""
         try:
-            filepath = os.path.join(self.storage_dir, f"{filename}.json")
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                return True
-            return False
+            deleted = False
+            self.wait_for_compaction(filename)
+            journal = self._journals.pop(filename, None)
+            if journal is not None:
+                journal.detach()
+            close_bundle(self._path(filename, BUNDLE_EXTENSION))
+            for extension in _BOOK_EXTENSIONS + (BOOK_EXTENSION + JOURNAL_EXTENSION,):
+                filepath = self._path(filename, extension)
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    deleted = True
+            if os.path.exists(self.resume_path(filename)):
+                os.remove(self.resume_path(filename))
+            self.catalog.remove(filename)
+            return deleted
         except Exception as e:
             print(f"Error deleting book: {e}")
             return False
+    
+    def export_bundle(self, book: Book, bundle_path: str,
+                      progress: Optional[Callable[[int, int], bool]] = None) -> bool:
+        """Write a book and its page images into a single bundle file.
+        
+        progress(done, total) is called after each page and may return
+        False to cancel. Returns False if cancelled or failed.
+        """
+        try:
+            return write_bundle(book, bundle_path, progress)
+        except Exception as e:
+            print(f"Error exporting bundle: {e}")
+            return False
+    
+    def import_bundle(self, bundle_path: str, filename: Optional[str] = None) -> Optional[str]:
+        """Copy a bundle into the library; returns the name it is stored under"""
+        if filename is None:
+            filename = os.path.splitext(os.path.basename(bundle_path))[0]
+        target = self._path(filename, BUNDLE_EXTENSION)
+        try:
+            read_bundle(bundle_path)
+            with open(bundle_path, 'rb') as src, open(f"{target}.tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            close_bundle(target)
+            os.replace(f"{target}.tmp", target)
+            st = os.stat(target)
+            self.catalog.put(BookSummary(filename, *_describe(read_bundle(target)),
+                                         st.st_size, st.st_mtime_ns))
+            return filename
+        except Exception as e:
+            print(f"Error importing bundle: {e}")
+            if os.path.exists(f"{target}.tmp"):
+                os.remove(f"{target}.tmp")
+            return None
+    
+    def wait_for_compaction(self, filename: Optional[str] = None) -> None:
+        """Wait for background compaction of one or every book to finish"""
+        threads = [self._compactions.get(filename)] if filename else list(self._compactions.values())
+        for thread in threads:
+            if thread is not None:
+                thread.join()
+    
+    def close(self) -> None:
+        """Finish background work and close the catalog"""
+        self.wait_for_compaction()
+        self.catalog.close()
+    
+    def _path(self, filename: str, extension: str) -> str:
+        return os.path.join(self.storage_dir, f"{filename}{extension}")
+    
+    def _journal_path(self, filename: str) -> str:
+        return self._path(filename, BOOK_EXTENSION + JOURNAL_EXTENSION)
+    
+    def _file_lock(self, filename: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(filename, threading.Lock())
+    
+    @staticmethod
+    def _read_file(filepath: str) -> Book:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return Book.from_dict(json.load(f))
+    
+    def _read_binary(self, filename: str, recover: bool = False,
+                     journal_limit: Optional[int] = None) -> Tuple[Book, int]:
+        """Read a snapshot and replay its journal; the caller holds the file lock.
+        
+        Returns the book and the last journal sequence number it includes.
+        With recover=True a journal left incomplete by a crash is cut back
+        to its last intact operation.
+        """
+        book_path = self._path(filename, BOOK_EXTENSION)
+        journal_path = self._journal_path(filename)
+        last_seq = read_header(book_path).get('journal_seq', 0)
+        book = read_book(book_path)
+        entries, valid_length = read_journal(journal_path, last_seq, journal_limit)
+        if recover and os.path.exists(journal_path) and os.path.getsize(journal_path) > valid_length:
+            print(f"Recovering journal of {filename}")
+            with open(journal_path, 'r+b') as f:
+                f.truncate(valid_length)
+        replay(book, entries)
+        book.mark_clean()
+        if entries:
+            last_seq = entries[-1]['seq']
+        return book, last_seq
+    
+    def _track(self, filename: str, book: Book) -> BookJournal:
+        """Start journaling the edits of a book saved or loaded under filename"""
+        old = self._journals.pop(filename, None)
+        if old is not None:
+            old.detach()
+        journal = BookJournal(self._journal_path(filename), book)
+        self._journals[filename] = journal
+        return journal
+    
+    def _write_snapshot(self, book: Book, filename: str, journal: BookJournal) -> None:
+        """Write a complete book file and empty its journal; the caller holds
+        the file lock"""
+        book_path = self._path(filename, BOOK_EXTENSION)
+        journal_path = self._journal_path(filename)
+        last_seq = 0
+        if os.path.exists(book_path):
+            # Number past whatever the old files hold so none of it replays
+            last_seq = read_header(book_path).get('journal_seq', 0)
+            entries, _ = read_journal(journal_path, last_seq)
+            if entries:
+                last_seq = entries[-1]['seq']
+        write_book(book, book_path, last_seq)
+        self._generations[filename] = self._generations.get(filename, 0) + 1
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        journal.next_seq = last_seq + 1
+    
+    def _maybe_compact(self, filename: str) -> None:
+        """Start a background compaction if the journal has grown too large"""
+        try:
+            journal_size = os.path.getsize(self._journal_path(filename))
+            snapshot_size = os.path.getsize(self._path(filename, BOOK_EXTENSION))
+        except OSError:
+            return
+        if journal_size < max(self.COMPACT_MIN_BYTES, snapshot_size // 2):
+            return
+        thread = self._compactions.get(filename)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=self._compact, args=(filename,), daemon=True)
+        self._compactions[filename] = thread
+        thread.start()
+    
+    def _compact(self, filename: str) -> None:
+        """Fold the journal into a new snapshot.
+        
+        The snapshot is rebuilt from the files alone, without touching the
+        book being edited. Operations appended while it is written stay in
+        the journal; the snapshot's sequence number keeps them from being
+        applied twice should the process stop between the two renames.
+        """
+        book_path = self._path(filename, BOOK_EXTENSION)
+        journal_path = self._journal_path(filename)
+        compact_path = f"{book_path}.compact"
+        try:
+            with self._file_lock(filename):
+                generation = self._generations.get(filename, 0)
+                consumed = os.path.getsize(journal_path)
+                book, last_seq = self._read_binary(filename, journal_limit=consumed)
+            write_book(book, compact_path, last_seq)
+            with self._file_lock(filename):
+                if self._generations.get(filename, 0) != generation:
+                    # A full save replaced the snapshot meanwhile
+                    os.remove(compact_path)
+                    return
+                os.replace(compact_path, book_path)
+                with open(journal_path, 'rb') as f:
+                    f.seek(consumed)
+                    tail = f.read()
+                with open(f"{journal_path}.tmp", 'wb') as f:
+                    f.write(tail)
+                os.replace(f"{journal_path}.tmp", journal_path)
+                st = os.stat(book_path)
+                self.catalog.set_file_state(filename, st.st_size, st.st_mtime_ns)
+        except Exception as e:
+            print(f"Error compacting book: {e}")
+    
+    def _migrate(self, book: Book, filename: str) -> None:
+        """Convert a JSON book to the binary format"""
+        json_path = self._path(filename, JSON_EXTENSION)
+        if self.prepare_save(book, filename).run():
+            try:
+                os.replace(json_path, f"{json_path}.bak")
+            except OSError as e:
+                print(f"Error converting book: {e}")
+
+
+class SaveJob:
+    """A save prepared by BookStorage.prepare_save(), ready to be written"""
+    
+    def __init__(self, storage: BookStorage, filename: str, summary: tuple,
+                 journal: Optional[BookJournal] = None, entries: Optional[List[dict]] = None,
+                 snapshot: Optional[Book] = None):
+        self.storage = storage
+        self.filename = filename
+        self.summary = summary
+        self.journal = journal
+        self.entries = entries
+        self.snapshot = snapshot
+    
+    @timed("storage.save")
+    def run(self) -> bool:
+        """Write the save to disk; returns False if it failed"""
+        storage = self.storage
+        filename = self.filename
+        try:
+            if storage.book_format == "json":
+                filepath = storage._path(filename, JSON_EXTENSION)
+                with open(f"{filepath}.tmp", 'w', encoding='utf-8') as f:
+                    json.dump(self.snapshot.to_dict(), f, ensure_ascii=False, indent=2)
+                os.replace(f"{filepath}.tmp", filepath)
+            else:
+                filepath = storage._path(filename, BOOK_EXTENSION)
+                with storage._file_lock(filename):
+                    if self.snapshot is not None:
+                        storage._write_snapshot(self.snapshot, filename, self.journal)
+                    elif os.path.exists(filepath):
+                        self.journal.write(self.entries)
+                    else:
+                        raise FileNotFoundError(filepath)
+                if self.snapshot is None:
+                    storage._maybe_compact(filename)
+            st = os.stat(filepath)
+            storage.catalog.put(BookSummary(filename, *self.summary, st.st_size, st.st_mtime_ns))
+            return True
+        except Exception as e:
+            print(f"Error saving book: {e}")
+            if self.journal is not None:
+                self.journal.broken = True
+            return False
+
+
+def _describe(book: Book) -> tuple:
+    """Catalog fields of a book other than the name and file state"""
+    return (book.title, len(book.pages), book.get_page_image_path(book.cover_page_index),
+            book.created_at.isoformat(), book.modified_at.isoformat())
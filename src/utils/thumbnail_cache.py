@@ -0,0 +1,158 @@
+"""
+Persistent on-disk thumbnail cache
+"""
+import os
+from collections import OrderedDict
+from typing import Optional
+from .image import file_revision_key, load_image_scaled
+from .metrics import metrics, timed
+
+
+class ThumbnailCache:
+    """Stores small page thumbnails on disk, keyed by source file revision.
+    
+    A source file is identified by (absolute path, byte size, mtime), so a
+    thumbnail is decoded at most once per revision of the file. The total size
+    of the cache is bounded and the least recently used entries are evicted.
+    """
+    
+    def __init__(self, cache_dir: str = "thumbnails", max_bytes: int = 256 * 1024 * 1024,
+                 height: int = 60):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.height = height
+        self._entries: Optional[OrderedDict] = None  # key -> file size, oldest first
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def get_thumbnail(self, image_path: str, file_size: Optional[int] = None,
+                      mtime_ns: Optional[int] = None) -> Optional[str]:
+        """Return the path of a cached thumbnail, generating it if needed.
+        
+        Passing the file size and mtime (e.g. from Page metadata) avoids
+        a stat of the source file.
+        """
+        key = self.make_key(image_path, file_size, mtime_ns)
+        if key is None:
+            return None
+        self._load_index()
+        thumb_path = self._thumb_path(key)
+        if os.path.exists(thumb_path):
+            metrics.count("thumbnail_cache.hit")
+            if key in self._entries:
+                self._touch(key, thumb_path)
+            else:
+                # Written by another process, e.g. an import worker
+                self._add(key, thumb_path)
+            return thumb_path
+        metrics.count("thumbnail_cache.miss")
+        self._forget(key)
+        if not self._generate(image_path, thumb_path):
+            return None
+        self._add(key, thumb_path)
+        return thumb_path
+    
+    def generate(self, image_path: str) -> Optional[str]:
+        """Write a thumbnail without touching the LRU index.
+        
+        Meant for worker processes; the owning cache adopts the file the
+        next time it is requested.
+        """
+        key = self.make_key(image_path)
+        if key is None:
+            return None
+        thumb_path = self._thumb_path(key)
+        if os.path.exists(thumb_path) or self._generate(image_path, thumb_path):
+            return thumb_path
+        return None
+    
+    def make_key(self, image_path: str, file_size: Optional[int] = None,
+                 mtime_ns: Optional[int] = None) -> Optional[str]:
+        """Build the cache key for the current revision of an image file"""
+        return file_revision_key(image_path, str(self.height), file_size, mtime_ns)
+    
+    def clear(self) -> None:
+        """Remove every cached thumbnail"""
+        self._load_index()
+        for key in list(self._entries):
+            try:
+                os.remove(self._thumb_path(key))
+            except OSError:
+                pass
+        self._entries.clear()
+        self._total_bytes = 0
+    
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the cached thumbnails in bytes"""
+        self._load_index()
+        return self._total_bytes
+    
+    def _thumb_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+    
+    def _load_index(self) -> None:
+        """Scan the cache directory once, ordering entries by last use"""
+        if self._entries is not None:
+            return
+        found = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.png'):
+                        st = entry.stat()
+                        found.append((st.st_mtime_ns, entry.name[:-4], st.st_size))
+        except OSError as e:
+            print(f"Error scanning thumbnail cache: {e}")
+        found.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in found)
+        self._total_bytes = sum(self._entries.values())
+    
+    @timed("thumbnail.build")
+    def _generate(self, image_path: str, thumb_path: str) -> bool:
+        """Decode the source image once and write a thumbnail for it"""
+        tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+        try:
+            img = load_image_scaled(image_path, 0, self.height)
+            if img is None:
+                return False
+            if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                img = img.convert('RGBA')
+            img.save(tmp_path, format='PNG')
+            os.replace(tmp_path, thumb_path)
+            return True
+        except Exception as e:
+            print(f"Error generating thumbnail: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+    
+    def _touch(self, key: str, thumb_path: str) -> None:
+        """Mark an entry as most recently used, in memory and on disk"""
+        self._entries.move_to_end(key)
+        try:
+            os.utime(thumb_path)
+        except OSError:
+            pass
+    
+    def _add(self, key: str, thumb_path: str) -> None:
+        size = os.path.getsize(thumb_path)
+        self._forget(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict()
+    
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+    
+    def _evict(self) -> None:
+        """Drop least recently used thumbnails until under the size budget"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._thumb_path(key))
+            except OSError:
+                pass
@@ -0,0 +1,201 @@
+"""
+On-disk multi-resolution tile pyramids for deep zoom
+"""
+import math
+import os
+import shutil
+import threading
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Tuple
+from .image import file_revision_key
+from .page_io import open_page
+from .png_stream import iter_png_bands
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+class TileStore:
+    """Splits pages into fixed-size tiles at several resolution levels.
+    
+    Level 0 is the full resolution and each following level halves it, down
+    to the first level that fits in a single tile. Levels are generated
+    lazily, one at a time, by streaming the source image in bands, so only
+    one strip of tiles is held in memory while a level is built. Tiles are
+    written under cache_dir/<page key>/<level>/ and the least recently used
+    pages are pruned to keep the store under max_bytes. The store is scanned
+    once for its size; after that a running total of the bytes written
+    decides when a prune is needed.
+    """
+    
+    def __init__(self, cache_dir: str = "tiles", tile_size: int = 256,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self._locks: Dict[Tuple[str, int], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._size_lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # Unknown until the first scan
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def page_key(self, image_path: str, file_size: Optional[int] = None,
+                 mtime_ns: Optional[int] = None) -> Optional[str]:
+        """Get the key identifying the current revision of a page image"""
+        return file_revision_key(image_path, f"tiles{self.tile_size}", file_size, mtime_ns)
+    
+    def level_count(self, size: Tuple[int, int]) -> int:
+        """Number of pyramid levels for an image of the given size"""
+        longest = max(size)
+        if longest <= self.tile_size:
+            return 1
+        return math.ceil(math.log2(longest / self.tile_size)) + 1
+    
+    @staticmethod
+    def level_size(size: Tuple[int, int], level: int) -> Tuple[int, int]:
+        """Size of the image at a pyramid level"""
+        factor = 1 << level
+        return -(-size[0] // factor), -(-size[1] // factor)
+    
+    def tile_grid(self, size: Tuple[int, int], level: int) -> Tuple[int, int]:
+        """Number of tile columns and rows at a pyramid level"""
+        width, height = self.level_size(size, level)
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+    
+    def tile_path(self, key: str, level: int, tx: int, ty: int) -> str:
+        """Path of a tile file"""
+        return os.path.join(self.cache_dir, key, str(level), f"{tx}_{ty}.png")
+    
+    def has_level(self, key: str, level: int) -> bool:
+        """Check whether a level has been generated"""
+        return os.path.exists(self._marker_path(key, level))
+    
+    def touch(self, key: str) -> None:
+        """Mark a page's tiles as recently used"""
+        try:
+            os.utime(os.path.join(self.cache_dir, key))
+        except OSError:
+            pass
+    
+    def ensure_level(self, image_path: str, key: str, level: int) -> bool:
+        """Generate a level unless it exists; safe to call from several threads"""
+        if self.has_level(key, level):
+            return True
+        with self._level_lock(key, level):
+            if self.has_level(key, level):
+                return True
+            try:
+                written = self._build_level(image_path, key, level)
+            except Exception as e:
+                print(f"Error building tiles: {e}")
+                return False
+        if self._add_bytes(written):
+            self.prune()
+        return True
+    
+    def prune(self) -> None:
+        """Remove the least recently used pages until under the size budget"""
+        pages = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        size = _dir_size(entry.path)
+                        pages.append((entry.stat().st_mtime_ns, entry.path, size))
+                        total += size
+        except OSError as e:
+            print(f"Error scanning tile store: {e}")
+            return
+        pages.sort()
+        # Always keep the most recently used page
+        for _, path, size in pages[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        with self._size_lock:
+            self._total_bytes = total
+    
+    def _add_bytes(self, written: int) -> bool:
+        """Count newly written bytes; True if the store may be over budget"""
+        with self._size_lock:
+            if self._total_bytes is None:
+                return True
+            self._total_bytes += written
+            return self._total_bytes > self.max_bytes
+    
+    def _marker_path(self, key: str, level: int) -> str:
+        return os.path.join(self.cache_dir, key, f"level{level}.done")
+    
+    def _level_lock(self, key: str, level: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault((key, level), threading.Lock())
+    
+    def _build_level(self, image_path: str, key: str, level: int) -> int:
+        """Stream the source image once and cut one level into tiles.
+        
+        Returns the number of bytes written.
+        """
+        from PIL import Image
+        level_dir = os.path.join(self.cache_dir, key, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        size, bands = _iter_level_bands(image_path, 1 << level)
+        width = size[0]
+        tile = self.tile_size
+        strip = None
+        strip_y = 0  # Level y of the top of the current strip
+        written = 0
+        for band_y, band in bands:
+            if strip is None:
+                strip = Image.new(band.mode, (width, min(tile, size[1])))
+            offset = 0
+            while offset < band.height:
+                y_in_strip = band_y + offset - strip_y
+                take = min(band.height - offset, strip.height - y_in_strip)
+                strip.paste(band.crop((0, offset, width, offset + take)), (0, y_in_strip))
+                offset += take
+                if y_in_strip + take == strip.height:
+                    written += self._write_strip(key, level, strip, strip_y // tile)
+                    strip_y += strip.height
+                    if strip_y < size[1]:
+                        strip = Image.new(band.mode, (width, min(tile, size[1] - strip_y)))
+        with open(self._marker_path(key, level), 'w') as f:
+            f.write(f"{size[0]}x{size[1]}\n")
+        self.touch(key)
+        return written
+    
+    def _write_strip(self, key: str, level: int, strip: 'Image.Image', ty: int) -> int:
+        written = 0
+        for tx in range(-(-strip.width // self.tile_size)):
+            x0 = tx * self.tile_size
+            tile_img = strip.crop((x0, 0, min(x0 + self.tile_size, strip.width), strip.height))
+            path = self.tile_path(key, level, tx, ty)
+            tile_img.save(f"{path}.tmp", format='PNG', compress_level=1)
+            os.replace(f"{path}.tmp", path)
+            written += os.path.getsize(path)
+        return written
+
+
+def _iter_level_bands(image_path: str, factor: int) \
+        -> Tuple[Tuple[int, int], Iterator[Tuple[int, 'Image.Image']]]:
+    """Bands of an image reduced by factor, streamed when possible"""
+    from PIL import Image
+    stream = iter_png_bands(image_path, factor)
+    if stream is not None:
+        return stream
+    with open_page(image_path) as f, Image.open(f) as img:
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        reduced = img.reduce(factor) if factor > 1 else img.copy()
+    return reduced.size, iter([(0, reduced)])
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
@@ -46,11 +46,316 @@ print("✓ Book saved")
 loaded_book = storage.load_book("test_book")
 print(f"✓ Book loaded: {loaded_book.title} with {len(loaded_book.pages)} pages")
 
+# Test 6: Thumbnail cache
+print("\nTest 6: Testing thumbnail cache...")
+from src.utils.thumbnail_cache import ThumbnailCache
+cache = ThumbnailCache(cache_dir="test_thumbnails")
+thumb_path = cache.get_thumbnail(book.pages[0].image_path)
+assert thumb_path is not None
+assert cache.get_thumbnail(book.pages[0].image_path) == thumb_path
+with Image.open(thumb_path) as thumb:
+    assert thumb.height == 60
+print(f"✓ Thumbnail cached: {os.path.basename(thumb_path)}")
+
+# Test 7: Change notifications
+print("\nTest 7: Testing change notifications...")
+events = []
+book.add_listener(lambda event, *args: events.append((event, args)))
+book.move_page(2, 0)
+book.set_cover_page(2)
+assert events == [
+    ('page_about_to_be_moved', (2, 0)),
+    ('dirty_changed', (True,)),
+    ('page_moved', (2, 0)),
+    ('cover_changed', (1, 2)),
+]
+assert book.is_dirty
+print(f"✓ Received {len(events)} change events")
+
+# Test 8: Page metadata
+print("\nTest 8: Testing page metadata...")
+from src.models.book import Page
+from src.utils.metadata import refresh_stale_pages
+assert refresh_stale_pages(book) == []  # Filled in on first read, not reported as changed
+page = book.pages[0]
+assert page.size == (100, 150) and not page.is_stale()
+restored = Page.from_dict(page.to_dict())
+assert restored.metadata() == page.metadata()
+Image.new('RGB', (120, 150), color='white').save(page.image_path)
+os.utime(page.image_path, ns=(page.mtime_ns + 10**9, page.mtime_ns + 10**9))
+assert page.is_stale()
+assert refresh_stale_pages(book) == [0]
+assert page.size == (120, 150) and not page.is_stale()
+print(f"✓ Metadata refreshed: {page.size[0]}x{page.size[1]}")
+
+# Test 9: Binary book format
+print("\nTest 9: Testing binary book format...")
+json_storage = BookStorage(storage_dir="test_books", book_format="json")
+json_storage.save_book(book, "json_book")
+storage.load_book("json_book")
+assert os.path.exists("test_books/json_book.book")
+reopened = storage.load_book("json_book")
+assert reopened.pages.loaded_count() == 0
+assert reopened.pages[2].image_path == book.pages[2].image_path
+assert reopened.pages[0].metadata() == book.pages[0].metadata()
+assert reopened.pages.loaded_count() == 2
+print(f"✓ JSON book migrated, {reopened.pages.loaded_count()} of {len(reopened.pages)} pages loaded")
+
+# Test 10: Library catalog
+print("\nTest 10: Testing library catalog...")
+summaries = {summary.name: summary for summary in storage.list_book_summaries()}
+assert set(summaries) == {"test_book", "json_book"}
+assert summaries["test_book"].page_count == len(book.pages)
+storage.delete_book("json_book")
+assert [summary.name for summary in storage.list_book_summaries()] == ["test_book"]
+print(f"✓ Catalog lists {len(summaries)} books without opening them")
+
+# Test 11: Journaled saves
+print("\nTest 11: Testing journaled saves...")
+journaled = storage.load_book("test_book")
+journaled.move_page(0, 2)
+journaled.set_cover_page(1)
+storage.save_book(journaled, "test_book")
+assert os.path.getsize("test_books/test_book.book.journal") > 0
+with open("test_books/test_book.book.journal", "a") as f:
+    f.write('{"op": "move", "fr')  # Simulate a crash in the middle of an append
+recovered = BookStorage(storage_dir="test_books").load_book("test_book")
+assert [p.image_path for p in recovered.pages] == [p.image_path for p in journaled.pages]
+assert recovered.cover_page_index == 1
+print("✓ Journal replayed after an interrupted append")
+
+# Test 12: Dirty tracking and prepared saves
+print("\nTest 12: Testing dirty tracking...")
+assert recovered.is_dirty is False
+recovered.move_page(0, 1)
+assert recovered.is_dirty
+job = storage.prepare_save(recovered, "test_book")
+expected_order = [p.image_path for p in recovered.pages]
+recovered.move_page(0, 2)  # Edits after prepare_save are not part of the job
+assert job.run()
+assert [p.image_path for p in storage.load_book("test_book").pages] == expected_order
+print("✓ Save written from the state captured when it was prepared")
+
+# Test 13: Book bundles
+print("\nTest 13: Testing book bundles...")
+from src.utils.page_io import open_page
+assert storage.export_bundle(recovered, "test_books/export.bundle")
+bundled = storage.load_book(storage.import_bundle("test_books/export.bundle", "bundled"))
+assert len(bundled.pages) == len(recovered.pages)
+for original, page in zip(recovered.pages, bundled.pages):
+    with open(original.image_path, 'rb') as f, open_page(page.image_path) as g:
+        assert f.read() == g.read()
+assert refresh_stale_pages(bundled) == []
+from src.utils.image import get_image_size
+assert get_image_size(bundled.pages[0].image_path) == get_image_size(recovered.pages[0].image_path)
+broken = Book("Broken")
+broken.add_pages([recovered.pages[0].image_path, "test_images/no_such_page.png"])
+assert not storage.export_bundle(broken, "test_books/broken.bundle")
+assert not os.path.exists("test_books/broken.bundle.tmp")
+os.makedirs("test_books/blocked.bundle")  # The copy cannot be moved into place
+assert storage.import_bundle("test_books/export.bundle", "blocked") is None
+assert not os.path.exists("test_books/blocked.bundle.tmp")
+os.rmdir("test_books/blocked.bundle")
+print("✓ Pages read in place from an imported bundle")
+
+# Test 14: Image optimization
+print("\nTest 14: Testing image optimization...")
+from src.utils.optimizer import OptimizeJob
+job = OptimizeJob.for_book(bundled, "test_books/optimized", workers=2)
+results = list(job.run())
+assert all(result.ok and not result.skipped for result in results)
+for page, result in zip(bundled.pages, results):
+    with Image.open(open_page(page.image_path)) as source, Image.open(result.output_path) as optimized:
+        assert source.convert('RGBA').tobytes() == optimized.convert('RGBA').tobytes()
+assert job.report.totals()['saved_bytes'] > 0
+rerun = OptimizeJob.for_book(bundled, "test_books/optimized", workers=2)
+assert all(result.skipped for result in rerun.run())
+print(f"✓ {job.report.summary()}")
+
+# Test 15: Similar page search
+print("\nTest 15: Testing similar page search...")
+from src.utils.page_hashes import PageHashIndex
+index = PageHashIndex("test_books/page_hashes")
+assert index.update(storage, workers=2)
+matches = index.find_similar(bundled.pages[0].image_path, max_distance=0)
+assert {"test_book", "bundled"} <= {match.book_name for match in matches}
+assert len(PageHashIndex("test_books/page_hashes")) == len(index)
+print(f"✓ Found {len(matches)} copies of a page across {len(index.book_names)} books")
+
+# Test 16: Command-line interface
+print("\nTest 16: Testing command-line interface...")
+from src.cli import main as cli_main
+assert cli_main(["--storage-dir", "test_books", "create", "test_images", "--name", "cli_book",
+                 "--no-thumbnails"]) == 0
+assert len(storage.load_book("cli_book").pages) == len(os.listdir("test_images"))
+assert cli_main(["--storage-dir", "test_books", "validate", "cli_book"]) == 0
+assert 'PyQt6' not in sys.modules
+print("✓ Book created and validated without importing Qt")
+
+# Test 17: Startup
+print("\nTest 17: Testing startup...")
+import subprocess
+from src.utils.startup import StartupTimer
+timer = StartupTimer(budget=10)
+timer.mark("first")
+timer.mark("second")
+assert [label for label, _ in timer.breakdown()] == ["first", "second"]
+assert timer.report(force=False)
+loaded = subprocess.run(
+    [sys.executable, "-c", "import sys, src.ui.main_window; "
+     "print(sorted({name.split('.')[0] for name in sys.modules} & {'PIL', 'numpy'}))"],
+    capture_output=True, text=True, check=True).stdout.strip()
+assert loaded == "[]", loaded
+print("✓ Main window imports without Pillow or NumPy")
+
+# Test 18: Benchmark suite
+print("\nTest 18: Testing benchmark helpers...")
+from benchmarks.generators import MODES, make_book, make_image_set
+from benchmarks.runner import compare
+from src.utils.image import validate_image
+bench_images = make_image_set("test_images/bench", 2, 64, 96, "P")
+for mode in MODES:
+    bench_path = make_image_set(f"test_images/bench_{mode}", 1, 64, 96, mode)[0]
+    assert validate_image(bench_path)
+bench_book = make_book(bench_images, 5)
+assert len(bench_book.pages) == 5 and bench_book.pages[4].has_metadata
+baseline = {"fast": {"median": 0.010}, "slow": {"median": 0.100}}
+assert compare({"fast": {"median": 0.012}, "slow": {"median": 0.200},
+                "new": {"median": 1.0}}, baseline) == ["slow"]
+print("✓ Synthetic pages generated and regressions detected")
+
+# Test 19: Metrics
+print("\nTest 19: Testing metrics...")
+from src.utils.metrics import Metrics
+recorder = Metrics()
+with recorder.timer("disabled"):
+    recorder.count("disabled.hit")
+assert not recorder.histograms and not recorder.counters
+recorder.enabled = True
+for _ in range(3):
+    with recorder.timer("work"):
+        pass
+recorder.count("cache.hit", 3)
+recorder.count("cache.miss")
+summary = recorder.to_dict()
+assert summary['timers']['work']['count'] == 3
+assert summary['hit_ratios'] == {'cache': 0.75}
+trace = recorder.to_chrome_trace()['traceEvents']
+assert [event['ph'] for event in trace].count('X') == 3
+print("✓ Timers, counters and trace export work")
+
+# Test 20: Image memory budget
+print("\nTest 20: Testing image memory budget...")
+from src.utils.image_cache import ImageMemoryManager, PRIORITY_PREFETCH, PRIORITY_THUMBNAIL
+memory = ImageMemoryManager(100)
+renditions = memory.cache("renditions", PRIORITY_PREFETCH)
+thumbnails = memory.cache("thumbnails", PRIORITY_THUMBNAIL)
+thumbnails.put("t1", "thumb", 30)
+renditions.put("r1", "page", 40)
+renditions.put("r2", "page", 40)
+thumbnails.put("t2", "thumb", 30)  # Over budget: the oldest rendition goes first
+assert "r1" not in renditions and "r2" in renditions and len(thumbnails) == 2
+memory.reserve("viewer", 50)  # Renditions go before thumbnails
+assert len(renditions) == 0 and thumbnails.keys() == ["t2"]
+assert memory.usage() == {"renditions": 0, "thumbnails": 30, "viewer": 50}
+print(f"✓ {memory.total_bytes} of {memory.max_bytes} bytes in use after eviction")
+
+# Test 21: Continuous view layout
+print("\nTest 21: Testing continuous view layout...")
+from src.ui.scroll_view import layout_rows
+assert layout_rows(3) == [(0,), (1,), (2,)]
+assert layout_rows(4, spread=True) == [(0,), (2, 1), (3,)]
+assert layout_rows(5, spread=True) == [(0,), (2, 1), (4, 3)]
+assert layout_rows(0, spread=True) == []
+from src.ui.scroll_view import page_row
+for page_count in range(1, 6):
+    for spread in (False, True):
+        rows = layout_rows(page_count, spread)
+        assert all(index in rows[page_row(index, spread)] for index in range(page_count))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication
+app = QApplication.instance() or QApplication([])
+from src.ui.scroll_view import ContinuousPageView, row_count
+for spread in (False, True):
+    strip = make_book(make_image_set("test_images/strip", 2, 32, 48, "L"), 5)
+    view = ContinuousPageView()
+    view.resize(300, 400)
+    view.set_spread(spread)
+    view.set_book(strip)
+    view.show()
+    app.processEvents()
+    assert len(view._row_tops) == row_count(5, spread)
+    for remaining in (4, 3):
+        strip.remove_page(remaining)  # The last page, or the trailing spread page
+        app.processEvents()
+        assert len(view._row_tops) == row_count(remaining, spread)
+    view.shutdown()
+    view.close()
+print("✓ Pages laid out one per row and in right-to-left spreads")
+
+# Test 22: Reading position
+print("\nTest 22: Testing reading position...")
+assert storage.reading_position("cli_book") is None
+assert storage.set_reading_position("cli_book", 2, "page-key")
+assert BookStorage(storage_dir="test_books").reading_position("cli_book") == (2, "page-key")
+storage.delete_book("cli_book")
+assert storage.reading_position("cli_book") is None
+print("✓ Last-read page kept in the catalog and dropped with the book")
+
+# Test 23: Refreshing changed pages
+print("\nTest 23: Testing refresh of changed pages...")
+from src.utils.metadata import refresh_pages
+watched = Book("Watched")
+watched_paths = make_image_set("test_images/watched", 4, 32, 48, "L")
+watched.add_pages(watched_paths)
+refresh_stale_pages(watched)
+changes = []
+watched.add_listener(lambda event, *args: changes.append((event, args)))
+os.remove(watched_paths[1])
+Image.new('L', (64, 48)).save(watched_paths[2])
+os.utime(watched_paths[2], ns=(watched.pages[2].mtime_ns + 10**9,) * 2)
+assert refresh_pages(watched, [0, 1, 2]) == [1, 2]
+assert watched.pages[1].missing and not watched.pages[1].has_metadata
+assert watched.pages[2].size == (64, 48)
+assert changes == [('pages_changed', (1, 2))]
+assert refresh_pages(watched, [1]) == []  # Still missing: nothing new to report
+legacy = Book("Legacy")
+legacy.add_pages(watched_paths[2:])
+legacy.mark_clean()
+legacy.add_listener(lambda event, *args: changes.append((event, args)))
+del changes[:]
+assert refresh_pages(legacy, [0, 1]) == [] and changes == [] and not legacy.is_dirty
+assert legacy.pages[0].size == (64, 48)
+print("✓ Only changed pages re-read, missing files flagged in one event")
+
+# Test 24: Cover atlas
+print("\nTest 24: Testing cover atlas...")
+from src.utils.catalog import BookSummary
+from src.utils.cover_atlas import CoverAtlas
+cover_paths = make_image_set("test_images/covers", 3, 60, 90, "RGB")
+cover_summaries = [BookSummary(f"cover{i}", "", 1, path, "", "", 0, 0)
+                   for i, path in enumerate(cover_paths)]
+atlas = CoverAtlas("test_images/cover_atlas", cell_size=(20, 30))
+assert atlas.update(cover_summaries) == [0]
+assert atlas.update(cover_summaries) == []  # Nothing changed: no sheet rewritten
+assert atlas.locate("cover2") == (0, (40, 0, 20, 30))
+Image.new('RGB', (60, 90)).save(cover_paths[1])
+os.utime(cover_paths[1], ns=(os.stat(cover_paths[1]).st_mtime_ns + 10**9,) * 2)
+atlas.update(cover_summaries[1:])  # cover0 removed, cover1 redrawn
+reopened = CoverAtlas("test_images/cover_atlas", cell_size=(20, 30))
+assert reopened.locate("cover0") is None and reopened.locate("cover1") == (0, (20, 0, 20, 30))
+with Image.open(atlas.sheet_path(0)) as sheet:
+    assert sheet.size == (20 * CoverAtlas.COLUMNS, 30 * CoverAtlas.ROWS)
+    assert sheet.getpixel((30, 15)) == (0, 0, 0)
+print("✓ Covers packed into one sheet and redrawn only when they change")
+
 # Cleanup
 import shutil
 if os.path.exists("test_images"):
     shutil.rmtree("test_images")
 if os.path.exists("test_books"):
     shutil.rmtree("test_books")
+if os.path.exists("test_thumbnails"):
+    shutil.rmtree("test_thumbnails")
 
 print("\n✓ All tests passed!")